@@ -1,8 +1,17 @@
-from fastapi import APIRouter, Depends
+from contextlib import aclosing
+from typing import Any, AsyncIterator
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+import httpx
+import json
+import logging
+from src.core.config import settings
 from src.schemas.chat import ChatRequest, ChatSuccessResponse, ChatData
 from src.services.chat import ChatService
 import functools
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 @functools.lru_cache()
@@ -15,13 +24,70 @@ async def chat(
     chat_service: ChatService = Depends(get_chat_service)
 ) -> ChatSuccessResponse:
     """Chat endpoint to process user queries via RAG."""
+    timings: dict[str, float] = {}
     answer, sources = await chat_service.process_query(
         query=request.query,
-        context_history=request.context_history
+        context_history=request.context_history,
+        timings=timings
     )
     return ChatSuccessResponse(
         data=ChatData(
             answer=answer,
-            sources=sources
+            sources=sources,
+            timings=timings
         )
     )
+
+def _sse(event: str, data: dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    http_request: Request,
+    chat_service: ChatService = Depends(get_chat_service)
+) -> StreamingResponse:
+    """Streaming variant of /chat as Server-Sent Events.
+
+    Emits one ``sources`` event (with the retrieval timings) once retrieval
+    is done, then a ``token`` event per generated fragment and a final
+    ``done`` event. Generation errors are reported as an ``error`` event.
+    When the client disconnects the Ollama request is closed, which stops
+    the generation.
+    """
+    timings: dict[str, float] = {}
+    prompt, sources = await chat_service.build_prompt(
+        query=request.query,
+        context_history=request.context_history,
+        timings=timings
+    )
+
+    async def events() -> AsyncIterator[str]:
+        yield _sse("sources", {"sources": [source.model_dump() for source in sources], "timings": timings})
+        try:
+            async with aclosing(chat_service.stream_answer(prompt)) as tokens:
+                async for token in tokens:
+                    if await http_request.is_disconnected():
+                        logger.info("Client disconnected; stopping generation")
+                        return
+                    yield _sse("token", {"token": token})
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Ollama HTTP status error: {e.response.status_code}")
+            if e.response.status_code == 404:
+                message = f"エラー: Ollama モデル（{settings.EMBEDDING_MODEL}）が見つかりません。'docker compose exec ollama ollama pull {settings.EMBEDDING_MODEL}' を実行してください。"
+            else:
+                message = f"Ollama エラーが発生しました ({e.response.status_code})。モデルがプルされているか確認してください。"
+            yield _sse("error", {"message": message})
+            return
+        except Exception as e:
+            logger.error(f"Ollama streaming failed: {e}")
+            yield _sse("error", {"message": f"エラーが発生しました: {str(e)}"})
+            return
+        yield _sse("done", {})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies (nginx in the frontend container) from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,8 +1,13 @@
 from typing import Any
-import httpx
 from fastapi import APIRouter
 from elasticsearch import AsyncElasticsearch
+from src.core.balancer import service_urls
 from src.core.config import settings
+from src.core.http import get_http_client
+from src.services.cache import cache_stats
+
+# Probes should fail fast instead of inheriting the long generation timeout
+HEALTH_TIMEOUT = 5.0
 
 router = APIRouter()
 
@@ -13,7 +18,8 @@ async def health_check() -> dict[str, Any]:
     Performs connectivity tests for Elasticsearch and Ollama.
 
     Returns:
-        dict: A dictionary containing the status of each service.
+        dict: A dictionary containing the status of each service and the
+            hit/miss counters of the in-process caches.
     """
     health_status: dict[str, Any] = {
         "status": "ok",
@@ -37,24 +43,30 @@ async def health_check() -> dict[str, Any]:
 
     # Check Ollama
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{settings.OLLAMA_BASE_URL}/api/tags")
-            if response.status_code == 200:
-                health_status["services"]["ollama"] = "connected"
-            else:
-                health_status["services"]["ollama"] = f"unexpected status code: {response.status_code}"
+        response = await get_http_client("ollama").get(f"{settings.OLLAMA_BASE_URL}/api/tags", timeout=HEALTH_TIMEOUT)
+        if response.status_code == 200:
+            health_status["services"]["ollama"] = "connected"
+        else:
+            health_status["services"]["ollama"] = f"unexpected status code: {response.status_code}"
     except Exception as e:
         health_status["services"]["ollama"] = f"error: {str(e)}"
 
-    # Check Encoder
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{settings.ENCODER_SERVICE_URL}/health")
+    # Check Encoder replicas; chat keeps working while any of them is up
+    replicas: dict[str, str] = {}
+    for url in service_urls(settings.ENCODER_SERVICE_URLS, settings.ENCODER_SERVICE_URL):
+        try:
+            response = await get_http_client("encoder").get(f"{url}/health", timeout=HEALTH_TIMEOUT)
             if response.status_code == 200:
-                health_status["services"]["encoder"] = "connected"
+                replicas[url] = "connected"
             else:
-                health_status["services"]["encoder"] = f"unexpected status code: {response.status_code}"
-    except Exception as e:
-        health_status["services"]["encoder"] = f"error: {str(e)}"
+                replicas[url] = f"unexpected status code: {response.status_code}"
+        except Exception as e:
+            replicas[url] = f"error: {str(e)}"
+    statuses = list(replicas.values())
+    health_status["services"]["encoder"] = "connected" if "connected" in statuses else statuses[0]
+    if len(replicas) > 1:
+        health_status["encoder_replicas"] = replicas
+
+    health_status["caches"] = cache_stats()
 
     return health_status
@@ -1,3 +1,4 @@
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -9,8 +10,50 @@ class Settings(BaseSettings):
         LOG_LEVEL (str): Logging level (debug, info, warning, error).
         ELASTICSEARCH_URL (str): Connection URL for Elasticsearch.
         OLLAMA_BASE_URL (str): Base URL for Ollama API.
+        ENCODER_SERVICE_URL (str): Base URL for the SPLADE encoder service.
+        ENCODER_SERVICE_URLS (str): Comma-separated encoder replicas to balance over;
+            empty uses ENCODER_SERVICE_URL alone.
+        ENCODER_WIRE_FORMAT (str): Encoder response format ("json", "compact" or "msgpack").
+        ENCODER_TIMEOUT (float): Request timeout for the encoder, in seconds.
+        ENCODER_EJECT_AFTER_FAILURES (int): Consecutive failures before an encoder replica is ejected.
+        ENCODER_EJECT_SECONDS (float): First ejection of a replica, doubled on repeated ejections.
+        ENCODER_MAX_ATTEMPTS (int): Replicas one encoder request may reach through failover and hedging.
+        ENCODER_HEDGE_AFTER (float): Seconds before a slow request is hedged to another replica (None disables).
+        ENCODER_OVERLOAD_RETRIES (int): Times an encoder request is resent after every replica
+            answered 503 with Retry-After.
+        OLLAMA_TIMEOUT (float): Request timeout for Ollama generation, in seconds.
         COSENSE_PROJECT_NAME (str): Name of the target Cosense project.
         COSENSE_SID (str): Session ID for Cosense API.
+        QUERY_CACHE_SIZE (int): Maximum number of cached query vectors.
+        QUERY_CACHE_TTL (float): Lifetime of a cached query vector, in seconds.
+        QUERY_CACHE_PATH (str): Optional SQLite file shared by worker processes.
+        ENCODER_MODEL_CHECK_INTERVAL (float): How often the encoder's model and pruning settings,
+            which namespace the query cache, are re-read, in seconds.
+        RETRIEVAL_MODE (str): "splade", or "hybrid" to run BM25 alongside SPLADE.
+        RETRIEVAL_TOP_K (int): Number of contexts passed to generation.
+        HYBRID_FUSION (str): "rrf" (reciprocal rank fusion) or "weighted" (normalized scores).
+        HYBRID_CANDIDATES (int): Hits fetched from each retriever before fusion.
+        SPLADE_WEIGHT (float): Weight of the SPLADE ranking in the fusion.
+        BM25_WEIGHT (float): Weight of the BM25 ranking in the fusion.
+        RRF_K (int): Rank constant of reciprocal rank fusion.
+        BM25_FALLBACK (bool): In "splade" mode, use BM25 when the query cannot be encoded.
+        CONTEXT_MAX_TOKENS (int): Estimated token budget of the retrieved context in the prompt.
+        ENCODE_TIMEOUT (float): Time budget of the query encoding stage, in seconds.
+        SEARCH_TIMEOUT (float): Time budget of each search stage, in seconds.
+        OLLAMA_WARMUP (bool): Load the generation model while retrieval runs.
+        OLLAMA_WARMUP_INTERVAL (float): Minimum time between model checks, in seconds.
+        OLLAMA_KEEP_ALIVE (str): How long Ollama keeps the model loaded after a request.
+        QUERY_MAX_TERMS (int): Maximum number of query terms sent to Elasticsearch (None keeps all).
+        QUERY_MIN_WEIGHT (float): Query terms lighter than this are dropped.
+        QUERY_MASS_CUTOFF (float): Keep the heaviest terms covering this share (0-1] of the total weight.
+        QUERY_RESCORE (bool): Re-rank the pruned query's top hits with the full query vector.
+        QUERY_RESCORE_WINDOW (int): Number of hits re-ranked per query.
+        RETRIEVAL_CACHE_SIZE (int): Maximum number of cached search results.
+        RETRIEVAL_CACHE_TTL (float): Lifetime of a cached search result, in seconds.
+        INDEX_ALIAS (str): Alias searched for chunks. The batch job swaps it to a
+            freshly built index on rebuilds, so searches never see a partial index.
+        INDEX_META_INDEX (str): Index holding the generation counter published by the batch job.
+        GENERATION_CHECK_INTERVAL (float): How often the index generation is re-read, in seconds.
     """
     model_config = SettingsConfigDict(
         env_file=".env", 
@@ -27,10 +70,61 @@ class Settings(BaseSettings):
     ELASTICSEARCH_URL: str = "http://elasticsearch:9200"
     OLLAMA_BASE_URL: str = "http://ollama:11434"
     ENCODER_SERVICE_URL: str = "http://encoder:8001"
+    ENCODER_SERVICE_URLS: str = ""
+    ENCODER_WIRE_FORMAT: Literal["json", "compact", "msgpack"] = "json"
     EMBEDDING_MODEL: str = "gemma3"
 
+    # Shared HTTP clients (timeouts in seconds)
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    ENCODER_TIMEOUT: float = 60.0
+    ENCODER_MAX_CONNECTIONS: int = 20
+    ENCODER_EJECT_AFTER_FAILURES: int = 3
+    ENCODER_EJECT_SECONDS: float = 10.0
+    ENCODER_MAX_ATTEMPTS: int = 2
+    ENCODER_HEDGE_AFTER: Optional[float] = 0.3
+    ENCODER_OVERLOAD_RETRIES: int = 1
+    OLLAMA_TIMEOUT: float = 300.0
+    OLLAMA_MAX_CONNECTIONS: int = 10
+
     # Cosense Configuration
     COSENSE_PROJECT_NAME: str = ""
     COSENSE_SID: str = ""
 
+    # Query embedding cache (in-process LRU, plus SQLite when a path is set)
+    QUERY_CACHE_SIZE: int = 1024
+    QUERY_CACHE_TTL: float = 24 * 3600.0
+    QUERY_CACHE_PATH: Optional[str] = None
+    ENCODER_MODEL_CHECK_INTERVAL: float = 60.0
+
+    # Chat pipeline: stage time budgets (seconds) and generation model warm-up
+    RETRIEVAL_MODE: Literal["splade", "hybrid"] = "splade"
+    RETRIEVAL_TOP_K: int = 5
+    HYBRID_FUSION: Literal["rrf", "weighted"] = "rrf"
+    HYBRID_CANDIDATES: int = 20
+    SPLADE_WEIGHT: float = 1.0
+    BM25_WEIGHT: float = 1.0
+    RRF_K: int = 60
+    BM25_FALLBACK: bool = True
+    CONTEXT_MAX_TOKENS: int = 2048
+    ENCODE_TIMEOUT: float = 5.0
+    SEARCH_TIMEOUT: float = 5.0
+    OLLAMA_WARMUP: bool = True
+    OLLAMA_WARMUP_INTERVAL: float = 60.0
+    OLLAMA_KEEP_ALIVE: str = "30m"
+
+    # Query-side pruning of the sparse vector, with optional rescoring by the full vector
+    QUERY_MAX_TERMS: Optional[int] = 64
+    QUERY_MIN_WEIGHT: float = 0.0
+    QUERY_MASS_CUTOFF: float = 1.0
+    QUERY_RESCORE: bool = False
+    QUERY_RESCORE_WINDOW: int = 50
+
+    INDEX_ALIAS: str = "cosense_pages"
+
+    # Search result cache, invalidated when the batch job publishes a new index generation
+    RETRIEVAL_CACHE_SIZE: int = 512
+    RETRIEVAL_CACHE_TTL: float = 3600.0
+    INDEX_META_INDEX: str = "cosense_meta"
+    GENERATION_CHECK_INTERVAL: float = 10.0
+
 settings = Settings()
@@ -0,0 +1,39 @@
+import logging
+from typing import Any, Callable
+import httpx
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+def _client_options(timeout: float, max_connections: int) -> dict[str, Any]:
+    return {
+        "timeout": httpx.Timeout(timeout, connect=min(timeout, 10.0)),
+        "limits": httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+        )
+    }
+
+# Connection settings per upstream service
+UPSTREAMS: dict[str, Callable[[], dict[str, Any]]] = {
+    "encoder": lambda: _client_options(settings.ENCODER_TIMEOUT, settings.ENCODER_MAX_CONNECTIONS),
+    "ollama": lambda: _client_options(settings.OLLAMA_TIMEOUT, settings.OLLAMA_MAX_CONNECTIONS),
+}
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+def get_http_client(upstream: str) -> httpx.AsyncClient:
+    """Returns the shared keep-alive client for ``upstream``, creating it on first use."""
+    client = _clients.get(upstream)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(**UPSTREAMS[upstream]())
+        _clients[upstream] = client
+    return client
+
+async def close_http_clients() -> None:
+    """Closes every shared client; call once when the process shuts down."""
+    for upstream, client in list(_clients.items()):
+        await client.aclose()
+        logger.debug(f"Closed HTTP client for {upstream}")
+    _clients.clear()
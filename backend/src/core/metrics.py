@@ -0,0 +1,29 @@
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# CPU-only generation takes tens of seconds
+GENERATION_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "backend_http_request_seconds", "HTTP request latency by route.", ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+STAGE_SECONDS = Histogram("backend_chat_stage_seconds", "Duration of each chat pipeline stage.", ["stage"], buckets=LATENCY_BUCKETS)
+ENCODER_REQUEST_SECONDS = Histogram(
+    "backend_encoder_request_seconds", "Round trip to the encoder service.", ["path"], buckets=LATENCY_BUCKETS
+)
+ENCODER_REPLICA_EVENTS = Counter(
+    "backend_encoder_replica_events_total", "Encoder load balancing events (hedge, failover, ejection, overload).", ["event"]
+)
+ES_SEARCH_SECONDS = Histogram("backend_es_search_seconds", "Elasticsearch search latency.", ["kind"], buckets=LATENCY_BUCKETS)
+OLLAMA_FIRST_TOKEN_SECONDS = Histogram(
+    "backend_ollama_first_token_seconds", "Time until Ollama streams the first token.", buckets=GENERATION_BUCKETS
+)
+OLLAMA_GENERATION_SECONDS = Histogram(
+    "backend_ollama_generation_seconds", "Total Ollama generation time.", ["mode"], buckets=GENERATION_BUCKETS
+)
+CACHE_LOOKUPS = Counter("backend_cache_lookups_total", "Cache lookups by cache and result.", ["cache", "result"])
+ERRORS = Counter("backend_errors_total", "Upstream failures by component.", ["component"])
+
+def render_metrics() -> tuple[bytes, str]:
+    """Returns the Prometheus exposition of every metric and its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
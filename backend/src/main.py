@@ -1,25 +1,48 @@
-from fastapi import FastAPI, Request
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import logging
+import time
 from src.api.v1.api import api_router
+from src.api.v1.endpoints.chat import get_chat_service
 from src.core.config import settings
+from src.core.http import close_http_clients
+from src.core.metrics import HTTP_REQUEST_SECONDS, render_metrics
 from src.schemas.chat import ChatErrorResponse
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Closes long-lived upstream connections when the server shuts down."""
+    yield
+    if get_chat_service.cache_info().currsize:
+        await get_chat_service().close()
+    await close_http_clients()
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # Request logging middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     logger.info(f"Incoming request: {request.method} {request.url.path}")
+    started = time.perf_counter()
     response = await call_next(request)
+    # Label by route template so path parameters cannot explode the series count
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.labels(
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=response.status_code
+    ).observe(time.perf_counter() - started)
     logger.info(f"Response status: {response.status_code}")
     return response
 
@@ -69,5 +92,12 @@ async def root():
     """
     return {"message": f"Welcome to {settings.PROJECT_NAME} API"}
 
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """Exposes the backend's metrics in Prometheus text format."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 # Include API routers
 app.include_router(api_router, prefix=settings.API_V1_STR)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional, Literal
+from typing import Dict, List, Optional, Literal
 
 class Message(BaseModel):
     role: Literal["user", "assistant"]
@@ -17,6 +17,8 @@ class ChatRequest(BaseModel):
 class ChatData(BaseModel):
     answer: str
     sources: List[Source]
+    # Milliseconds spent per pipeline stage, for diagnosis
+    timings: Optional[Dict[str, float]] = None
 
 class ChatSuccessResponse(BaseModel):
     status: Literal["success"] = "success"
@@ -0,0 +1,145 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Optional
+from src.core.metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class CacheStats:
+    """Hit and miss counters of a ``LocalCache``."""
+    hits: int = 0
+    shared_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+class LocalCache:
+    """Bounded TTL cache with an in-process LRU and an optional SQLite tier.
+
+    The LRU holds up to ``max_entries`` JSON-serializable values for ``ttl``
+    seconds. When ``path`` is set, entries are also written to a SQLite file
+    so that other worker processes (and restarts) can reuse them; a value
+    found there is promoted into the LRU. Keys are namespaced, e.g. by model
+    id, so that a configuration change never serves stale entries.
+    """
+
+    def __init__(self, name: str, namespace: str, max_entries: int = 1024, ttl: float = 3600.0, path: Optional[str] = None) -> None:
+        self.name = name
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.stats = CacheStats()
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        _caches[name] = self
+
+    def _key(self, key: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\0{key}".encode("utf-8")).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+        return self._db
+
+    def _shared_get(self, key: str) -> Optional[tuple[float, Any]]:
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT value, expires_at FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        return row[1], json.loads(row[0])
+
+    def _shared_put(self, key: str, value: Any, expires_at: float) -> None:
+        with self._db_lock:
+            db = self._connect()
+            with db:
+                db.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)", (key, json.dumps(value), expires_at))
+                db.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+                # Size bound: drop the entries closest to expiry first
+                db.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Returns the cached value for ``key`` or None on a miss."""
+        hashed = self._key(key)
+        entry = self._entries.get(hashed)
+        if entry is not None:
+            if entry[0] > time.time():
+                self._entries.move_to_end(hashed)
+                self.stats.hits += 1
+                CACHE_LOOKUPS.labels(cache=self.name, result="hit").inc()
+                return entry[1]
+            del self._entries[hashed]
+
+        if self.path:
+            try:
+                shared = await asyncio.to_thread(self._shared_get, hashed)
+            except sqlite3.Error as e:
+                logger.warning(f"Cache {self.name}: shared tier read failed: {e}")
+                shared = None
+            if shared is not None:
+                self._remember(hashed, shared[0], shared[1])
+                self.stats.shared_hits += 1
+                CACHE_LOOKUPS.labels(cache=self.name, result="shared_hit").inc()
+                return shared[1]
+
+        self.stats.misses += 1
+        CACHE_LOOKUPS.labels(cache=self.name, result="miss").inc()
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        """Stores ``value`` for ``key`` in every tier."""
+        hashed = self._key(key)
+        expires_at = time.time() + self.ttl
+        self._remember(hashed, expires_at, value)
+        if self.path:
+            try:
+                await asyncio.to_thread(self._shared_put, hashed, value, expires_at)
+            except sqlite3.Error as e:
+                logger.warning(f"Cache {self.name}: shared tier write failed: {e}")
+
+    def _remember(self, key: str, expires_at: float, value: Any) -> None:
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        """Counters and sizes for monitoring."""
+        lookups = self.stats.hits + self.stats.shared_hits + self.stats.misses
+        return {
+            **asdict(self.stats),
+            "size": len(self._entries),
+            "hit_rate": (self.stats.hits + self.stats.shared_hits) / lookups if lookups else 0.0
+        }
+
+    def close(self) -> None:
+        """Closes the SQLite connection, if one was opened."""
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+_caches: dict[str, LocalCache] = {}
+
+def cache_stats() -> dict[str, dict[str, Any]]:
+    """Returns the counters of every cache created in this process, keyed by name."""
+    return {name: cache.snapshot() for name, cache in _caches.items()}
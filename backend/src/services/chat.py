@@ -1,19 +1,59 @@
-from typing import List, Tuple, Optional, Any
+from typing import AsyncIterator, Awaitable, List, Tuple, Optional, Any, TypeVar
+import asyncio
 import httpx
+import json
 import logging
+import time
 import urllib.parse
 import re
 from elasticsearch import AsyncElasticsearch
 from src.core.config import settings
+from src.core.http import get_http_client
+from src.core.metrics import ERRORS, ES_SEARCH_SECONDS, OLLAMA_FIRST_TOKEN_SECONDS, OLLAMA_GENERATION_SECONDS, STAGE_SECONDS
 from src.schemas.chat import Message, Source
+from src.services.cache import LocalCache
+from src.services.context import build_context
+from src.services.encoder import EncoderClient
+from src.services.fusion import fuse_hits
+from src.services.sparse import prune_vector
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+def _ollama_tag(name: str) -> str:
+    """Full Ollama model tag; a name without one means ``:latest``."""
+    return name if ":" in name else f"{name}:latest"
+
 class ChatService:
     def __init__(self) -> None:
         self.es = AsyncElasticsearch(settings.ELASTICSEARCH_URL)
-        self.encoder_url = settings.ENCODER_SERVICE_URL
+        self.encoder = EncoderClient()
+        # Keyed by the cleaned query and namespaced by the encoder's model key,
+        # which keeps vectors of another model or pruning apart
+        self.query_cache = LocalCache(
+            "query_embeddings",
+            namespace="",
+            max_entries=settings.QUERY_CACHE_SIZE,
+            ttl=settings.QUERY_CACHE_TTL,
+            path=settings.QUERY_CACHE_PATH
+        )
         self.ollama_url = f"{settings.OLLAMA_BASE_URL}/api/generate"
+        # Always the alias, never a versioned index: rebuilds swap it atomically
+        self.index_name = settings.INDEX_ALIAS
+        # Keyed by the query vector, top_k and the index generation published by the batch job
+        self.retrieval_cache = LocalCache(
+            "retrieval",
+            namespace=self.index_name,
+            max_entries=settings.RETRIEVAL_CACHE_SIZE,
+            ttl=settings.RETRIEVAL_CACHE_TTL
+        )
+        self._generation = 0
+        self._generation_checked_at: Optional[float] = None
+        self._encoder_model: Optional[str] = None
+        self._encoder_model_checked_at: Optional[float] = None
+        self._warmed_up_at: Optional[float] = None
+        self._warm_up_task: Optional[asyncio.Task[None]] = None
 
     def _clean_text(self, text: str) -> str:
         """Removes HTML tags and other noise from the text."""
@@ -25,53 +65,147 @@ class ChatService:
         text = re.sub(r'\s+', ' ', text).strip()
         return text
 
+    async def _encoder_model_key(self) -> Optional[str]:
+        """Returns the encoder's model key, re-read at most every ENCODER_MODEL_CHECK_INTERVAL seconds.
+
+        None until the encoder has answered once; a failed check keeps the
+        previous key.
+        """
+        now = time.monotonic()
+        if self._encoder_model_checked_at is not None and now - self._encoder_model_checked_at < settings.ENCODER_MODEL_CHECK_INTERVAL:
+            return self._encoder_model
+        try:
+            self._encoder_model = await self.encoder.model_key()
+        except Exception as e:
+            logger.warning(f"Could not read the encoder's model, keeping {self._encoder_model}: {e}")
+        self._encoder_model_checked_at = now
+        return self._encoder_model
+
     async def get_sparse_embeddings(self, query: str) -> dict[str, float]:
-        """Generates a sparse embedding for the given query using the encoder service."""
+        """Generates a sparse embedding for the given query using the encoder service.
+
+        Vectors of recent queries are served from ``query_cache`` without
+        calling the encoder. The cache is namespaced by the model and pruning
+        the encoder reports, and bypassed while that is unknown. Failures are
+        not cached.
+        """
+        model_key = await self._encoder_model_key()
+        if model_key is not None:
+            self.query_cache.namespace = model_key
+            cached = await self.query_cache.get(query)
+            if cached is not None:
+                return cached
         try:
-            url = f"{self.encoder_url}/encode"
-            payload = {"text": query}
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=payload, timeout=60.0)
-                response.raise_for_status()
-                data = response.json()
-                return data["sparse_values"]
+            sparse_vector = await self.encoder.encode(query)
         except Exception as e:
             logger.error(f"Encoder service failed: {e}")
+            ERRORS.labels(component="encoder").inc()
             return {}
+        if sparse_vector and model_key is not None:
+            await self.query_cache.set(query, sparse_vector)
+        return sparse_vector
+
+    async def _index_generation(self) -> int:
+        """Returns the generation of the index, re-read at most every GENERATION_CHECK_INTERVAL seconds.
+
+        The batch job bumps the counter whenever a sync changes the index,
+        which retires every retrieval cache entry of the older generation.
+        """
+        now = time.monotonic()
+        if self._generation_checked_at is not None and now - self._generation_checked_at < settings.GENERATION_CHECK_INTERVAL:
+            return self._generation
+        try:
+            doc = await self.es.options(ignore_status=404).get(index=settings.INDEX_META_INDEX, id=self.index_name)
+            self._generation = doc.get("_source", {}).get("generation", 0) if doc.get("found") else 0
+        except Exception as e:
+            logger.warning(f"Could not read index generation, keeping {self._generation}: {e}")
+        self._generation_checked_at = now
+        return self._generation
+
+    def _canonical_terms(self, sparse_vector: dict[str, float]) -> List[Tuple[str, float]]:
+        # Token order and float noise must not split cache entries
+        return sorted((token, round(weight, 4)) for token, weight in sparse_vector.items() if token)
+
+    def _retrieval_key(self, query_vector: dict[str, float], rescore_vector: Optional[dict[str, float]], top_k: int, generation: int) -> str:
+        return json.dumps([
+            generation,
+            top_k,
+            self._canonical_terms(query_vector),
+            self._canonical_terms(rescore_vector) if rescore_vector is not None else None
+        ], ensure_ascii=False)
+
+    def _rank_feature_query(self, sparse_vector: dict[str, float]) -> dict[str, Any]:
+        # One rank_feature clause per token of the sparse vector
+        return {
+            "bool": {
+                "should": [
+                    {"rank_feature": {"field": f"sparse_vector.{token}", "boost": weight}}
+                    for token, weight in sparse_vector.items()
+                    if token # Ensure token is not empty
+                ]
+            }
+        }
 
     async def retrieve_contexts(self, sparse_vector: dict[str, float], top_k: int = 5) -> Tuple[List[Source], List[Any]]:
-        """Retrieves relevant contexts from Elasticsearch using the sparse vector."""
+        """Retrieves relevant contexts from Elasticsearch using the sparse vector.
+
+        The vector is pruned (QUERY_MAX_TERMS, QUERY_MIN_WEIGHT,
+        QUERY_MASS_CUTOFF) before the query is built, which bounds the number
+        of clauses. With QUERY_RESCORE the top QUERY_RESCORE_WINDOW hits of
+        the pruned query are re-ranked with the full vector.
+
+        Results are cached per query vector, ``top_k`` and index generation.
+        """
         if not sparse_vector:
             return [], []
-            
-        index_name = "cosense_pages"
-        
-        # Build elasticsearch query using rank_feature
-        # We search with each token in the sparse_vector
-        search_query = {
-            "query": {
-                "bool": {
-                    "should": [
-                        {"rank_feature": {"field": f"sparse_vector.{token}", "boost": weight}}
-                        for token, weight in sparse_vector.items()
-                        if token # Ensure token is not empty
-                    ]
-                }
-            },
-            "_source": ["text", "metadata.title"],
+
+        query_vector = prune_vector(
+            sparse_vector,
+            max_terms=settings.QUERY_MAX_TERMS,
+            min_weight=settings.QUERY_MIN_WEIGHT,
+            mass_cutoff=settings.QUERY_MASS_CUTOFF
+        )
+        rescore_vector = sparse_vector if settings.QUERY_RESCORE and len(query_vector) < len(sparse_vector) else None
+        logger.debug(f"Query vector pruned from {len(sparse_vector)} to {len(query_vector)} terms")
+
+        cache_key = self._retrieval_key(query_vector, rescore_vector, top_k, await self._index_generation())
+        cached = await self.retrieval_cache.get(cache_key)
+        if cached is not None:
+            return self._to_sources(cached), cached
+
+        search_query: dict[str, Any] = {
+            "query": self._rank_feature_query(query_vector),
+            "_source": ["text", "metadata.title", "metadata.chunk_id"],
             "size": top_k
         }
+        if rescore_vector is not None:
+            # Final scores come from the full vector alone
+            search_query["rescore"] = {
+                "window_size": max(top_k, settings.QUERY_RESCORE_WINDOW),
+                "query": {
+                    "rescore_query": self._rank_feature_query(rescore_vector),
+                    "query_weight": 0.0,
+                    "rescore_query_weight": 1.0
+                }
+            }
 
         try:
-            response = await self.es.search(index=index_name, body=search_query)
+            with ES_SEARCH_SECONDS.labels(kind="splade").time():
+                response = await self.es.search(index=self.index_name, body=search_query)
         except Exception as e:
             logger.error(f"Elasticsearch search failed: {e}")
+            ERRORS.labels(component="elasticsearch").inc()
             return [], []
 
-        sources = []
         hits = response["hits"]["hits"]
         for hit in hits:
-            text = hit["_source"].get("text", "")
+            hit["text"] = hit["_source"].get("text", "")
+        await self.retrieval_cache.set(cache_key, hits)
+        return self._to_sources(hits), hits
+
+    def _to_sources(self, hits: List[Any]) -> List[Source]:
+        sources = []
+        for hit in hits:
             title = hit["_source"].get("metadata", {}).get("title", "Untitled")
             score = hit.get("_score", 0.0)
             project = settings.COSENSE_PROJECT_NAME
@@ -85,27 +219,136 @@ class ChatService:
                 url=url,
                 score=float(score)
             ))
-            hit["text"] = text
-            
-        return sources, hits
+        return sources
+
+    async def bm25_search(self, query: str, top_k: int = 5) -> Tuple[List[Source], List[Any]]:
+        """Full-text search on the ``text`` field; needs no encoder round trip."""
+        if not query:
+            return [], []
+        search_query = {
+            "query": {"match": {"text": query}},
+            "_source": ["text", "metadata.title", "metadata.chunk_id"],
+            "size": top_k
+        }
+        try:
+            with ES_SEARCH_SECONDS.labels(kind="bm25").time():
+                response = await self.es.search(index=self.index_name, body=search_query)
+        except Exception as e:
+            logger.error(f"Elasticsearch BM25 search failed: {e}")
+            ERRORS.labels(component="elasticsearch").inc()
+            return [], []
+        hits = response["hits"]["hits"]
+        for hit in hits:
+            hit["text"] = hit["_source"].get("text", "")
+        return self._to_sources(hits), hits
+
+    async def _stage(self, name: str, awaitable: Awaitable[T], timeout: Optional[float], default: T, timings: dict[str, float]) -> T:
+        """Awaits one pipeline stage, recording its duration in ``timings`` (ms).
+
+        A stage that exceeds ``timeout`` seconds is abandoned and ``default``
+        is used instead, so a slow dependency degrades the answer rather than
+        blocking the request.
+        """
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stage {name} timed out after {timeout}s; continuing without it")
+            ERRORS.labels(component=f"{name}_timeout").inc()
+            return default
+        finally:
+            elapsed = time.perf_counter() - started
+            STAGE_SECONDS.labels(stage=name).observe(elapsed)
+            timings[name] = round(elapsed * 1000, 1)
+
+    def _start_warm_up(self) -> None:
+        """Makes sure the generation model is loaded while retrieval is still running."""
+        if not settings.OLLAMA_WARMUP:
+            return
+        now = time.monotonic()
+        if self._warmed_up_at is not None and now - self._warmed_up_at < settings.OLLAMA_WARMUP_INTERVAL:
+            return
+        if self._warm_up_task is not None and not self._warm_up_task.done():
+            return
+        self._warmed_up_at = now
+        self._warm_up_task = asyncio.create_task(self._warm_up_ollama())
+
+    async def _warm_up_ollama(self) -> None:
+        client = get_http_client("ollama")
+        try:
+            response = await client.get(f"{settings.OLLAMA_BASE_URL}/api/ps")
+            response.raise_for_status()
+            loaded = {_ollama_tag(model.get("name", "")) for model in response.json().get("models", [])}
+            if _ollama_tag(settings.EMBEDDING_MODEL) in loaded:
+                return
+            # A generate request without a prompt only loads the model
+            logger.info(f"Loading Ollama model {settings.EMBEDDING_MODEL} ahead of generation")
+            await client.post(self.ollama_url, json={"model": settings.EMBEDDING_MODEL, "keep_alive": settings.OLLAMA_KEEP_ALIVE})
+        except Exception as e:
+            logger.warning(f"Ollama warm-up failed: {e}")
+
+    async def build_prompt(
+        self,
+        query: str,
+        context_history: Optional[List[Message]] = None,
+        timings: Optional[dict[str, float]] = None
+    ) -> Tuple[str, List[Source]]:
+        """Retrieves contexts for ``query`` and returns the generation prompt with its sources.
+
+        The Ollama model check runs in the background while the query is
+        encoded. In ``hybrid`` retrieval mode a BM25 search starts at the
+        same time as encoding, and both result lists are fused (RRF or
+        weighted scores, see HYBRID_FUSION). In ``splade`` mode BM25 is only
+        used as a fallback when the query could not be encoded. Stage
+        durations in milliseconds are written to ``timings`` when given.
+        """
+        timings = timings if timings is not None else {}
+        started = time.perf_counter()
 
-    async def process_query(self, query: str, context_history: Optional[List[Message]] = None) -> Tuple[str, List[Source]]:
         # 0. Clean input query
         cleaned_query = self._clean_text(query)
-        
-        # 1. Get sparse embedding for the query
-        sparse_vector = await self.get_sparse_embeddings(cleaned_query)
-        
-        # 2. Retrieve contexts from Elasticsearch
-        sources, hits = await self.retrieve_contexts(sparse_vector)
-        
-        # 3. Construct Context from hits
-        context_parts = []
-        for hit in hits:
-            title = hit["_source"].get("metadata", {}).get("title", "Untitled")
-            text = hit.get("text", "")
-            context_parts.append(f"Source: {title}\nContent: {text}")
-        context_text = "\n\n".join(context_parts)
+        self._start_warm_up()
+        top_k = settings.RETRIEVAL_TOP_K
+        hybrid = settings.RETRIEVAL_MODE == "hybrid"
+        # Each retriever contributes a deeper candidate list to the fusion
+        depth = max(top_k, settings.HYBRID_CANDIDATES) if hybrid else top_k
+        bm25_task = None
+        if hybrid:
+            bm25_task = asyncio.create_task(
+                self._stage("bm25", self.bm25_search(cleaned_query, depth), settings.SEARCH_TIMEOUT, ([], []), timings)
+            )
+
+        try:
+            # 1. Get sparse embedding for the query
+            sparse_vector = await self._stage(
+                "encode", self.get_sparse_embeddings(cleaned_query), settings.ENCODE_TIMEOUT, {}, timings
+            )
+
+            # 2. Retrieve contexts from Elasticsearch
+            sources, hits = await self._stage(
+                "search", self.retrieve_contexts(sparse_vector, depth), settings.SEARCH_TIMEOUT, ([], []), timings
+            )
+            if bm25_task is not None:
+                _, bm25_hits = await bm25_task
+                hits = fuse_hits(
+                    [hits, bm25_hits],
+                    weights=[settings.SPLADE_WEIGHT, settings.BM25_WEIGHT],
+                    method=settings.HYBRID_FUSION,
+                    rrf_k=settings.RRF_K
+                )[:top_k]
+                sources = self._to_sources(hits)
+            elif not sparse_vector and settings.BM25_FALLBACK:
+                logger.warning("No query vector; serving BM25 results only")
+                sources, hits = await self._stage(
+                    "bm25", self.bm25_search(cleaned_query, top_k), settings.SEARCH_TIMEOUT, ([], []), timings
+                )
+        finally:
+            # A cancelled request (e.g. a disconnected stream) or a failed stage must not leave the search running
+            if bm25_task is not None:
+                bm25_task.cancel()
+
+        # 3. Construct Context from hits: merged neighbours, no duplicates, within the token budget
+        context_text = build_context(hits, settings.CONTEXT_MAX_TOKENS)
         
         # 4. Construct Prompt
         chat_history_str = ""
@@ -126,42 +369,107 @@ class ChatService:
 {query}
 
 【回答】"""
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(stage="retrieval").observe(elapsed)
+        timings["retrieval"] = round(elapsed * 1000, 1)
+        return system_prompt, sources
+
+    async def process_query(
+        self,
+        query: str,
+        context_history: Optional[List[Message]] = None,
+        timings: Optional[dict[str, float]] = None
+    ) -> Tuple[str, List[Source]]:
+        timings = timings if timings is not None else {}
+        system_prompt, sources = await self.build_prompt(query, context_history, timings)
 
         # 5. Call Ollama
         payload = {
             "model": settings.EMBEDDING_MODEL,
             "prompt": system_prompt,
-            "stream": False
+            "stream": False,
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE
         }
         
+        generate_started = time.perf_counter()
         answer = "エラーが発生しました。しばらくしてからもう一度お試しください。"
         try:
             logger.info(f"Sending request to Ollama: {self.ollama_url}")
-            async with httpx.AsyncClient() as client:
-                # Ollama can take long for complex queries or big models
-                response = await client.post(self.ollama_url, json=payload, timeout=300.0)
-                logger.debug(f"Ollama response status: {response.status_code}")
-                if response.status_code == 404:
-                    error_msg = f"エラー: Ollama モデル（{settings.EMBEDDING_MODEL}）が見つかりません。'docker compose exec ollama ollama pull {settings.EMBEDDING_MODEL}' を実行してください。"
-                    logger.error(f"Ollama model not found or invalid URL: {response.status_code}")
-                    return error_msg, sources
-
-                # Check for non-JSON response which might happen on server errors (HTML)
-                content_type = response.headers.get("content-type", "")
-                if "application/json" not in content_type:
-                    logger.error(f"Ollama returned non-JSON response: {response.status_code} {content_type}")
-                    answer = "生成サービスが現在利用できません (Server Response is not JSON)。"
-                else:
-                    response.raise_for_status()
-                    data = response.json()
-                    answer = data.get("response", "回答を生成できませんでした。")
+            # Ollama can take long for complex queries or big models (OLLAMA_TIMEOUT)
+            response = await get_http_client("ollama").post(self.ollama_url, json=payload)
+            logger.debug(f"Ollama response status: {response.status_code}")
+            if response.status_code == 404:
+                error_msg = f"エラー: Ollama モデル（{settings.EMBEDDING_MODEL}）が見つかりません。'docker compose exec ollama ollama pull {settings.EMBEDDING_MODEL}' を実行してください。"
+                logger.error(f"Ollama model not found or invalid URL: {response.status_code}")
+                ERRORS.labels(component="ollama").inc()
+                return error_msg, sources
+
+            # Check for non-JSON response which might happen on server errors (HTML)
+            content_type = response.headers.get("content-type", "")
+            if "application/json" not in content_type:
+                logger.error(f"Ollama returned non-JSON response: {response.status_code} {content_type}")
+                ERRORS.labels(component="ollama").inc()
+                answer = "生成サービスが現在利用できません (Server Response is not JSON)。"
+            else:
+                response.raise_for_status()
+                data = response.json()
+                answer = data.get("response", "回答を生成できませんでした。")
         except httpx.HTTPStatusError as e:
             logger.error(f"Ollama HTTP status error: {e.response.status_code} - {e.response.text}")
+            ERRORS.labels(component="ollama").inc()
             answer = f"Ollama エラーが発生しました ({e.response.status_code})。モデルがプルされているか確認してください。"
         except Exception as e:
             logger.error(f"Ollama inference failed: {e}")
+            ERRORS.labels(component="ollama").inc()
             # If it's a known error message, might want to be more specific, 
             # but usually telling the user an error occurred is enough.
             answer = f"エラーが発生しました: {str(e)}"
+        finally:
+            elapsed = time.perf_counter() - generate_started
+            OLLAMA_GENERATION_SECONDS.labels(mode="blocking").observe(elapsed)
+            timings["generate"] = round(elapsed * 1000, 1)
             
         return answer, sources
+
+    async def stream_answer(self, prompt: str) -> AsyncIterator[str]:
+        """Yields answer tokens as Ollama generates them.
+
+        Ollama streams one JSON object per line. Closing this generator
+        closes the upstream response, which makes Ollama stop generating.
+        """
+        payload = {
+            "model": settings.EMBEDDING_MODEL,
+            "prompt": prompt,
+            "stream": True,
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE
+        }
+        logger.info(f"Streaming from Ollama: {self.ollama_url}")
+        started = time.perf_counter()
+        first_token = True
+        try:
+            async with get_http_client("ollama").stream("POST", self.ollama_url, json=payload) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    data = json.loads(line)
+                    if data.get("error"):
+                        raise RuntimeError(data["error"])
+                    if data.get("response"):
+                        if first_token:
+                            OLLAMA_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+                            first_token = False
+                        yield data["response"]
+                    if data.get("done"):
+                        OLLAMA_GENERATION_SECONDS.labels(mode="stream").observe(time.perf_counter() - started)
+                        return
+        except Exception:
+            ERRORS.labels(component="ollama").inc()
+            raise
+
+    async def close(self) -> None:
+        """Closes the Elasticsearch connection and the cache files."""
+        if self._warm_up_task is not None:
+            self._warm_up_task.cancel()
+        self.query_cache.close()
+        await self.es.close()
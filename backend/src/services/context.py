@@ -0,0 +1,113 @@
+import math
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+# Shortest shared text treated as chunk overlap rather than coincidence
+MIN_OVERLAP_CHARS = 10
+# Leftover budget below which a truncated block is not worth adding
+MIN_TRUNCATED_TOKENS = 32
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count without loading the generation model's tokenizer.
+
+    Japanese characters mostly map to one token each, while ASCII text
+    averages about four characters per token.
+    """
+    return math.ceil(sum(0.25 if ord(char) < 128 else 1.0 for char in text))
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Returns the longest prefix of ``text`` estimated to fit in ``max_tokens``."""
+    used = 0.0
+    for i, char in enumerate(text):
+        used += 0.25 if ord(char) < 128 else 1.0
+        if used > max_tokens:
+            return text[:i]
+    return text
+
+def _merge_overlapping(left: str, right: str) -> str:
+    # Adjacent chunks repeat up to chunk_overlap characters of each other
+    for size in range(min(len(left), len(right)), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return f"{left} {right}"
+
+@dataclass
+class ContextBlock:
+    """Consecutive chunks of one page, merged into a single passage."""
+    title: str
+    text: str
+    score: float
+    chunk_ids: List[Optional[int]] = field(default_factory=list)
+
+def _blocks(hits: List[Any]) -> List[ContextBlock]:
+    by_title: dict[str, List[tuple[Optional[int], str, float]]] = {}
+    for hit in hits:
+        metadata = hit["_source"].get("metadata", {})
+        title = metadata.get("title", "Untitled")
+        by_title.setdefault(title, []).append(
+            (metadata.get("chunk_id"), hit.get("text", hit["_source"].get("text", "")), float(hit.get("_score") or 0.0))
+        )
+
+    blocks: List[ContextBlock] = []
+    for title, chunks in by_title.items():
+        chunks.sort(key=lambda chunk: (chunk[0] is None, chunk[0] or 0))
+        current: Optional[ContextBlock] = None
+        for chunk_id, text, score in chunks:
+            previous_id = current.chunk_ids[-1] if current else None
+            if current and chunk_id is not None and previous_id is not None and chunk_id - previous_id <= 1:
+                if chunk_id != previous_id:
+                    current.text = _merge_overlapping(current.text, text)
+                    current.chunk_ids.append(chunk_id)
+                current.score = max(current.score, score)
+                continue
+            current = ContextBlock(title=title, text=text, score=score, chunk_ids=[chunk_id])
+            blocks.append(current)
+    return blocks
+
+def _format(block: ContextBlock, text: str) -> str:
+    return f"Source: {block.title}\nContent: {text}"
+
+def _deduplicate(blocks: List[ContextBlock]) -> List[ContextBlock]:
+    # Blocks come best score first; a block containing a kept one takes its place
+    kept: List[tuple[ContextBlock, str]] = []
+    for block in blocks:
+        normalized = " ".join(block.text.split())
+        if any(normalized in text for _, text in kept):
+            continue
+        contained = [i for i, (_, text) in enumerate(kept) if text in normalized]
+        if not contained:
+            kept.append((block, normalized))
+            continue
+        kept[contained[0]] = (block, normalized)
+        for i in reversed(contained[1:]):
+            del kept[i]
+    return [block for block, _ in kept]
+
+def build_context(hits: List[Any], max_tokens: int) -> str:
+    """Assembles the prompt context from search hits within a token budget.
+
+    Adjacent ``chunk_id``s of the same page are merged with their overlap
+    removed. Of two passages where one contains the other's text only the
+    containing one is kept, at the better rank of the two. Passages are then
+    added best score first while they fit in ``max_tokens``; one that does
+    not fit is skipped so that smaller ones can still use the budget, and
+    the best skipped passage is truncated into whatever is left at the end.
+    """
+    blocks = _deduplicate(sorted(_blocks(hits), key=lambda block: block.score, reverse=True))
+    parts: dict[int, str] = {}
+    skipped: List[int] = []
+    remaining = max_tokens
+    for rank, block in enumerate(blocks):
+        part = _format(block, block.text)
+        cost = estimate_tokens(part) + 1  # separator
+        if cost <= remaining:
+            parts[rank] = part
+            remaining -= cost
+        else:
+            skipped.append(rank)
+    if skipped:
+        block = blocks[skipped[0]]
+        budget = remaining - estimate_tokens(_format(block, "")) - 1
+        if budget >= MIN_TRUNCATED_TOKENS:
+            parts[skipped[0]] = _format(block, truncate_to_tokens(block.text, budget))
+    return "\n\n".join(parts[rank] for rank in sorted(parts))
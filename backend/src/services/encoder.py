@@ -0,0 +1,119 @@
+import struct
+from typing import Any, Optional
+import httpx
+import msgpack
+from src.core.balancer import ReplicaPool, service_urls
+from src.core.config import settings
+from src.core.http import get_http_client
+from src.core.metrics import ENCODER_REPLICA_EVENTS, ENCODER_REQUEST_SECONDS
+
+COMPACT_JSON_MEDIA_TYPE = "application/vnd.splade.compact+json"
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+VOCAB_VERSION_HEADER = "X-Vocab-Version"
+
+class EncoderClient:
+    """Client for the SPLADE encoder service.
+
+    With ``wire_format`` set to ``"compact"`` or ``"msgpack"`` the encoder
+    returns feature ids and float16 weights instead of a name-keyed dict. The
+    id-to-name table is fetched once from ``/vocab`` and refreshed whenever
+    the encoder reports a different vocab version.
+
+    Requests are balanced over ENCODER_SERVICE_URLS (or the single
+    ENCODER_SERVICE_URL) by a ``ReplicaPool``. Replicas may briefly serve
+    different vocab versions during a model reload, so tables are kept per
+    version and fetched from the replica that reported it.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, wire_format: Optional[str] = None) -> None:
+        urls = [base_url] if base_url else service_urls(settings.ENCODER_SERVICE_URLS, settings.ENCODER_SERVICE_URL)
+        self.wire_format = wire_format or settings.ENCODER_WIRE_FORMAT
+        self.pool = ReplicaPool(
+            urls,
+            eject_after=settings.ENCODER_EJECT_AFTER_FAILURES,
+            eject_seconds=settings.ENCODER_EJECT_SECONDS,
+            hedge_after=settings.ENCODER_HEDGE_AFTER,
+            max_attempts=settings.ENCODER_MAX_ATTEMPTS,
+            overload_retries=settings.ENCODER_OVERLOAD_RETRIES,
+            events=ENCODER_REPLICA_EVENTS
+        )
+        # Vocab version (as reported in the response header) -> feature names
+        self._vocabs: dict[Optional[str], list[str]] = {}
+
+    def _headers(self) -> dict[str, str]:
+        if self.wire_format == "msgpack":
+            return {"Accept": MSGPACK_MEDIA_TYPE}
+        if self.wire_format == "compact":
+            return {"Accept": COMPACT_JSON_MEDIA_TYPE}
+        return {}
+
+    async def _vocab(self, client: httpx.AsyncClient, base_url: str, version: Optional[str]) -> list[str]:
+        vocab = self._vocabs.get(version)
+        if vocab is not None:
+            return vocab
+        response = await client.get(f"{base_url}/vocab")
+        response.raise_for_status()
+        data: dict[str, Any] = response.json()
+        # A reload replaces the old version for good; keep only the newest few
+        while len(self._vocabs) >= 4:
+            del self._vocabs[next(iter(self._vocabs))]
+        self._vocabs[version] = data["features"]
+        return data["features"]
+
+    def _decode_entry(self, entry: dict[str, Any], vocab: list[str]) -> dict[str, float]:
+        ids, weights = entry["ids"], entry["weights"]
+        if isinstance(ids, bytes):
+            # msgpack body: little-endian uint32 ids and float16 weights
+            ids = struct.unpack(f"<{len(ids) // 4}I", ids)
+            weights = struct.unpack(f"<{len(weights) // 2}e", weights)
+        return {vocab[i]: float(w) for i, w in zip(ids, weights)}
+
+    async def _post(self, path: str, payload: dict[str, Any]) -> tuple[dict[str, Any], Optional[list[str]]]:
+        """Returns the response body and, for compact formats, the vocab to decode it with."""
+        client = get_http_client("encoder")
+
+        async def send(base_url: str) -> tuple[dict[str, Any], Optional[list[str]]]:
+            with ENCODER_REQUEST_SECONDS.labels(path=path).time():
+                response = await client.post(f"{base_url}{path}", json=payload, headers=self._headers())
+            response.raise_for_status()
+            content_type = response.headers.get("content-type", "")
+            if MSGPACK_MEDIA_TYPE in content_type:
+                data = msgpack.unpackb(response.content)
+            else:
+                data = response.json()
+            if MSGPACK_MEDIA_TYPE in content_type or COMPACT_JSON_MEDIA_TYPE in content_type:
+                return data, await self._vocab(client, base_url, response.headers.get(VOCAB_VERSION_HEADER))
+            return data, None
+
+        return await self.pool.request(send)
+
+    async def model_key(self) -> str:
+        """Identifies the vectors the encoder returns, for keying caches of them.
+
+        Built from the model id, vocab version and pruning settings the
+        encoder reports on ``/info``, so that cached vectors are not reused
+        once any of them changes.
+        """
+        client = get_http_client("encoder")
+
+        async def send(base_url: str) -> dict[str, Any]:
+            response = await client.get(f"{base_url}/info")
+            response.raise_for_status()
+            return response.json()
+
+        info = await self.pool.request(send)
+        return f"{info['model_id']}@{info['vocab_version']}:top_k={info['top_k']}:min_weight={info['min_weight']}"
+
+    async def encode(self, text: str) -> dict[str, float]:
+        """Returns the sparse vector of ``text`` keyed by feature name."""
+        data, vocab = await self._post("/encode", {"text": text})
+        if vocab is not None:
+            return self._decode_entry(data, vocab)
+        return data["sparse_values"]
+
+    async def encode_batch(self, texts: list[str]) -> list[dict[str, float]]:
+        """Returns the sparse vectors of ``texts`` in a single request."""
+        data, vocab = await self._post("/encode_batch", {"texts": texts})
+        if vocab is not None:
+            return [self._decode_entry(entry, vocab) for entry in data["results"]]
+        return [entry["sparse_values"] for entry in data["results"]]
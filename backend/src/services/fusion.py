@@ -0,0 +1,47 @@
+from typing import Any, Hashable, List, Literal, Sequence
+
+def _hit_key(hit: dict[str, Any]) -> Hashable:
+    if hit.get("_id") is not None:
+        return hit["_id"]
+    source = hit.get("_source", {})
+    return (source.get("metadata", {}).get("title"), source.get("text"))
+
+def _normalized_scores(hits: List[dict[str, Any]]) -> List[float]:
+    # Min-max normalization makes BM25 and rank_feature scores comparable
+    scores = [float(hit.get("_score") or 0.0) for hit in hits]
+    if not scores:
+        return []
+    low, high = min(scores), max(scores)
+    if high == low:
+        return [1.0 for _ in scores]
+    return [(score - low) / (high - low) for score in scores]
+
+def fuse_hits(
+    result_lists: Sequence[List[dict[str, Any]]],
+    weights: Sequence[float],
+    method: Literal["rrf", "weighted"] = "rrf",
+    rrf_k: int = 60
+) -> List[dict[str, Any]]:
+    """Merges ranked hit lists from several retrievers into one ranking.
+
+    ``rrf`` sums ``weight / (rrf_k + rank)`` over the lists a hit appears
+    in; ``weighted`` sums ``weight * score`` after min-max normalizing each
+    list. Hits are matched by ``_id`` and returned best first, each with its
+    fused score as ``_score``. An empty list simply contributes nothing, so
+    fusion degrades to the remaining retriever.
+    """
+    fused: dict[Hashable, float] = {}
+    first_hits: dict[Hashable, dict[str, Any]] = {}
+    for hits, weight in zip(result_lists, weights):
+        if method == "rrf":
+            contributions = [weight / (rrf_k + rank) for rank in range(1, len(hits) + 1)]
+        else:
+            contributions = [weight * score for score in _normalized_scores(hits)]
+        for hit, contribution in zip(hits, contributions):
+            key = _hit_key(hit)
+            first_hits.setdefault(key, hit)
+            fused[key] = fused.get(key, 0.0) + contribution
+
+    # sorted() is stable: ties keep the order in which hits were first seen
+    ranked = sorted(fused, key=lambda key: fused[key], reverse=True)
+    return [{**first_hits[key], "_score": fused[key]} for key in ranked]
@@ -0,0 +1,37 @@
+from typing import Optional
+
+def prune_vector(
+    sparse_vector: dict[str, float],
+    max_terms: Optional[int] = None,
+    min_weight: float = 0.0,
+    mass_cutoff: float = 1.0
+) -> dict[str, float]:
+    """Keeps the heaviest terms of a sparse vector, ordered by weight.
+
+    Terms are dropped when they weigh less than ``min_weight``, fall outside
+    the ``max_terms`` heaviest, or come after the point where the kept terms
+    already cover ``mass_cutoff`` (0-1] of the total weight. Empty tokens are
+    always dropped. The heaviest term survives every cutoff so a non-empty
+    vector never prunes to nothing.
+    """
+    terms = sorted(
+        ((token, weight) for token, weight in sparse_vector.items() if token and weight > 0),
+        key=lambda item: item[1],
+        reverse=True
+    )
+    if not terms:
+        return {}
+
+    total = sum(weight for _, weight in terms)
+    kept: dict[str, float] = {}
+    mass = 0.0
+    for token, weight in terms:
+        if kept and (
+            weight < min_weight
+            or (max_terms is not None and len(kept) >= max_terms)
+            or mass >= mass_cutoff * total
+        ):
+            break
+        kept[token] = weight
+        mass += weight
+    return kept
@@ -0,0 +1,12 @@
+import pytest
+from src.core.config import settings
+
+@pytest.fixture
+def anyio_backend():
+    # The services are built on asyncio primitives (queues, tasks)
+    return "asyncio"
+
+@pytest.fixture(autouse=True)
+def no_ollama_warm_up(monkeypatch):
+    # The background model check would reach for a real Ollama; tests opt in explicitly
+    monkeypatch.setattr(settings, "OLLAMA_WARMUP", False)
@@ -0,0 +1,176 @@
+import asyncio
+import httpx
+import pytest
+from src.core.balancer import ReplicaPool, service_urls
+
+def _status_error(status: int, headers=None) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://replica/encode")
+    response = httpx.Response(status, headers=headers, request=request)
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+def test_should_parse_replica_urls_with_fallback():
+    """Test service_urls.
+
+    Arrange: A comma-separated list with blanks and an empty list.
+    Act: Parse both.
+    Assert: Check URLs are trimmed and the fallback is used when empty.
+    """
+    assert service_urls(" http://a:8001/, http://b:8001,,", "http://x") == ["http://a:8001", "http://b:8001"]
+    assert service_urls("", "http://x") == ["http://x"]
+
+@pytest.mark.anyio
+async def test_should_send_requests_to_the_replica_with_fewest_outstanding():
+    """Test least-outstanding balancing.
+
+    Arrange: Two replicas; hold one request open on the first picked replica.
+    Act: Send three more requests while it is open.
+    Assert: Check they all go to the other replica.
+    """
+    pool = ReplicaPool(["http://a", "http://b"])
+    release = asyncio.Event()
+    calls = []
+
+    async def send(url):
+        calls.append(url)
+        if len(calls) == 1:
+            await release.wait()
+        return url
+
+    held = asyncio.create_task(pool.request(send))
+    await asyncio.sleep(0)
+    others = [await pool.request(send) for _ in range(3)]
+    release.set()
+    first = await held
+
+    assert first not in others
+    assert len(set(others)) == 1
+
+@pytest.mark.anyio
+async def test_should_fail_over_and_eject_a_failing_replica():
+    """Test failover and passive ejection.
+
+    Arrange: Two replicas of which one refuses connections.
+    Act: Send several requests.
+    Assert: Check every request succeeds and the failing replica is ejected
+        after three failures and receives no more requests.
+    """
+    pool = ReplicaPool(["http://down", "http://up"], eject_after=3, eject_seconds=60)
+    calls = []
+
+    async def send(url):
+        calls.append(url)
+        if url == "http://down":
+            raise httpx.ConnectError("refused")
+        return url
+
+    results = [await pool.request(send) for _ in range(10)]
+
+    assert results == ["http://up"] * 10
+    assert calls.count("http://down") == 3
+    assert pool.pick().url == "http://up"
+
+@pytest.mark.anyio
+async def test_should_not_retry_client_errors():
+    """Test that 4xx responses are raised without failover.
+
+    Arrange: Two replicas that both answer 422.
+    Act: Send a request.
+    Assert: Check the error is raised after one attempt and nobody is marked failing.
+    """
+    pool = ReplicaPool(["http://a", "http://b"])
+    calls = []
+
+    async def send(url):
+        calls.append(url)
+        raise _status_error(422)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await pool.request(send)
+
+    assert len(calls) == 1
+    assert all(replica.consecutive_failures == 0 for replica in pool.replicas)
+
+@pytest.mark.anyio
+async def test_should_hedge_a_slow_request_to_another_replica():
+    """Test hedged requests.
+
+    Arrange: A slow and a fast replica with a short hedge delay.
+    Act: Send requests until one starts on the slow replica.
+    Assert: Check it is answered by the fast replica and the slow attempt
+        is cancelled.
+    """
+    pool = ReplicaPool(["http://slow", "http://fast"], hedge_after=0.01)
+
+    async def send(url):
+        if url == "http://slow":
+            await asyncio.sleep(5)
+        return url
+
+    results = [await pool.request(send) for _ in range(2)]
+
+    assert results == ["http://fast", "http://fast"]
+    assert all(replica.outstanding == 0 for replica in pool.replicas)
+
+@pytest.mark.anyio
+async def test_should_retry_an_overloaded_replica_after_retry_after():
+    """Test back-pressure from a single replica.
+
+    Arrange: One replica that answers 503 with Retry-After twice, then succeeds.
+    Act: Send a request.
+    Assert: Check it succeeds on the third attempt and the replica is not
+        counted as failing or ejected.
+    """
+    pool = ReplicaPool(["http://a"], eject_after=1)
+    calls = []
+
+    async def send(url):
+        calls.append(url)
+        if len(calls) < 3:
+            raise _status_error(503, {"Retry-After": "0"})
+        return url
+
+    assert await pool.request(send) == "http://a"
+    assert len(calls) == 3
+    assert pool.replicas[0].consecutive_failures == 0
+    assert pool.replicas[0].ejected_until == 0.0
+
+@pytest.mark.anyio
+async def test_should_give_up_after_overload_retries():
+    """Test the bound on back-pressure retries.
+
+    Arrange: One replica that always answers 503 with Retry-After.
+    Act: Send a request with two overload retries.
+    Assert: Check the 503 is raised after three attempts.
+    """
+    pool = ReplicaPool(["http://a"], overload_retries=2)
+    calls = []
+
+    async def send(url):
+        calls.append(url)
+        raise _status_error(503, {"Retry-After": "0"})
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await pool.request(send)
+
+    assert len(calls) == 3
+
+@pytest.mark.anyio
+async def test_should_fail_over_from_an_overloaded_replica_without_waiting():
+    """Test that back-pressure prefers another replica over sleeping.
+
+    Arrange: Two replicas of which one is overloaded with a long Retry-After.
+    Act: Send several requests.
+    Assert: Check each is answered by the other replica and the overloaded
+        one is never ejected.
+    """
+    pool = ReplicaPool(["http://busy", "http://idle"], eject_after=1)
+
+    async def send(url):
+        if url == "http://busy":
+            raise _status_error(503, {"Retry-After": "60"})
+        return url
+
+    results = await asyncio.wait_for(asyncio.gather(*(pool.request(send) for _ in range(4))), timeout=5)
+
+    assert results == ["http://idle"] * 4
+    assert pool.replicas[0].ejected_until == 0.0
@@ -0,0 +1,65 @@
+import pytest
+from unittest.mock import patch
+from src.services.cache import LocalCache, cache_stats
+
+@pytest.mark.anyio
+async def test_should_evict_least_recently_used_entries():
+    """Test the size bound of the in-process LRU.
+
+    Arrange: Create a cache of 2 entries holding "a" and "b", then read "a".
+    Act: Store "c".
+    Assert: Check "b" was evicted while "a" and "c" are still cached.
+    """
+    cache = LocalCache("test_lru", namespace="model", max_entries=2)
+    await cache.set("a", {"x": 1.0})
+    await cache.set("b", {"y": 1.0})
+    await cache.get("a")
+
+    await cache.set("c", {"z": 1.0})
+
+    assert await cache.get("a") == {"x": 1.0}
+    assert await cache.get("b") is None
+    assert await cache.get("c") == {"z": 1.0}
+    assert cache.stats.evictions == 1
+
+@pytest.mark.anyio
+async def test_should_expire_entries_after_ttl():
+    """Test TTL eviction.
+
+    Arrange: Store an entry with a 60 second TTL.
+    Act: Read it before and after the TTL has passed.
+    Assert: Check the first read hits and the second misses.
+    """
+    cache = LocalCache("test_ttl", namespace="model", ttl=60)
+    with patch("src.services.cache.time.time", return_value=1000.0):
+        await cache.set("q", {"x": 1.0})
+        first = await cache.get("q")
+    with patch("src.services.cache.time.time", return_value=1061.0):
+        second = await cache.get("q")
+
+    assert first == {"x": 1.0}
+    assert second is None
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+
+@pytest.mark.anyio
+async def test_should_share_entries_through_sqlite_tier(tmp_path):
+    """Test the optional SQLite tier shared between processes.
+
+    Arrange: Store an entry through one cache backed by a SQLite file.
+    Act: Read it through a second cache on the same file, and through one
+        with another namespace.
+    Assert: Check the second cache gets a shared hit and the other namespace misses.
+    """
+    path = str(tmp_path / "cache.sqlite3")
+    writer = LocalCache("test_writer", namespace="model-a", path=path)
+    await writer.set("q", {"x": 0.5})
+
+    reader = LocalCache("test_reader", namespace="model-a", path=path)
+    other = LocalCache("test_other", namespace="model-b", path=path)
+
+    assert await reader.get("q") == {"x": 0.5}
+    assert await other.get("q") is None
+    assert reader.stats.shared_hits == 1
+    assert cache_stats()["test_reader"]["hit_rate"] == 1.0
+    for cache in (writer, reader, other):
+        cache.close()
@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 from fastapi.testclient import TestClient
@@ -9,6 +10,12 @@ from src.api.v1.endpoints.chat import get_chat_service
 
 client = TestClient(app)
 
+@pytest.fixture(autouse=True)
+def fixed_encoder_model(monkeypatch):
+    # The query cache is namespaced by the encoder's /info; keep tests off the network
+    from src.services.encoder import EncoderClient
+    monkeypatch.setattr(EncoderClient, "model_key", AsyncMock(return_value="test-model@v1"))
+
 def test_chat_endpoint_success():
     """Test the /chat endpoint for a successful response."""
     # Mock ChatService.process_query
@@ -179,3 +186,323 @@ async def test_chat_service_process_query_cleans_input(mock_post, mock_es):
     encoder_call_args = mock_post.call_args_list[0]
     payload = encoder_call_args.kwargs["json"]
     assert payload["text"] == "Tell me about tests!"
+
+@pytest.mark.anyio
+async def test_should_serve_repeated_queries_from_the_embedding_cache():
+    """Test that a repeated query does not call the encoder again.
+
+    Arrange: Mock the encoder to return a vector once, then fail.
+    Act: Request embeddings for the same query twice.
+    Assert: Check both calls return the vector and the encoder ran once.
+    """
+    with patch("src.services.chat.AsyncElasticsearch"):
+        service = ChatService()
+    service.encoder.encode = AsyncMock(side_effect=[{"token1": 1.0}, Exception("down")])
+
+    first = await service.get_sparse_embeddings("repeated question")
+    second = await service.get_sparse_embeddings("repeated question")
+
+    assert first == second == {"token1": 1.0}
+    service.encoder.encode.assert_awaited_once_with("repeated question")
+    assert service.query_cache.stats.hits == 1
+
+@pytest.mark.anyio
+async def test_should_not_serve_cached_query_vectors_after_the_encoder_model_changes(monkeypatch):
+    """Test that the query cache is namespaced by the encoder's model key.
+
+    Arrange: Cache a query vector, then let the encoder report another model key.
+    Act: Request the same query again after the check interval.
+    Assert: Check the encoder is called again for the new model.
+    """
+    monkeypatch.setattr(settings, "ENCODER_MODEL_CHECK_INTERVAL", 0.0)
+    with patch("src.services.chat.AsyncElasticsearch"):
+        service = ChatService()
+    service.encoder.model_key = AsyncMock(side_effect=["m@v1:top_k=None", "m@v1:top_k=64"])
+    service.encoder.encode = AsyncMock(side_effect=[{"token1": 1.0}, {"token1": 0.5}])
+
+    first = await service.get_sparse_embeddings("question")
+    second = await service.get_sparse_embeddings("question")
+
+    assert (first, second) == ({"token1": 1.0}, {"token1": 0.5})
+    assert service.encoder.encode.await_count == 2
+
+@pytest.mark.anyio
+async def test_should_cache_search_results_until_the_index_generation_changes():
+    """Test the retrieval cache and its invalidation by index generation.
+
+    Arrange: Mock a search hit and an index generation document.
+    Act: Retrieve the same vector twice, bump the generation, retrieve again.
+    Assert: Check Elasticsearch is searched once per generation.
+    """
+    with patch("src.services.chat.AsyncElasticsearch") as mock_es_cls:
+        mock_es = mock_es_cls.return_value
+        mock_es.search = AsyncMock(return_value={
+            "hits": {"hits": [{"_source": {"text": "Body", "metadata": {"title": "Page"}}, "_score": 2.0}]}
+        })
+        mock_es.options.return_value.get = AsyncMock(return_value={"found": True, "_source": {"generation": 1}})
+        service = ChatService()
+
+    first, _ = await service.retrieve_contexts({"b": 0.5, "a": 1.0})
+    second, hits = await service.retrieve_contexts({"a": 1.0, "b": 0.5})
+    assert mock_es.search.await_count == 1
+    assert first == second
+    assert hits[0]["text"] == "Body"
+
+    mock_es.options.return_value.get.return_value = {"found": True, "_source": {"generation": 2}}
+    service._generation_checked_at = None
+    await service.retrieve_contexts({"a": 1.0, "b": 0.5})
+    assert mock_es.search.await_count == 2
+
+@pytest.mark.anyio
+async def test_should_search_with_pruned_vector_and_rescore_with_full_vector(monkeypatch):
+    """Test the two-phase retrieval mode.
+
+    Arrange: Limit queries to 2 terms and enable rescoring.
+    Act: Retrieve contexts for a 3-term vector.
+    Assert: Check the query has the 2 heaviest terms and the rescore query all 3.
+    """
+    monkeypatch.setattr(settings, "QUERY_MAX_TERMS", 2)
+    monkeypatch.setattr(settings, "QUERY_RESCORE", True)
+    with patch("src.services.chat.AsyncElasticsearch") as mock_es_cls:
+        mock_es = mock_es_cls.return_value
+        mock_es.search = AsyncMock(return_value={"hits": {"hits": []}})
+        mock_es.options.return_value.get = AsyncMock(return_value={"found": False})
+        service = ChatService()
+
+    await service.retrieve_contexts({"low": 0.1, "high": 2.0, "mid": 1.0})
+
+    body = mock_es.search.call_args.kwargs["body"]
+    fields = lambda query: [c["rank_feature"]["field"] for c in query["bool"]["should"]]
+    assert fields(body["query"]) == ["sparse_vector.high", "sparse_vector.mid"]
+    assert len(fields(body["rescore"]["query"]["rescore_query"])) == 3
+    assert body["rescore"]["query"]["query_weight"] == 0.0
+
+def test_should_stream_sources_then_tokens_as_server_sent_events():
+    """Test the /chat/stream endpoint.
+
+    Arrange: Mock a service that builds a prompt and streams two tokens.
+    Act: POST to /chat/stream.
+    Assert: Check the events arrive as sources, token, token, done.
+    """
+    async def tokens(prompt):
+        for token in ["こん", "にちは"]:
+            yield token
+
+    mock_service_instance = MagicMock()
+    mock_service_instance.build_prompt = AsyncMock(return_value=(
+        "prompt", [Source(title="Test Page", url="https://example.com", score=0.95)]
+    ))
+    mock_service_instance.stream_answer = tokens
+    app.dependency_overrides[get_chat_service] = lambda: mock_service_instance
+
+    try:
+        response = client.post(f"{settings.API_V1_STR}/chat/stream", json={"query": "hello"})
+    finally:
+        app.dependency_overrides = {}
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+    assert [e[0] for e in events] == ["event: sources", "event: token", "event: token", "event: done"]
+    assert '"Test Page"' in events[0][1]
+    assert events[1][1] == 'data: {"token": "こん"}'
+
+@pytest.mark.anyio
+async def test_should_yield_ollama_tokens_until_done():
+    """Test parsing of Ollama's NDJSON stream.
+
+    Arrange: Mock a streamed response with two fragments, a done marker and trailing data.
+    Act: Iterate stream_answer.
+    Assert: Check only the fragments before done are yielded, with streaming enabled.
+    """
+    lines = ['{"response": "A", "done": false}', "", '{"response": "B", "done": false}',
+             '{"response": "", "done": true}', '{"response": "ignored"}']
+
+    async def aiter_lines():
+        for line in lines:
+            yield line
+
+    response = MagicMock(aiter_lines=aiter_lines)
+    stream = MagicMock()
+    stream.return_value.__aenter__ = AsyncMock(return_value=response)
+    stream.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    with patch("src.services.chat.AsyncElasticsearch"), \
+         patch("src.services.chat.get_http_client") as mock_get_client:
+        mock_get_client.return_value.stream = stream
+        service = ChatService()
+        tokens = [token async for token in service.stream_answer("prompt")]
+
+    assert tokens == ["A", "B"]
+    assert stream.call_args.kwargs["json"]["stream"] is True
+    stream.return_value.__aexit__.assert_awaited_once()
+
+@pytest.mark.anyio
+async def test_should_fall_back_to_bm25_when_encoding_times_out(monkeypatch):
+    """Test the hybrid pipeline degrading past a slow encoder.
+
+    Arrange: Enable hybrid mode with a short encode budget and a hanging encoder.
+    Act: Build the prompt.
+    Assert: Check the BM25 hit is used and every stage is timed.
+    """
+    monkeypatch.setattr(settings, "RETRIEVAL_MODE", "hybrid")
+    monkeypatch.setattr(settings, "ENCODE_TIMEOUT", 0.05)
+    with patch("src.services.chat.AsyncElasticsearch") as mock_es_cls:
+        mock_es = mock_es_cls.return_value
+        mock_es.search = AsyncMock(return_value={
+            "hits": {"hits": [{"_source": {"text": "BM25 body", "metadata": {"title": "Keyword Page"}}, "_score": 3.0}]}
+        })
+        service = ChatService()
+
+    async def hanging_encode(text):
+        await asyncio.sleep(10)
+
+    service.encoder.encode = hanging_encode
+    timings = {}
+
+    prompt, sources = await service.build_prompt("keyword", timings=timings)
+
+    assert [source.title for source in sources] == ["Keyword Page"]
+    assert "BM25 body" in prompt
+    assert mock_es.search.call_args.kwargs["body"]["query"] == {"match": {"text": "keyword"}}
+    assert {"bm25", "encode", "search", "retrieval"} <= timings.keys()
+    assert timings["encode"] < 1000
+
+@pytest.mark.anyio
+async def test_should_load_the_ollama_model_when_it_is_not_running(monkeypatch):
+    """Test the background Ollama warm-up.
+
+    Arrange: Enable warm-up and report no loaded models.
+    Act: Start the warm-up twice in a row.
+    Assert: Check one load request with keep_alive is sent.
+    """
+    monkeypatch.setattr(settings, "OLLAMA_WARMUP", True)
+    with patch("src.services.chat.AsyncElasticsearch"), \
+         patch("src.services.chat.get_http_client") as mock_get_client:
+        ollama = mock_get_client.return_value
+        ollama.get = AsyncMock(return_value=MagicMock(json=MagicMock(return_value={"models": []})))
+        ollama.post = AsyncMock()
+        service = ChatService()
+
+        service._start_warm_up()
+        service._start_warm_up()
+        await service._warm_up_task
+
+    ollama.post.assert_awaited_once()
+    assert ollama.post.call_args.kwargs["json"]["keep_alive"] == settings.OLLAMA_KEEP_ALIVE
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("configured, running, loads", [
+    ("gemma3:4b", "gemma3:27b", True),
+    ("gemma3", "gemma3:latest", False),
+    ("gemma3:latest", "gemma3", False),
+])
+async def test_should_compare_full_ollama_model_tags(monkeypatch, configured, running, loads):
+    """Test that the warm-up tells model tags apart.
+
+    Arrange: Configure one model tag and report another as running.
+    Act: Run the warm-up.
+    Assert: Check the model is loaded only when the full tags differ, with
+        a missing tag meaning latest.
+    """
+    monkeypatch.setattr(settings, "OLLAMA_WARMUP", True)
+    monkeypatch.setattr(settings, "EMBEDDING_MODEL", configured)
+    with patch("src.services.chat.AsyncElasticsearch"), \
+         patch("src.services.chat.get_http_client") as mock_get_client:
+        ollama = mock_get_client.return_value
+        ollama.get = AsyncMock(return_value=MagicMock(json=MagicMock(return_value={"models": [{"name": running}]})))
+        ollama.post = AsyncMock()
+        service = ChatService()
+
+        await service._warm_up_ollama()
+
+    assert ollama.post.await_count == (1 if loads else 0)
+
+@pytest.mark.anyio
+async def test_should_cancel_the_bm25_search_when_the_request_is_cancelled(monkeypatch):
+    """Test that hybrid retrieval does not leak its BM25 task.
+
+    Arrange: Enable hybrid mode with a hanging encoder and BM25 search.
+    Act: Cancel build_prompt while both are running.
+    Assert: Check the BM25 search is cancelled too.
+    """
+    monkeypatch.setattr(settings, "RETRIEVAL_MODE", "hybrid")
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def search(index, body):
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with patch("src.services.chat.AsyncElasticsearch") as mock_es_cls:
+        mock_es_cls.return_value.search = AsyncMock(side_effect=search)
+        service = ChatService()
+
+    async def hanging_encode(text):
+        await asyncio.sleep(10)
+
+    service.encoder.encode = hanging_encode
+
+    request = asyncio.create_task(service.build_prompt("query"))
+    await asyncio.wait_for(started.wait(), 1)
+    request.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await request
+
+    await asyncio.wait_for(cancelled.wait(), 1)
+
+@pytest.mark.anyio
+async def test_should_serve_bm25_results_when_the_encoder_is_down():
+    """Test the BM25-only fallback in SPLADE mode.
+
+    Arrange: Make the encoder raise and mock a BM25 hit.
+    Act: Build the prompt.
+    Assert: Check the single search is a BM25 match and its hit is used.
+    """
+    with patch("src.services.chat.AsyncElasticsearch") as mock_es_cls:
+        mock_es = mock_es_cls.return_value
+        mock_es.search = AsyncMock(return_value={
+            "hits": {"hits": [{"_source": {"text": "Body", "metadata": {"title": "Keyword Page"}}, "_score": 3.0}]}
+        })
+        service = ChatService()
+    service.encoder.encode = AsyncMock(side_effect=Exception("encoder down"))
+
+    _, sources = await service.build_prompt("keyword")
+
+    assert [source.title for source in sources] == ["Keyword Page"]
+    mock_es.search.assert_awaited_once()
+    assert mock_es.search.call_args.kwargs["body"]["query"] == {"match": {"text": "keyword"}}
+
+@pytest.mark.anyio
+async def test_should_fuse_bm25_and_splade_rankings_in_hybrid_mode(monkeypatch):
+    """Test hybrid retrieval end to end.
+
+    Arrange: Enable hybrid mode and mock different SPLADE and BM25 rankings.
+    Act: Build the prompt.
+    Assert: Check the page found by both retrievers is ranked first.
+    """
+    monkeypatch.setattr(settings, "RETRIEVAL_MODE", "hybrid")
+
+    def hit(doc_id, title):
+        return {"_id": doc_id, "_source": {"text": title, "metadata": {"title": title}}, "_score": 1.0}
+
+    async def search(index, body):
+        if "match" in body["query"]:
+            return {"hits": {"hits": [hit("2", "Both"), hit("3", "BM25 only")]}}
+        return {"hits": {"hits": [hit("1", "SPLADE only"), hit("2", "Both")]}}
+
+    with patch("src.services.chat.AsyncElasticsearch") as mock_es_cls:
+        mock_es = mock_es_cls.return_value
+        mock_es.search = AsyncMock(side_effect=search)
+        mock_es.options.return_value.get = AsyncMock(return_value={"found": False})
+        service = ChatService()
+    service.encoder.encode = AsyncMock(return_value={"token": 1.0})
+
+    _, sources = await service.build_prompt("query")
+
+    assert [source.title for source in sources] == ["Both", "SPLADE only", "BM25 only"]
+    assert mock_es.search.await_count == 2
@@ -0,0 +1,103 @@
+from src.services.context import build_context, estimate_tokens, truncate_to_tokens
+
+def _hit(title, chunk_id, text, score):
+    return {"_source": {"text": text, "metadata": {"title": title, "chunk_id": chunk_id}}, "text": text, "_score": score}
+
+def test_should_merge_adjacent_chunks_and_remove_their_overlap():
+    """Test merging of neighbouring chunks from one page.
+
+    Arrange: Use chunks 0 and 1 of a page sharing an overlap, plus chunk 3.
+    Act: Build the context.
+    Assert: Check chunks 0-1 become one passage without the repeated text
+        and chunk 3 stays separate.
+    """
+    hits = [
+        _hit("Page", 1, "shared overlap text, second part", 1.0),
+        _hit("Page", 0, "first part, shared overlap text", 2.0),
+        _hit("Page", 3, "far away chunk", 0.5),
+    ]
+
+    context = build_context(hits, max_tokens=1000)
+
+    assert context == (
+        "Source: Page\nContent: first part, shared overlap text, second part"
+        "\n\nSource: Page\nContent: far away chunk"
+    )
+
+def test_should_drop_passages_already_contained_in_a_better_one():
+    """Test deduplication of repeated text across pages.
+
+    Arrange: Use a copied paragraph on a second, lower scored page.
+    Act: Build the context.
+    Assert: Check only the better scored passage is kept.
+    """
+    hits = [_hit("Original", 0, "the same paragraph", 2.0), _hit("Copy", 4, "same paragraph", 1.0)]
+
+    context = build_context(hits, max_tokens=1000)
+
+    assert "Copy" not in context
+
+def test_should_replace_a_kept_passage_with_a_worse_one_that_contains_it():
+    """Test deduplication when the lower scored passage is the longer one.
+
+    Arrange: Use a short paragraph and a lower scored page that quotes it in full.
+    Act: Build the context.
+    Assert: Check the text appears once, from the containing passage, in
+        the better passage's place.
+    """
+    hits = [
+        _hit("Short", 0, "the same paragraph", 2.0),
+        _hit("Other", 0, "unrelated passage", 1.5),
+        _hit("Long", 0, "intro, the same paragraph, outro", 1.0),
+    ]
+
+    context = build_context(hits, max_tokens=1000)
+
+    assert context == (
+        "Source: Long\nContent: intro, the same paragraph, outro"
+        "\n\nSource: Other\nContent: unrelated passage"
+    )
+
+def test_should_keep_filling_the_budget_after_a_passage_that_does_not_fit():
+    """Test that a long passage does not crowd out shorter ones.
+
+    Arrange: Use a long passage between two short ones and a budget that
+        only leaves room for short passages after the first.
+    Act: Build the context.
+    Assert: Check both short passages are kept whole in score order.
+    """
+    hits = [_hit("First", 0, "一" * 20, 0.9), _hit("Long", 0, "長" * 200, 0.5), _hit("Last", 0, "末" * 20, 0.1)]
+
+    context = build_context(hits, max_tokens=70)
+
+    assert context.startswith("Source: First\nContent: " + "一" * 20)
+    assert context.endswith("Source: Last\nContent: " + "末" * 20)
+    assert "長" not in context
+
+def test_should_fill_the_budget_by_score_and_truncate_the_overflowing_passage():
+    """Test the token budget.
+
+    Arrange: Use three 100-character Japanese passages and a 180 token budget.
+    Act: Build the context.
+    Assert: Check the best passage is whole, the second is truncated and
+        the third is left out.
+    """
+    hits = [_hit("Low", 0, "低" * 100, 0.1), _hit("High", 0, "高" * 100, 0.9), _hit("Mid", 0, "中" * 100, 0.5)]
+
+    context = build_context(hits, max_tokens=180)
+
+    assert context.startswith("Source: High\nContent: " + "高" * 100)
+    assert "中" in context and "中" * 100 not in context
+    assert "Low" not in context
+    assert estimate_tokens(context) <= 180
+
+def test_should_estimate_and_truncate_by_token_count():
+    """Test the token estimate used for budgeting.
+
+    Arrange: Use ASCII and Japanese text.
+    Act: Estimate and truncate them.
+    Assert: Check 4 ASCII characters or 1 Japanese character count as a token.
+    """
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("日本語") == 3
+    assert truncate_to_tokens("日本語テキスト", 3) == "日本語"
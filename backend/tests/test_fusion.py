@@ -0,0 +1,41 @@
+import pytest
+from src.services.fusion import fuse_hits
+
+SPLADE = [{"_id": "a", "_score": 9.0}, {"_id": "b", "_score": 5.0}]
+BM25 = [{"_id": "b", "_score": 20.0}, {"_id": "c", "_score": 10.0}]
+
+def test_should_rank_hits_found_by_both_retrievers_first_with_rrf():
+    """Test reciprocal rank fusion.
+
+    Arrange: Use two rankings that share one hit.
+    Act: Fuse them with equal weights.
+    Assert: Check the shared hit wins and scores follow 1 / (k + rank).
+    """
+    fused = fuse_hits([SPLADE, BM25], weights=[1.0, 1.0], method="rrf", rrf_k=60)
+
+    assert [hit["_id"] for hit in fused] == ["b", "a", "c"]
+    assert fused[0]["_score"] == pytest.approx(1 / 62 + 1 / 61)
+
+def test_should_fuse_normalized_scores_with_weights():
+    """Test weighted score fusion.
+
+    Arrange: Use the same rankings and favour BM25 three to one.
+    Act: Fuse them by normalized score.
+    Assert: Check BM25's top hits come first.
+    """
+    fused = fuse_hits([SPLADE, BM25], weights=[1.0, 3.0], method="weighted")
+
+    assert [hit["_id"] for hit in fused] == ["b", "a", "c"]
+    assert fused[0]["_score"] == pytest.approx(3.0)
+    assert fused[1]["_score"] == pytest.approx(1.0)
+
+def test_should_degrade_to_the_remaining_ranking_when_one_is_empty():
+    """Test fusion when a retriever returned nothing.
+
+    Arrange: Use an empty SPLADE ranking.
+    Act: Fuse it with BM25.
+    Assert: Check the BM25 order is kept.
+    """
+    fused = fuse_hits([[], BM25], weights=[1.0, 1.0])
+
+    assert [hit["_id"] for hit in fused] == ["b", "c"]
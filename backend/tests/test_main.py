@@ -13,3 +13,19 @@ def test_should_read_root_endpoint():
     response = client.get("/")
     assert response.status_code == 200
     assert response.json() == {"message": "Welcome to rag-cosense API"}
+
+def test_should_expose_prometheus_metrics():
+    """Test the /metrics endpoint.
+
+    Arrange: Serve one request so the latency histogram has a sample.
+    Act: Make a GET request to /metrics.
+    Assert: Check the text format and the per-route request histogram.
+    """
+    client.get("/")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'backend_http_request_seconds_count{method="GET",route="/",status="200"}' in response.text
+    assert "backend_ollama_first_token_seconds" in response.text
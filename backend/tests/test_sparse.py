@@ -0,0 +1,34 @@
+from src.services.sparse import prune_vector
+
+VECTOR = {"a": 4.0, "b": 3.0, "c": 2.0, "d": 1.0, "": 5.0}
+
+def test_should_keep_all_non_empty_terms_by_default():
+    """Test that pruning without limits only drops empty tokens.
+
+    Arrange: Use a vector with an empty token.
+    Act: Prune it with default settings.
+    Assert: Check every other term is kept, heaviest first.
+    """
+    pruned = prune_vector(VECTOR)
+
+    assert list(pruned) == ["a", "b", "c", "d"]
+
+def test_should_apply_top_k_min_weight_and_mass_cutoffs():
+    """Test each pruning rule.
+
+    Arrange: Use a vector whose weights sum to 10.
+    Act: Prune it by term count, by minimum weight and by cumulative mass.
+    Assert: Check the kept terms for each rule.
+    """
+    assert list(prune_vector(VECTOR, max_terms=2)) == ["a", "b"]
+    assert list(prune_vector(VECTOR, min_weight=2.5)) == ["a", "b"]
+    assert list(prune_vector(VECTOR, mass_cutoff=0.8)) == ["a", "b", "c"]
+
+def test_should_always_keep_the_heaviest_term():
+    """Test that a non-empty vector never prunes to nothing.
+
+    Arrange: Use a minimum weight above every term.
+    Act: Prune the vector.
+    Assert: Check the heaviest term is still kept.
+    """
+    assert prune_vector(VECTOR, min_weight=100.0) == {"a": 4.0}
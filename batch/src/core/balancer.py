@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, List, Optional, Sequence, TypeVar
+import httpx
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+def service_urls(urls: str, fallback: str) -> List[str]:
+    """Splits a comma-separated URL list, falling back to a single URL when it is empty."""
+    parsed = [url.strip().rstrip("/") for url in urls.split(",") if url.strip()]
+    return parsed or [fallback]
+
+def overload_delay(error: BaseException) -> Optional[float]:
+    """Seconds to back off if ``error`` is a 503 with Retry-After, i.e. a healthy but busy replica."""
+    if not isinstance(error, httpx.HTTPStatusError) or error.response.status_code != 503:
+        return None
+    try:
+        return max(0.0, float(error.response.headers.get("Retry-After", "")))
+    except ValueError:
+        return None
+
+def is_replica_failure(error: BaseException) -> bool:
+    """Whether ``error`` says something about the replica rather than the request.
+
+    Connection errors, timeouts and 5xx responses count against a replica;
+    4xx responses would fail on any replica and are not retried. A 503 with
+    Retry-After is back-pressure from a working replica, not a failure.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 and overload_delay(error) is None
+    return isinstance(error, httpx.TransportError)
+
+@dataclass(eq=False)
+class Replica:
+    """One endpoint of a ``ReplicaPool`` and its passive health."""
+    url: str
+    outstanding: int = 0
+    consecutive_failures: int = 0
+    ejections: int = 0
+    ejected_until: float = 0.0
+
+class ReplicaPool:
+    """Client-side load balancing over replicas of one service.
+
+    Requests go to the healthy replica with the fewest outstanding
+    requests. Health is tracked passively from real traffic: after
+    ``eject_after`` consecutive failures a replica is ejected for
+    ``eject_seconds``, doubling with every further ejection up to
+    ``max_eject_seconds``, and rejoins on its next success. If every
+    replica is ejected, the one due back first is used anyway.
+
+    A request that fails on one replica is retried on another, and with
+    ``hedge_after`` set a second copy is sent to another replica when the
+    first has not answered in time; the first response wins. Either way a
+    request reaches at most ``max_attempts`` distinct replicas.
+
+    A replica answering 503 with Retry-After is overloaded, not broken: it
+    is not counted towards ejection, and when no other replica is left to
+    try the request is sent again after the advertised delay, up to
+    ``overload_retries`` times.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        eject_after: int = 3,
+        eject_seconds: float = 10.0,
+        max_eject_seconds: float = 120.0,
+        hedge_after: Optional[float] = None,
+        max_attempts: int = 2,
+        overload_retries: int = 3,
+        max_overload_delay: float = 30.0,
+        events: Optional[Any] = None
+    ) -> None:
+        if not urls:
+            raise ValueError("A replica pool needs at least one URL")
+        self.replicas = [Replica(url) for url in urls]
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self.hedge_after = hedge_after
+        self.max_attempts = max(1, max_attempts)
+        self.overload_retries = overload_retries
+        self.max_overload_delay = max_overload_delay
+        # Optional Prometheus counter labelled by event
+        self.events = events
+        self._turn = 0
+
+    def _event(self, name: str) -> None:
+        if self.events is not None:
+            self.events.labels(event=name).inc()
+
+    def pick(self, exclude: Sequence[Replica] = ()) -> Optional[Replica]:
+        """Returns the healthy replica with the fewest outstanding requests, or None if all are excluded."""
+        candidates = [replica for replica in self.replicas if replica not in exclude]
+        if not candidates:
+            return None
+        now = time.monotonic()
+        healthy = [replica for replica in candidates if replica.ejected_until <= now]
+        if not healthy:
+            return min(candidates, key=lambda replica: replica.ejected_until)
+        # Rotate the start so that ties are spread round-robin
+        self._turn += 1
+        start = self._turn % len(healthy)
+        return min(healthy[start:] + healthy[:start], key=lambda replica: replica.outstanding)
+
+    def _succeeded(self, replica: Replica) -> None:
+        if replica.ejections:
+            logger.info(f"Replica {replica.url} is healthy again")
+        replica.consecutive_failures = 0
+        replica.ejections = 0
+        replica.ejected_until = 0.0
+
+    def _failed(self, replica: Replica, error: BaseException) -> None:
+        replica.consecutive_failures += 1
+        if replica.consecutive_failures < self.eject_after:
+            return
+        seconds = min(self.max_eject_seconds, self.eject_seconds * 2 ** replica.ejections)
+        replica.ejections += 1
+        replica.ejected_until = time.monotonic() + seconds
+        self._event("ejection")
+        logger.warning(f"Ejecting replica {replica.url} for {seconds:.0f}s after {replica.consecutive_failures} failures: {error}")
+
+    async def _attempt(self, replica: Replica, send: Callable[[str], Awaitable[T]]) -> T:
+        replica.outstanding += 1
+        try:
+            result = await send(replica.url)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if is_replica_failure(e):
+                self._failed(replica, e)
+            raise
+        finally:
+            replica.outstanding -= 1
+        self._succeeded(replica)
+        return result
+
+    async def request(self, send: Callable[[str], Awaitable[T]]) -> T:
+        """Runs ``send(base_url)`` on the best replica, failing over and hedging as configured.
+
+        Errors that are not replica failures are raised at once; otherwise
+        the last replica failure is raised when no attempt succeeded. If the
+        last attempt was turned away as overloaded, the whole request is
+        retried after its Retry-After delay.
+        """
+        retries = 0
+        while True:
+            try:
+                return await self._dispatch(send)
+            except httpx.HTTPStatusError as e:
+                delay = overload_delay(e)
+                if delay is None or retries >= self.overload_retries:
+                    raise
+            retries += 1
+            delay = min(delay, self.max_overload_delay)
+            self._event("overload")
+            logger.info(f"Replicas are overloaded; retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def _dispatch(self, send: Callable[[str], Awaitable[T]]) -> T:
+        limit = min(self.max_attempts, len(self.replicas))
+        tried: List[Replica] = []
+        attempts: dict[asyncio.Task[T], Replica] = {}
+
+        def launch() -> None:
+            replica = self.pick(exclude=tried)
+            assert replica is not None
+            tried.append(replica)
+            attempts[asyncio.create_task(self._attempt(replica, send))] = replica
+
+        launch()
+        error: Optional[BaseException] = None
+        try:
+            while attempts:
+                can_hedge = self.hedge_after is not None and len(tried) < limit
+                done, _ = await asyncio.wait(
+                    attempts, timeout=self.hedge_after if can_hedge else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    self._event("hedge")
+                    launch()
+                    continue
+                for task in done:
+                    del attempts[task]
+                    error = task.exception()
+                    if error is None:
+                        return task.result()
+                    if not is_replica_failure(error) and overload_delay(error) is None:
+                        raise error
+                if not attempts and len(tried) < limit:
+                    self._event("failover")
+                    launch()
+        finally:
+            for task in attempts:
+                task.cancel()
+            await asyncio.gather(*attempts, return_exceptions=True)
+        assert error is not None
+        raise error
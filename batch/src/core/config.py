@@ -1,3 +1,4 @@
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -15,9 +16,89 @@ class Settings(BaseSettings):
     # External Services
     ELASTICSEARCH_URL: str = "http://elasticsearch:9200"
     ENCODER_SERVICE_URL: str = "http://encoder:8001"
+    # Comma-separated encoder replicas to balance over; empty uses ENCODER_SERVICE_URL alone
+    ENCODER_SERVICE_URLS: str = ""
+    # "json" (feature-name dict), "compact" (id/weight JSON arrays) or "msgpack"
+    ENCODER_WIRE_FORMAT: Literal["json", "compact", "msgpack"] = "json"
     
     # Cosense Configuration
     COSENSE_PROJECT_NAME: str = ""
     COSENSE_SID: str = ""
+    # Pages per listing request (the API accepts up to 1000)
+    COSENSE_PAGE_SIZE: int = 1000
+    # Requests per second (0 disables the limit), burst size and parallel request cap
+    COSENSE_RATE_LIMIT: float = 5.0
+    COSENSE_BURST: int = 5
+    COSENSE_CONCURRENCY: int = 4
+    # Retries per request (backoff in seconds), then rounds of re-fetching deferred pages at the end of a run
+    COSENSE_MAX_RETRIES: int = 5
+    COSENSE_BACKOFF_BASE: float = 0.5
+    COSENSE_BACKOFF_MAX: float = 30.0
+    COSENSE_RETRY_ROUNDS: int = 1
+
+    # Shared HTTP clients (timeouts in seconds). HTTP/2 is only negotiated with
+    # https upstreams, i.e. Cosense, and needs the h2 package from httpx[http2]
+    HTTP2_ENABLED: bool = True
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    COSENSE_TIMEOUT: float = 30.0
+    COSENSE_MAX_CONNECTIONS: int = 10
+    ENCODER_TIMEOUT: float = 60.0
+    ENCODER_MAX_CONNECTIONS: int = 10
+    # Consecutive failures before a replica is ejected, and the first ejection (doubles on repeats)
+    ENCODER_EJECT_AFTER_FAILURES: int = 3
+    ENCODER_EJECT_SECONDS: float = 10.0
+    # Replicas one request may reach (failover and hedging); a hedge is sent after this many seconds, None disables
+    ENCODER_MAX_ATTEMPTS: int = 2
+    ENCODER_HEDGE_AFTER: Optional[float] = None
+    # Times a request is resent after every replica answered 503 with Retry-After
+    ENCODER_OVERLOAD_RETRIES: int = 5
+
+    # Alias searched by the backend; each rebuild creates INDEX_ALIAS-<timestamp>
+    # and swaps the alias to it. Versioned indices kept, counting the live one
+    INDEX_ALIAS: str = "cosense_pages"
+    INDEX_KEEP_GENERATIONS: int = 2
+    # Refresh interval and replica count the index gets back after a bulk load,
+    # which runs with refresh off and no replicas. None resets to the cluster default
+    INDEX_REFRESH_INTERVAL: Optional[str] = None
+    INDEX_NUMBER_OF_REPLICAS: Optional[int] = None
+    # Rebuild finalization: segments after force-merge (None skips it), sample
+    # queries run before the swap, timeout of the slow calls in seconds, and the
+    # share of failed pages above which the new index is discarded
+    INDEX_FORCE_MERGE_SEGMENTS: Optional[int] = 1
+    INDEX_WARMUP_QUERIES: int = 20
+    INDEX_MAINTENANCE_TIMEOUT: float = 1800.0
+    REBUILD_MAX_FAILED_RATIO: float = 0.05
+
+    # SQLite cache of chunk vectors keyed by (model the encoder reports, chunk hash); None disables it
+    EMBEDDING_CACHE_PATH: Optional[str] = None
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 1_000_000
+
+    # SQLite journal of a run's progress for --resume; None disables checkpointing
+    CHECKPOINT_PATH: Optional[str] = None
+
+    # Per-page sync state used by incremental runs
+    SYNC_STATE_INDEX: str = "cosense_sync_state"
+    # Generation counter bumped after every run that changed the index
+    INDEX_META_INDEX: str = "cosense_meta"
+
+    # Ingestion pipeline: workers per stage and capacity of the queues between them
+    FETCH_CONCURRENCY: int = 4
+    SPLIT_CONCURRENCY: int = 1
+    ENCODE_CONCURRENCY: int = 2
+    INDEX_CONCURRENCY: int = 2
+    PIPELINE_QUEUE_SIZE: int = 16
+
+    # Index-time pruning of chunk vectors: top-N terms, weight floor and
+    # optional quantization to N levels in (0, DOC_QUANTIZE_MAX_WEIGHT]
+    DOC_MAX_TERMS: Optional[int] = None
+    DOC_MIN_WEIGHT: float = 0.0
+    DOC_QUANTIZE_LEVELS: Optional[int] = None
+    DOC_QUANTIZE_MAX_WEIGHT: float = 5.0
+
+    # Bulk indexing: a request is sent when any of these limits is reached
+    BULK_CHUNK_SIZE: int = 500
+    BULK_MAX_BYTES: int = 10 * 1024 * 1024
+    BULK_FLUSH_INTERVAL: float = 5.0
+    BULK_MAX_RETRIES: int = 3
 
 settings = Settings()
@@ -0,0 +1,48 @@
+import logging
+from typing import Any, Callable
+import httpx
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def _client_options(timeout: float, max_connections: int, http2: bool = False) -> dict[str, Any]:
+    return {
+        "timeout": httpx.Timeout(timeout, connect=min(timeout, 10.0)),
+        "limits": httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+        ),
+        # HTTP/2 needs the optional h2 package and only applies to https upstreams
+        "http2": http2 and settings.HTTP2_ENABLED and _http2_available()
+    }
+
+# Connection settings per upstream service
+UPSTREAMS: dict[str, Callable[[], dict[str, Any]]] = {
+    "cosense": lambda: _client_options(settings.COSENSE_TIMEOUT, settings.COSENSE_MAX_CONNECTIONS, http2=True),
+    "encoder": lambda: _client_options(settings.ENCODER_TIMEOUT, settings.ENCODER_MAX_CONNECTIONS),
+}
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+def get_http_client(upstream: str) -> httpx.AsyncClient:
+    """Returns the shared keep-alive client for ``upstream``, creating it on first use."""
+    client = _clients.get(upstream)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(**UPSTREAMS[upstream]())
+        _clients[upstream] = client
+    return client
+
+async def close_http_clients() -> None:
+    """Closes every shared client; call once when the process shuts down."""
+    for upstream, client in list(_clients.items()):
+        await client.aclose()
+        logger.debug(f"Closed HTTP client for {upstream}")
+    _clients.clear()
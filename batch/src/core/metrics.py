@@ -0,0 +1,64 @@
+from typing import List
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+COSENSE_FETCH_SECONDS = Histogram("batch_cosense_fetch_seconds", "Cosense API request latency.", ["kind"], buckets=LATENCY_BUCKETS)
+COSENSE_RETRIES = Counter("batch_cosense_retries_total", "Retried Cosense requests by reason.", ["reason"])
+ENCODER_REQUEST_SECONDS = Histogram(
+    "batch_encoder_request_seconds", "Round trip to the encoder service.", ["path"], buckets=LATENCY_BUCKETS
+)
+ENCODER_REPLICA_EVENTS = Counter(
+    "batch_encoder_replica_events_total", "Encoder load balancing events (hedge, failover, ejection, overload).", ["event"]
+)
+ES_BULK_SECONDS = Histogram("batch_es_bulk_seconds", "Duration of one bulk flush.", buckets=LATENCY_BUCKETS)
+BULK_DOCUMENTS = Counter("batch_bulk_documents_total", "Bulk actions by outcome.", ["result"])
+STAGE_SECONDS = Histogram("batch_stage_seconds", "Time a page spends in each pipeline stage.", ["stage"], buckets=LATENCY_BUCKETS)
+ERRORS = Counter("batch_errors_total", "Failures by pipeline stage.", ["stage"])
+EMBEDDING_CACHE_LOOKUPS = Counter("batch_embedding_cache_lookups_total", "Chunk embedding cache lookups by result.", ["result"])
+
+def _quantile(buckets: List[tuple[float, float]], count: float, q: float) -> float:
+    # Upper bound of the bucket holding the q-th sample; good enough for a log line
+    for bound, cumulative in buckets:
+        if cumulative >= q * count:
+            return bound
+    return float("inf")
+
+def summarize(registry: CollectorRegistry = REGISTRY) -> List[str]:
+    """Human-readable lines for the batch metrics that recorded anything.
+
+    The batch job is not scraped, so this is how its metrics are reported
+    at the end of a run.
+    """
+    lines: List[str] = []
+    for metric in registry.collect():
+        if not metric.name.startswith("batch_"):
+            continue
+        if metric.type == "histogram":
+            series: dict[tuple[tuple[str, str], ...], dict[str, object]] = {}
+            for sample in metric.samples:
+                labels = tuple(sorted((k, v) for k, v in sample.labels.items() if k != "le"))
+                entry = series.setdefault(labels, {"buckets": []})
+                if sample.name.endswith("_bucket"):
+                    entry["buckets"].append((float(sample.labels["le"]), sample.value))  # type: ignore[union-attr]
+                elif sample.name.endswith("_count"):
+                    entry["count"] = sample.value
+                elif sample.name.endswith("_sum"):
+                    entry["sum"] = sample.value
+            for labels, entry in series.items():
+                count = float(entry.get("count", 0))  # type: ignore[arg-type]
+                if not count:
+                    continue
+                buckets = entry["buckets"]
+                label_text = ",".join(f"{k}={v}" for k, v in labels)
+                lines.append(
+                    f"{metric.name}{{{label_text}}}: n={int(count)} "
+                    f"mean={float(entry['sum']) / count:.3f}s "  # type: ignore[arg-type]
+                    f"p50<={_quantile(buckets, count, 0.5)}s p95<={_quantile(buckets, count, 0.95)}s"  # type: ignore[arg-type]
+                )
+        elif metric.type == "counter":
+            for sample in metric.samples:
+                if sample.name.endswith("_total") and sample.value:
+                    label_text = ",".join(f"{k}={v}" for k, v in sorted(sample.labels.items()))
+                    lines.append(f"{sample.name}{{{label_text}}}: {int(sample.value)}")
+    return lines
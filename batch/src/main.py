@@ -1,9 +1,14 @@
+import argparse
 import asyncio
 import logging
+import os
 import sys
 from src.services.cosense import CosenseClient
 from src.services.indexer import IndexerService
+from src.services.shard import Shard, ShardCoordinator, checkpoint_summary, write_stats
 from src.core.config import settings
+from src.core.http import close_http_clients
+from src.core.metrics import summarize
 
 # Setup logging
 logging.basicConfig(
@@ -13,23 +18,114 @@ logging.basicConfig(
 )
 logger = logging.getLogger("batch")
 
-async def main() -> None:
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Synchronize a Cosense project into Elasticsearch.")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Re-process every page instead of only new or changed ones."
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Build a new index from scratch and swap it in when done; searches keep using the old one meanwhile."
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted run from its checkpoint journal (needs CHECKPOINT_PATH)."
+    )
+    parser.add_argument(
+        "--shard",
+        type=Shard.parse,
+        metavar="I/N",
+        help="Only sync the pages of hash partition I of N; the index must already exist."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        metavar="N",
+        help="Run N shard processes on this machine and merge their results."
+    )
+    parser.add_argument(
+        "--stats-file",
+        help="Write the run's counters as JSON to this file (used by --workers)."
+    )
+    args = parser.parse_args(argv)
+    if args.rebuild and (args.shard or args.workers):
+        parser.error("--rebuild cannot be combined with --shard or --workers")
+    if args.shard and args.workers:
+        parser.error("--shard and --workers are mutually exclusive")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    return args
+
+async def run_workers(args: argparse.Namespace) -> None:
+    """Prepares the shared indices, runs ``args.workers`` shards and reports their merged results."""
+    indexer = IndexerService()
+    try:
+        await indexer.prepare_shards()
+        flags = [flag for flag, enabled in (("--full", args.full), ("--resume", args.resume)) if enabled]
+        try:
+            stats, codes = await ShardCoordinator(args.workers, [sys.executable, os.path.abspath(__file__)]).run(flags)
+        finally:
+            index_size = await indexer.finish_shards()
+    finally:
+        await indexer.close()
+    stats.index_size_bytes = index_size
+    logger.info(
+        f"{args.workers} shards listed {stats.pages_listed} pages. Synced {stats.pages_synced} pages "
+        f"({stats.chunks_indexed} chunks indexed, {stats.chunks_failed} chunks failed), "
+        f"{stats.pages_unchanged} unchanged, {stats.pages_deleted} deleted, "
+        f"{stats.pages_resumed} resumed, {stats.pages_failed} pages failed."
+    )
+    if stats.embedding_cache is not None:
+        logger.info(f"Embedding cache: {stats.embedding_cache.summary()}.")
+    for line in await checkpoint_summary(args.workers):
+        logger.info(f"Checkpoint of {line}")
+    failed = [str(Shard(index, args.workers)) for index, code in enumerate(codes) if code != 0]
+    if failed:
+        raise RuntimeError(f"Shards {', '.join(failed)} failed; rerun with --resume to continue them")
+
+async def main(argv: list[str] | None = None) -> None:
     """Main entry point for the batch synchronization job."""
-    logger.info("Starting Cosense to Elasticsearch synchronization batch...")
+    args = parse_args(argv)
+    mode = "rebuild" if args.rebuild else "full" if args.full else "incremental"
+    if args.shard:
+        mode += f", shard {args.shard}"
+    elif args.workers:
+        mode += f", {args.workers} shards"
+    logger.info(f"Starting Cosense to Elasticsearch synchronization batch ({mode})...")
     
     if not settings.COSENSE_PROJECT_NAME:
         logger.error("COSENSE_PROJECT_NAME is not set. Exiting.")
         sys.exit(1)
 
+    if args.resume and not settings.CHECKPOINT_PATH:
+        logger.error("--resume needs CHECKPOINT_PATH to be set. Exiting.")
+        sys.exit(1)
+
+    if args.workers:
+        try:
+            await run_workers(args)
+            logger.info("Batch synchronization finished successfully.")
+        except Exception as e:
+            logger.error(f"Batch synchronization failed: {e}")
+            sys.exit(1)
+        finally:
+            await close_http_clients()
+        return
+
     cosense = CosenseClient()
     indexer = IndexerService()
     
     try:
-        logger.info(f"Fetching pages from project: {settings.COSENSE_PROJECT_NAME}")
-        pages = await cosense.get_all_pages()
-        logger.info(f"Retrieved {len(pages)} pages.")
-        
-        await indexer.sync_pages(pages, cosense)
+        logger.info(f"Streaming pages from project: {settings.COSENSE_PROJECT_NAME}")
+        stats = await indexer.sync_pages(
+            cosense.get_all_pages(), cosense, full=args.full, rebuild=args.rebuild, resume=args.resume, shard=args.shard
+        )
+        if args.stats_file:
+            write_stats(args.stats_file, stats)
         logger.info("Batch synchronization finished successfully.")
         
     except Exception as e:
@@ -37,6 +133,9 @@ async def main() -> None:
         sys.exit(1)
     finally:
         await indexer.close()
+        await close_http_clients()
+        for line in summarize():
+            logger.info(f"Metrics: {line}")
 
 if __name__ == "__main__":
     asyncio.run(main())
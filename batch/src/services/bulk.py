@@ -0,0 +1,122 @@
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, List, Optional, Set
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_streaming_bulk
+from src.core.metrics import BULK_DOCUMENTS, ES_BULK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class BulkStats:
+    """Outcome of the bulk requests sent by a ``BulkIndexer``."""
+    succeeded: int = 0
+    failed: int = 0
+    flushes: int = 0
+    failures: List[dict[str, Any]] = field(default_factory=list)
+    failed_ids: Set[str] = field(default_factory=set)
+
+class BulkIndexer:
+    """Buffers bulk actions and sends them with ``async_streaming_bulk``.
+
+    The buffer is flushed when it holds ``chunk_size`` actions, when its
+    serialized size reaches ``max_bytes``, or ``flush_interval`` seconds
+    after the last flush, whichever comes first. Per-document failures are
+    logged and collected in ``stats`` instead of aborting the run, and
+    ``on_success``, if set, is awaited with the ids each flush wrote.
+    """
+
+    # Keep memory bounded when a whole run fails; the count stays exact
+    MAX_RECORDED_FAILURES = 100
+
+    def __init__(
+        self,
+        es: AsyncElasticsearch,
+        chunk_size: int = 500,
+        max_bytes: int = 10 * 1024 * 1024,
+        flush_interval: float = 5.0,
+        max_retries: int = 3,
+        on_success: Optional[Callable[[List[str]], Awaitable[None]]] = None
+    ) -> None:
+        self.es = es
+        self.on_success = on_success
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.stats = BulkStats()
+        self._buffer: List[dict[str, Any]] = []
+        self._buffer_bytes = 0
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task[None]] = None
+
+    async def start(self) -> None:
+        """Starts the timer that flushes partially filled buffers."""
+        if self._timer is None and self.flush_interval > 0:
+            self._timer = asyncio.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def add(self, action: dict[str, Any]) -> None:
+        """Queues an action, flushing first if the buffer is full."""
+        size = len(json.dumps(action, ensure_ascii=False).encode("utf-8"))
+        self._buffer.append(action)
+        self._buffer_bytes += size
+        if len(self._buffer) >= self.chunk_size or self._buffer_bytes >= self.max_bytes:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Sends every buffered action to Elasticsearch."""
+        async with self._lock:
+            actions, self._buffer, self._buffer_bytes = self._buffer, [], 0
+        if not actions:
+            return
+
+        self.stats.flushes += 1
+        started = time.perf_counter()
+        succeeded: List[str] = []
+        async for ok, item in async_streaming_bulk(
+            self.es,
+            actions,
+            chunk_size=len(actions),
+            max_chunk_bytes=self.max_bytes,
+            max_retries=self.max_retries,
+            raise_on_error=False,
+            raise_on_exception=False,
+            yield_ok=True
+        ):
+            op, result = next(iter(item.items()))
+            # Deleting a document that is already gone is not an error
+            if ok or (op == "delete" and result.get("status") == 404):
+                self.stats.succeeded += 1
+                BULK_DOCUMENTS.labels(result="succeeded").inc()
+                if result.get("_id") is not None:
+                    succeeded.append(result["_id"])
+                continue
+            self.stats.failed += 1
+            BULK_DOCUMENTS.labels(result="failed").inc()
+            if result.get("_id") is not None:
+                self.stats.failed_ids.add(result["_id"])
+            logger.error(f"Bulk {op} failed for {result.get('_id')}: {result.get('error')}")
+            if len(self.stats.failures) < self.MAX_RECORDED_FAILURES:
+                self.stats.failures.append({"op": op, "id": result.get("_id"), "error": result.get("error")})
+        ES_BULK_SECONDS.observe(time.perf_counter() - started)
+        if self.on_success is not None and succeeded:
+            await self.on_success(succeeded)
+
+    async def close(self) -> None:
+        """Stops the flush timer and sends whatever is still buffered."""
+        if self._timer is not None:
+            self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+            self._timer = None
+        await self.flush()
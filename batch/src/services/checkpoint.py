@@ -0,0 +1,148 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+IN_FLIGHT = "in_flight"
+ENCODED = "encoded"
+DONE = "done"
+
+@dataclass
+class PageCheckpoint:
+    """Progress of one page as recorded in the journal."""
+    title: str
+    updated: Optional[int]
+    status: str
+    content_hash: str = ""
+    chunk_count: int = 0
+    chunks: List[str] = field(default_factory=list)
+    vectors: List[dict[str, float]] = field(default_factory=list)
+
+class CheckpointJournal:
+    """SQLite journal of a sync run's progress, used to resume it after a crash.
+
+    Each page moves from ``in_flight`` (entered the pipeline) to
+    ``encoded`` (chunks and vectors stored, not yet confirmed by
+    Elasticsearch) to ``done`` (every bulk action of the page succeeded).
+    A resumed run skips done pages and indexes encoded ones without
+    fetching or encoding them again. ``meta`` records what kind of run the
+    journal belongs to, so a resume can continue it in the same way.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # A committed transaction survives a killed process; only a power loss could drop the last ones
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pages (title TEXT PRIMARY KEY, updated INTEGER, status TEXT NOT NULL, "
+                "content_hash TEXT NOT NULL DEFAULT '', chunk_count INTEGER NOT NULL DEFAULT 0, "
+                "chunks TEXT, vectors TEXT, changed_at REAL NOT NULL)"
+            )
+        return self._db
+
+    def _write(self, statements: Iterable[tuple[str, tuple[Any, ...]]]) -> None:
+        with self._lock:
+            db = self._connect()
+            with db:
+                for sql, params in statements:
+                    db.execute(sql, params)
+
+    def _read_meta(self) -> dict[str, Any]:
+        with self._lock:
+            rows = self._connect().execute("SELECT key, value FROM meta").fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def _read_pages(self) -> dict[str, PageCheckpoint]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT title, updated, status, content_hash, chunk_count, chunks, vectors FROM pages"
+            ).fetchall()
+        return {
+            row[0]: PageCheckpoint(
+                title=row[0],
+                updated=row[1],
+                status=row[2],
+                content_hash=row[3],
+                chunk_count=row[4],
+                chunks=json.loads(row[5]) if row[5] else [],
+                vectors=json.loads(row[6]) if row[6] else []
+            )
+            for row in rows
+        }
+
+    async def meta(self) -> dict[str, Any]:
+        """Returns the metadata stored by ``start``; empty if there is no journal."""
+        return await asyncio.to_thread(self._read_meta)
+
+    async def pages(self) -> dict[str, PageCheckpoint]:
+        """Returns the recorded progress of every page, keyed by title."""
+        return await asyncio.to_thread(self._read_pages)
+
+    async def start(self, meta: dict[str, Any]) -> None:
+        """Discards any previous progress and starts a journal for a new run."""
+        meta = {**meta, "status": "running", "started_at": time.time()}
+        await asyncio.to_thread(self._write, [
+            ("DELETE FROM pages", ()),
+            ("DELETE FROM meta", ()),
+            *(("INSERT INTO meta VALUES (?, ?)", (key, json.dumps(value))) for key, value in meta.items())
+        ])
+
+    async def mark_in_flight(self, title: str, updated: Optional[int]) -> None:
+        await asyncio.to_thread(self._write, [(
+            "INSERT OR REPLACE INTO pages (title, updated, status, changed_at) VALUES (?, ?, ?, ?)",
+            (title, updated, IN_FLIGHT, time.time())
+        )])
+
+    async def save_encoded(
+        self,
+        title: str,
+        updated: Optional[int],
+        content_hash: str,
+        chunks: List[str],
+        vectors: List[dict[str, float]]
+    ) -> None:
+        """Stores a page's chunks and vectors so a resumed run only has to index them."""
+        await asyncio.to_thread(self._write, [(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (title, updated, ENCODED, content_hash, len(chunks),
+             json.dumps(chunks, ensure_ascii=False), json.dumps(vectors, ensure_ascii=False), time.time())
+        )])
+
+    async def mark_done(self, titles: List[str]) -> None:
+        """Marks pages as fully indexed and drops their stored chunks."""
+        if not titles:
+            return
+        now = time.time()
+        await asyncio.to_thread(self._write, [
+            ("UPDATE pages SET status = ?, chunks = NULL, vectors = NULL, changed_at = ? WHERE title = ?", (DONE, now, title))
+            for title in titles
+        ])
+
+    async def finish(self) -> None:
+        """Marks the run as complete; a finished journal is not resumed."""
+        await asyncio.to_thread(self._write, [
+            ("INSERT OR REPLACE INTO meta VALUES (?, ?)", ("status", json.dumps("finished"))),
+            ("DELETE FROM pages", ())
+        ])
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
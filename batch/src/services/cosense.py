@@ -1,29 +1,132 @@
+import asyncio
+import logging
 import httpx
 import urllib.parse
-from typing import List, Dict, Any
+from typing import Any, AsyncIterator, Dict, Optional
 from src.core.config import settings
+from src.core.http import get_http_client
+from src.core.metrics import COSENSE_FETCH_SECONDS, COSENSE_RETRIES
+from src.services.ratelimit import TokenBucket, backoff_delay, parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+class CosenseUnavailableError(Exception):
+    """Raised when a request still fails after every retry."""
 
 class CosenseClient:
-    """Client for interacting with the Cosense (Scrapbox) API."""
+    """Client for interacting with the Cosense (Scrapbox) API.
 
-    def __init__(self) -> None:
+    Every request goes through a token-bucket rate limit and a cap on
+    parallel requests. Rate limiting (429), transient 5xx responses and
+    network errors are retried with exponential backoff and jitter,
+    honoring Retry-After; a 429 also pauses all other requests.
+    """
+
+    def __init__(
+        self,
+        rate_limit: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None
+    ) -> None:
         self.base_url = "https://scrapbox.io/api"
         self.headers = {"Cookie": f"connect.sid={settings.COSENSE_SID}"} if settings.COSENSE_SID else {}
+        self.limiter = TokenBucket(
+            settings.COSENSE_RATE_LIMIT if rate_limit is None else rate_limit,
+            burst or settings.COSENSE_BURST
+        )
+        self.max_retries = settings.COSENSE_MAX_RETRIES if max_retries is None else max_retries
+        self._semaphore = asyncio.Semaphore(max_concurrency or settings.COSENSE_CONCURRENCY)
+
+    async def _get(self, url: str, params: Optional[Dict[str, Any]] = None, kind: str = "text") -> httpx.Response:
+        client = get_http_client("cosense")
+        error: Exception = CosenseUnavailableError(url)
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire()
+            retry_after: Optional[float] = None
+            try:
+                async with self._semaphore:
+                    with COSENSE_FETCH_SECONDS.labels(kind=kind).time():
+                        response = await client.get(url, headers=self.headers, params=params)
+                response.raise_for_status()
+                return response
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in RETRYABLE_STATUS_CODES:
+                    raise
+                error = e
+                retry_after = parse_retry_after(e.response.headers.get("Retry-After"))
+                rate_limited = e.response.status_code == 429
+                reason = str(e.response.status_code)
+            except httpx.TransportError as e:
+                error = e
+                rate_limited = False
+                reason = "network"
+            if attempt == self.max_retries:
+                break
+            COSENSE_RETRIES.labels(reason=reason).inc()
+            delay = backoff_delay(attempt, settings.COSENSE_BACKOFF_BASE, settings.COSENSE_BACKOFF_MAX, retry_after)
+            if rate_limited:
+                self.limiter.pause(delay)
+            logger.warning(f"Cosense request failed ({error!r}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        raise CosenseUnavailableError(f"GET {url} failed after {self.max_retries + 1} attempts: {error}") from error
 
-    async def get_all_pages(self) -> List[Dict[str, Any]]:
-        """Fetches all pages in the project."""
+    async def _list_pages(self, skip: int, limit: int) -> Dict[str, Any]:
         url = f"{self.base_url}/pages/{settings.COSENSE_PROJECT_NAME}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=self.headers)
-            response.raise_for_status()
-            data: dict[str, Any] = response.json()
-            return data.get("pages", [])
+        # The default order is by last update, so pages edited during a sync would jump ahead of the offset
+        params = {"skip": skip, "limit": limit, "sort": "created"}
+        response = await self._get(url, params=params, kind="listing")
+        data: dict[str, Any] = response.json()
+        return data
+
+    async def get_all_pages(self, page_size: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Streams every page in the project.
+
+        Pages are listed ``page_size`` at a time with ``skip``/``limit`` until
+        the ``count`` reported by the API is exhausted. The next listing
+        request is already in flight while the caller consumes the current
+        one, and only one listing page is held in memory at a time.
+
+        Pages are listed by creation date, so edits made meanwhile do not
+        reorder the listing. Pages created or deleted meanwhile still shift
+        it: a page can be listed twice or not at all.
+        """
+        limit = page_size or settings.COSENSE_PAGE_SIZE
+        skip = 0
+        pending: Optional[asyncio.Task[Dict[str, Any]]] = asyncio.create_task(self._list_pages(skip, limit))
+        try:
+            while pending is not None:
+                data = await pending
+                pages = data.get("pages", [])
+                count = data.get("count")
+                skip += limit
+                more = bool(pages) and (skip < count if count is not None else len(pages) >= limit)
+                pending = asyncio.create_task(self._list_pages(skip, limit)) if more else None
+                for page in pages:
+                    yield page
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    async def page_exists(self, page_title: str) -> bool:
+        """Checks a single page directly, without relying on the listing."""
+        encoded_title = urllib.parse.quote(page_title, safe="")
+        url = f"{self.base_url}/pages/{settings.COSENSE_PROJECT_NAME}/{encoded_title}"
+        try:
+            response = await self._get(url, kind="page")
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return False
+            raise
+        # Unknown titles are answered with an empty, non-persistent page
+        return bool(response.json().get("persistent", True))
 
     async def get_page_content(self, page_title: str) -> str:
         """Fetches the full text content of a specific page."""
         encoded_title = urllib.parse.quote(page_title, safe="")
         url = f"{self.base_url}/pages/{settings.COSENSE_PROJECT_NAME}/{encoded_title}/text"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=self.headers)
-            response.raise_for_status()
-            return response.text
+        response = await self._get(url)
+        return response.text
@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+from src.core.metrics import EMBEDDING_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Keeps each SELECT below SQLite's bound-parameter limit
+LOOKUP_BATCH = 500
+
+@dataclass
+class EmbeddingCacheStats:
+    """Lookups and writes of an ``EmbeddingCache`` during one run."""
+    hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    evictions: int = 0
+    entries: Optional[int] = None
+    size_bytes: Optional[int] = None
+
+    def summary(self) -> str:
+        lookups = self.hits + self.misses
+        text = (
+            f"{self.hits}/{lookups} hits ({self.hits / max(1, lookups):.1%}), "
+            f"{self.writes} written, {self.evictions} evicted"
+        )
+        if self.entries is not None and self.size_bytes is not None:
+            text += f", {self.entries} entries in {self.size_bytes / 1024 / 1024:.1f} MiB"
+        return text
+
+class EmbeddingCache:
+    """On-disk cache of chunk vectors, so unchanged chunks skip the encoder.
+
+    Entries are keyed by (``model_id``, sha256 of the chunk text), where
+    ``model_id`` is the encoder's ``EncoderClient.model_key``; vectors of
+    another model or pruning setting are therefore never reused.
+    Vectors are stored as packed uint32 term ids and float32 weights, with
+    the id -> term table kept alongside; shard workers share the file, so
+    ids written by another process are loaded when first seen. An entry
+    that cannot be decoded counts as a miss. The least recently used entries
+    beyond ``max_entries`` are evicted every ``max_entries // 10`` writes
+    and by ``report`` at the end of a run.
+    """
+
+    def __init__(self, path: str, model_id: str, max_entries: int = 1_000_000) -> None:
+        self.path = path
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self.stats = EmbeddingCacheStats()
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._term_ids: dict[str, int] = {}
+        self._terms: dict[int, str] = {}
+        self._writes_since_eviction = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS terms (id INTEGER PRIMARY KEY, term TEXT NOT NULL UNIQUE)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (model TEXT NOT NULL, text_hash BLOB NOT NULL, "
+                "ids BLOB NOT NULL, weights BLOB NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (model, text_hash))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            self._load_terms(self._db)
+        return self._db
+
+    def _load_terms(self, db: sqlite3.Connection) -> None:
+        for term_id, term in db.execute("SELECT id, term FROM terms"):
+            self._term_ids[term] = term_id
+            self._terms[term_id] = term
+
+    @staticmethod
+    def _hash(text: str) -> bytes:
+        return hashlib.sha256(text.encode("utf-8")).digest()
+
+    def _decode(self, db: sqlite3.Connection, ids: bytes, weights: bytes) -> dict[str, float]:
+        term_ids, values = array("I"), array("f")
+        term_ids.frombytes(ids)
+        values.frombytes(weights)
+        if any(term_id not in self._terms for term_id in term_ids):
+            # Terms added by another process since this one loaded the table
+            self._load_terms(db)
+        return {self._terms[term_id]: value for term_id, value in zip(term_ids, values)}
+
+    def _encode(self, db: sqlite3.Connection, vector: dict[str, float]) -> tuple[bytes, bytes]:
+        ids = array("I")
+        for term in vector:
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                # Another process may have added the term since the table was loaded
+                db.execute("INSERT OR IGNORE INTO terms (term) VALUES (?)", (term,))
+                term_id = db.execute("SELECT id FROM terms WHERE term = ?", (term,)).fetchone()[0]
+                self._term_ids[term] = term_id
+                self._terms[term_id] = term
+            ids.append(term_id)
+        return ids.tobytes(), array("f", vector.values()).tobytes()
+
+    def _get_many(self, hashes: List[bytes]) -> dict[bytes, dict[str, float]]:
+        found: dict[bytes, dict[str, float]] = {}
+        with self._lock:
+            db = self._connect()
+            unique = list(dict.fromkeys(hashes))
+            with db:
+                for start in range(0, len(unique), LOOKUP_BATCH):
+                    batch = unique[start:start + LOOKUP_BATCH]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = db.execute(
+                        f"SELECT text_hash, ids, weights FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                        (self.model_id, *batch)
+                    ).fetchall()
+                    for text_hash, ids, weights in rows:
+                        try:
+                            found[text_hash] = self._decode(db, ids, weights)
+                        except Exception as e:
+                            logger.warning(f"Ignoring undecodable embedding cache entry: {e!r}")
+                    if rows:
+                        db.execute(
+                            f"UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash IN ({','.join('?' * len(rows))})",
+                            (time.time(), self.model_id, *(row[0] for row in rows))
+                        )
+        return found
+
+    def _put_many(self, hashes: List[bytes], vectors: List[dict[str, float]]) -> None:
+        with self._lock:
+            db = self._connect()
+            now = time.time()
+            try:
+                with db:
+                    for text_hash, vector in zip(hashes, vectors):
+                        ids, weights = self._encode(db, vector)
+                        db.execute(
+                            "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)",
+                            (self.model_id, text_hash, ids, weights, now)
+                        )
+            except sqlite3.Error:
+                # Term ids assigned in the rolled-back transaction are gone; reload them
+                self._term_ids.clear()
+                self._terms.clear()
+                db.close()
+                self._db = None
+                raise
+        self._writes_since_eviction += len(hashes)
+        if self._writes_since_eviction >= max(1, self.max_entries // 10):
+            self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            db = self._connect()
+            with db:
+                cursor = db.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            self.stats.evictions += max(0, cursor.rowcount)
+            self._writes_since_eviction = 0
+
+    def _measure(self) -> None:
+        with self._lock:
+            db = self._connect()
+            self.stats.entries = db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            page_count = db.execute("PRAGMA page_count").fetchone()[0]
+            page_size = db.execute("PRAGMA page_size").fetchone()[0]
+            self.stats.size_bytes = page_count * page_size
+
+    async def get_many(self, texts: List[str]) -> List[Optional[dict[str, float]]]:
+        """Returns the cached vector of each text, or None where there is none.
+
+        Errors reading the cache are logged and treated as misses.
+        """
+        hashes = [self._hash(text) for text in texts]
+        try:
+            found = await asyncio.to_thread(self._get_many, hashes)
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+            found = {}
+        results = [found.get(text_hash) for text_hash in hashes]
+        hits = sum(result is not None for result in results)
+        self.stats.hits += hits
+        self.stats.misses += len(results) - hits
+        EMBEDDING_CACHE_LOOKUPS.labels(result="hit").inc(hits)
+        EMBEDDING_CACHE_LOOKUPS.labels(result="miss").inc(len(results) - hits)
+        return results
+
+    async def put_many(self, texts: List[str], vectors: List[dict[str, float]]) -> None:
+        """Stores the vectors of ``texts``; errors are logged and ignored."""
+        if not texts:
+            return
+        try:
+            await asyncio.to_thread(self._put_many, [self._hash(text) for text in texts], vectors)
+            self.stats.writes += len(texts)
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    async def report(self) -> EmbeddingCacheStats:
+        """Evicts down to ``max_entries`` and returns the run's counters with the cache size."""
+        try:
+            await asyncio.to_thread(self._evict)
+            await asyncio.to_thread(self._measure)
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache maintenance failed: {e}")
+        return self.stats
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -1,16 +1,122 @@
-from typing import List, Any
-import httpx
+from typing import Any, AsyncIterable, Awaitable, Callable, Iterable, List, Optional, Union
+import asyncio
+import logging
 import re
+import time
+from dataclasses import dataclass, field
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from elasticsearch import AsyncElasticsearch
-from src.services.cosense import CosenseClient
+from src.services.bulk import BulkIndexer
+from src.services.checkpoint import DONE, ENCODED, CheckpointJournal, PageCheckpoint
+from src.services.cosense import CosenseClient, CosenseUnavailableError
+from src.services.embedding_cache import EmbeddingCache, EmbeddingCacheStats
+from src.services.encoder import EncoderClient
+from src.services.shard import Shard
+from src.services.sparse import DocumentVectorPruner, PruneStats
+from src.services.state import PageState, SyncStateStore, content_hash, doc_id
 from src.core.config import settings
+from src.core.metrics import ERRORS, STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+INDEX_MAPPINGS = {
+    "properties": {
+        "text": {"type": "text"},
+        "sparse_vector": {"type": "rank_features"},
+        "metadata": {
+            "properties": {
+                "title": {"type": "keyword"},
+                "chunk_id": {"type": "integer"},
+                "project": {"type": "keyword"}
+            }
+        }
+    }
+}
+# Terms per sample query when warming up a rebuilt index
+WARMUP_QUERY_TERMS = 32
+
+class RebuildAbortedError(Exception):
+    """Raised when a rebuilt index is discarded instead of being made live."""
+
+class ShardNotReadyError(Exception):
+    """Raised when a shard worker starts before the shared indices exist."""
+
+@dataclass
+class PageWork:
+    """A page travelling through the ingestion pipeline."""
+    title: str
+    updated: Optional[int] = None
+    content: str = ""
+    content_hash: str = ""
+    chunks: List[str] = field(default_factory=list)
+    vectors: List[dict[str, float]] = field(default_factory=list)
+
+@dataclass
+class SyncStats:
+    """Counters reported at the end of a synchronization run."""
+    pages_listed: int = 0
+    pages_synced: int = 0
+    pages_unchanged: int = 0
+    pages_deleted: int = 0
+    pages_failed: int = 0
+    pages_retried: int = 0
+    pages_resumed: int = 0
+    chunks_indexed: int = 0
+    chunks_failed: int = 0
+    vectors: PruneStats = field(default_factory=PruneStats)
+    index_size_bytes: Optional[int] = None
+    embedding_cache: Optional[EmbeddingCacheStats] = None
+
+@dataclass
+class SyncRun:
+    """State shared by the pipeline stages during one ``sync_pages`` call."""
+    bulk: BulkIndexer
+    stats: SyncStats
+    previous: dict[str, PageState]
+    full: bool
+    # Index the chunks are written to: the alias, or a new versioned index when rebuilding
+    index_name: str
+    rebuild: bool = False
+    pruner: DocumentVectorPruner = field(default_factory=lambda: DocumentVectorPruner(
+        max_terms=settings.DOC_MAX_TERMS,
+        min_weight=settings.DOC_MIN_WEIGHT,
+        quantize_levels=settings.DOC_QUANTIZE_LEVELS,
+        quantize_max_weight=settings.DOC_QUANTIZE_MAX_WEIGHT
+    ))
+    # Chunk document id -> page title, to map bulk failures back to pages
+    chunk_titles: dict[str, str] = field(default_factory=dict)
+    # Pages whose fetch kept failing; fetched again once the stream is drained
+    deferred: List[PageWork] = field(default_factory=list)
+    synced_titles: set[str] = field(default_factory=set)
+    # Rebuilds hold back state updates (by title) until the new index is live
+    pending_state: dict[str, dict[str, Any]] = field(default_factory=dict)
+    journal: Optional[CheckpointJournal] = None
+    # Progress of the interrupted run being resumed, by title
+    resumed: dict[str, PageCheckpoint] = field(default_factory=dict)
+    # Bulk action id -> page title, and per page the number of actions not yet confirmed
+    pending_ids: dict[str, str] = field(default_factory=dict)
+    unconfirmed: dict[str, int] = field(default_factory=dict)
+    # Partition of the titles this process owns; None processes all pages
+    shard: Optional[Shard] = None
+
+async def _aiter(items: Union[AsyncIterable[Any], Iterable[Any]]) -> AsyncIterable[Any]:
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
 
 class IndexerService:
     """Service for processing and indexing documents into Elasticsearch."""
 
     def __init__(self) -> None:
         self.es = AsyncElasticsearch(settings.ELASTICSEARCH_URL)
+        self.encoder = EncoderClient()
+        # Opened by _open_embedding_cache once the encoder's model is known
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        self.index_name = settings.INDEX_ALIAS
+        self.state_store = SyncStateStore(self.es)
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=100
@@ -26,65 +132,742 @@ class IndexerService:
 
     async def get_sparse_embeddings(self, text: str) -> dict[str, Any]:
         """Generates a sparse embedding for the given text using the encoder service."""
-        url = f"{settings.ENCODER_SERVICE_URL}/encode"
-        payload = {"text": text}
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload, timeout=60.0)
-            response.raise_for_status()
-            data: dict[str, Any] = response.json()
-            return data["sparse_values"]
+        return await self.encoder.encode(text)
+
+    async def _open_embedding_cache(self) -> None:
+        """Opens the embedding cache, keyed on the model and pruning the encoder reports.
+
+        The key comes from the encoder itself rather than from configuration,
+        so vectors cached before a model or pruning change are never served.
+        If the encoder cannot be asked, the run goes without the cache.
+        """
+        if not settings.EMBEDDING_CACHE_PATH or self.embedding_cache is not None:
+            return
+        try:
+            model_key = await self.encoder.model_key()
+        except Exception as e:
+            logger.warning(f"Running without the embedding cache; could not read the encoder's model: {e}")
+            return
+        logger.info(f"Embedding cache keyed on {model_key}")
+        self.embedding_cache = EmbeddingCache(
+            settings.EMBEDDING_CACHE_PATH,
+            model_id=model_key,
+            max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES
+        )
+
+    async def get_sparse_embeddings_batch(self, texts: List[str]) -> List[dict[str, Any]]:
+        """Generates sparse embeddings for several texts in one encoder request.
+
+        Texts found in the embedding cache are left out of the request.
+        """
+        if not texts:
+            return []
+        if self.embedding_cache is None:
+            return await self.encoder.encode_batch(texts)
+        vectors = await self.embedding_cache.get_many(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            encoded = await self.encoder.encode_batch([texts[i] for i in missing])
+            for i, vector in zip(missing, encoded):
+                vectors[i] = vector
+            await self.embedding_cache.put_many([texts[i] for i in missing], encoded)
+        return vectors  # type: ignore[return-value]
+
+    def _versioned_index_name(self) -> str:
+        # Millisecond timestamps sort chronologically as strings
+        now = time.time()
+        return f"{self.index_name}-{time.strftime('%Y%m%d%H%M%S', time.gmtime(now))}{int(now * 1000) % 1000:03d}"
+
+    def _is_versioned_index(self, name: str) -> bool:
+        return re.fullmatch(rf"{re.escape(self.index_name)}-\d{{17}}", name) is not None
 
     async def create_index_if_not_exists(self) -> None:
-        """Creates the Elasticsearch index with proper mappings if it doesn't exist."""
-        index_name = "cosense_pages"
-        exists = await self.es.indices.exists(index=index_name)
+        """Creates a versioned index behind the alias if neither exists yet.
+
+        Deployments that still have a plain index under the alias name keep
+        using it until the first rebuild replaces it.
+        """
+        exists = await self.es.indices.exists(index=self.index_name)
         if not exists:
             await self.es.indices.create(
-                index=index_name,
-                body={
-                    "mappings": {
-                        "properties": {
-                            "text": {"type": "text"},
-                            "sparse_vector": {"type": "rank_features"},
-                            "metadata": {
-                                "properties": {
-                                    "title": {"type": "keyword"},
-                                    "chunk_id": {"type": "integer"},
-                                    "project": {"type": "keyword"}
-                                }
-                            }
-                        }
-                    }
+                index=self._versioned_index_name(),
+                body={"mappings": INDEX_MAPPINGS, "aliases": {self.index_name: {}}}
+            )
+
+    async def _create_rebuild_index(self) -> str:
+        """Creates an empty versioned index for a rebuild; the alias is not touched."""
+        index_name = self._versioned_index_name()
+        await self.es.indices.create(index=index_name, body={"mappings": INDEX_MAPPINGS})
+        logger.info(f"Rebuilding into new index {index_name}")
+        return index_name
+
+    async def _fetch(self, work: PageWork, cosense_client: CosenseClient, run: SyncRun) -> Optional[PageWork]:
+        try:
+            work.content = await cosense_client.get_page_content(work.title)
+        except CosenseUnavailableError as e:
+            logger.warning(f"Deferring page {work.title}: {e}")
+            run.deferred.append(work)
+            return None
+        return work
+
+    async def _retry_deferred(self, run: SyncRun, queues: List[asyncio.Queue[PageWork]]) -> None:
+        """Feeds deferred pages through the pipeline again, up to COSENSE_RETRY_ROUNDS times.
+
+        By the end of the run the API has usually recovered from whatever
+        rate limiting or outage made these fetches fail.
+        """
+        for round_number in range(1, settings.COSENSE_RETRY_ROUNDS + 1):
+            if not run.deferred:
+                return
+            retry, run.deferred = run.deferred, []
+            run.stats.pages_retried += len(retry)
+            logger.info(f"Retrying {len(retry)} deferred pages (round {round_number}/{settings.COSENSE_RETRY_ROUNDS})")
+            for work in retry:
+                await queues[0].put(work)
+            for queue in queues:
+                await queue.join()
+
+    async def _split(self, work: PageWork, run: SyncRun) -> Optional[PageWork]:
+        work.content_hash = content_hash(work.content)
+        previous = run.previous.get(work.title)
+        if not run.full and previous is not None and previous.content_hash == work.content_hash:
+            # Only the timestamp moved; remember it so the next run skips the fetch
+            await run.bulk.add(self.state_store.save_action(PageState(
+                title=work.title,
+                updated=work.updated,
+                content_hash=work.content_hash,
+                chunk_count=previous.chunk_count
+            )))
+            run.stats.pages_unchanged += 1
+            return None
+        work.chunks = self.text_splitter.split_text(self._clean_text(work.content))
+        return work
+
+    async def _encode(self, work: PageWork, run: SyncRun) -> PageWork:
+        work.vectors = await self.get_sparse_embeddings_batch(work.chunks)
+        if run.journal is not None:
+            await run.journal.save_encoded(work.title, work.updated, work.content_hash, work.chunks, work.vectors)
+        return work
+
+    def _chunk_id(self, title: str, chunk_id: int) -> str:
+        return doc_id(settings.COSENSE_PROJECT_NAME, title, chunk_id)
+
+    async def _index(self, work: PageWork, run: SyncRun) -> None:
+        actions: List[dict[str, Any]] = []
+        for i, (chunk, sparse_vector) in enumerate(zip(work.chunks, work.vectors)):
+            doc = {
+                "text": chunk,
+                "sparse_vector": run.pruner.apply(sparse_vector),
+                "metadata": {
+                    "title": work.title,
+                    "chunk_id": i,
+                    "project": settings.COSENSE_PROJECT_NAME
                 }
+            }
+            chunk_doc_id = self._chunk_id(work.title, i)
+            run.chunk_titles[chunk_doc_id] = work.title
+            actions.append({"_op_type": "index", "_index": run.index_name, "_id": chunk_doc_id, "_source": doc})
+
+        # The page may have shrunk since the last run; a rebuilt index has no old chunks
+        previous = None if run.rebuild else run.previous.get(work.title)
+        for i in range(len(work.chunks), previous.chunk_count if previous else 0):
+            actions.append({"_op_type": "delete", "_index": run.index_name, "_id": self._chunk_id(work.title, i)})
+
+        state_action = self.state_store.save_action(PageState(
+            title=work.title,
+            updated=work.updated,
+            content_hash=work.content_hash,
+            chunk_count=len(work.chunks)
+        ))
+        if run.rebuild:
+            run.pending_state[work.title] = state_action
+        else:
+            actions.append(state_action)
+
+        await self._track(run, work.title, actions)
+        for action in actions:
+            await run.bulk.add(action)
+        run.synced_titles.add(work.title)
+        run.stats.pages_synced += 1
+        run.stats.chunks_indexed += len(work.chunks)
+        logger.info(f"Synced page: {work.title}")
+
+    async def _track(self, run: SyncRun, title: str, actions: List[dict[str, Any]]) -> None:
+        """Registers a page's bulk actions so the journal marks it done once all succeeded.
+
+        Every id is registered before the first action is queued, so a flush
+        in between cannot confirm the page early.
+        """
+        if run.journal is None:
+            return
+        if not actions:
+            await run.journal.mark_done([title])
+            return
+        for action in actions:
+            run.pending_ids[action["_id"]] = title
+        run.unconfirmed[title] = len(actions)
+
+    async def _confirm(self, run: SyncRun, ids: List[str]) -> None:
+        """Bulk success hook: journals the pages whose actions have all been written."""
+        if run.journal is None:
+            return
+        done = []
+        for action_id in ids:
+            title = run.pending_ids.pop(action_id, None)
+            if title is None:
+                continue
+            run.unconfirmed[title] -= 1
+            if run.unconfirmed[title] == 0:
+                del run.unconfirmed[title]
+                done.append(title)
+        await run.journal.mark_done(done)
+
+    async def _save_state(self, run: SyncRun, title: str, action: dict[str, Any]) -> None:
+        if run.rebuild:
+            run.pending_state[title] = action
+        else:
+            await run.bulk.add(action)
+
+    async def _is_removed(self, title: str, cosense_client: CosenseClient) -> bool:
+        try:
+            if not await cosense_client.page_exists(title):
+                return True
+            logger.warning(f"Page {title} exists but was not listed; keeping it")
+        except Exception as e:
+            logger.warning(f"Could not check whether {title} was removed, keeping it: {e}")
+        return False
+
+    async def _delete_removed_pages(self, run: SyncRun, seen: set[str], cosense_client: CosenseClient) -> None:
+        """Deletes the chunks and state of pages that no longer exist upstream.
+
+        The listing is paged while the project changes, so a page can be
+        missing from it and still exist. Pages are only deleted from the
+        live index once a direct lookup confirms they are gone. A rebuild
+        drops the state of every unlisted page instead, so that the next
+        sync adds back any that still exist.
+        """
+        unlisted = [title for title in run.previous if title not in seen]
+        if not run.rebuild:
+            removed = await asyncio.gather(*(self._is_removed(title, cosense_client) for title in unlisted))
+            unlisted = [title for title, gone in zip(unlisted, removed) if gone]
+        for title in unlisted:
+            state = run.previous[title]
+            if not run.rebuild:
+                for i in range(state.chunk_count):
+                    await run.bulk.add({"_op_type": "delete", "_index": run.index_name, "_id": self._chunk_id(title, i)})
+            await self._save_state(run, title, self.state_store.delete_action(title))
+            run.stats.pages_deleted += 1
+            logger.info(f"Deleted page removed from Cosense: {title}")
+
+    async def _prepare_state(self, rebuild: bool = False) -> dict[str, PageState]:
+        """Loads the previous run's page state, migrating legacy indices first.
+
+        Chunks written before sync state existed have random ids and cannot be
+        matched to pages, so they are dropped once when the state index is
+        created and the pages are indexed again with deterministic ids. A
+        rebuild starts from an empty index and needs no such cleanup.
+        """
+        if await self.state_store.ensure_index():
+            if rebuild:
+                return {}
+            logger.warning("No sync state found; removing legacy chunks of this project before a full sync.")
+            await self.es.delete_by_query(
+                index=self.index_name,
+                query={"term": {"metadata.project": settings.COSENSE_PROJECT_NAME}},
+                conflicts="proceed"
             )
+            return {}
+        return await self.state_store.load()
 
-    async def sync_pages(self, pages: List[dict[str, Any]], cosense_client: CosenseClient) -> None:
-        """Synchronizes a list of pages into Elasticsearch."""
-        await self.create_index_if_not_exists()
-        
-        for page in pages:
-            title = page["title"]
+    async def _publish_generation(self, index_name: Optional[str] = None) -> None:
+        """Bumps the index generation so that search result caches drop stale entries.
+
+        ``index_name`` records which versioned index the alias points to.
+        """
+        now = int(time.time() * 1000)
+        source = "ctx._source.generation += 1; ctx._source.updated_at = params.now"
+        upsert: dict[str, Any] = {"generation": 1, "updated_at": now}
+        if index_name is not None:
+            source += "; ctx._source.index = params.index"
+            upsert["index"] = index_name
+        await self.es.update(
+            index=settings.INDEX_META_INDEX,
+            id=self.index_name,
+            script={"source": source, "params": {"now": now, "index": index_name}},
+            upsert=upsert,
+            refresh=True,
+            # Shard workers bump the generation concurrently
+            retry_on_conflict=5
+        )
+
+    async def _warm_up(self, index_name: str) -> None:
+        """Runs sample searches so the first user queries don't pay for cold caches.
+
+        The queries are built from the vectors of a few indexed chunks, in
+        the shape the backend sends.
+        """
+        if settings.INDEX_WARMUP_QUERIES <= 0:
+            return
+        started = time.perf_counter()
+        response = await self.es.search(
+            index=index_name, size=settings.INDEX_WARMUP_QUERIES, source=["text", "sparse_vector"]
+        )
+        hits = response["hits"]["hits"]
+        for hit in hits:
+            vector = hit["_source"].get("sparse_vector") or {}
+            terms = sorted(vector.items(), key=lambda item: item[1], reverse=True)[:WARMUP_QUERY_TERMS]
+            if terms:
+                await self.es.search(index=index_name, size=10, query={"bool": {"should": [
+                    {"rank_feature": {"field": f"sparse_vector.{token}", "boost": weight}} for token, weight in terms
+                ]}})
+            text = hit["_source"].get("text", "")
+            if text:
+                await self.es.search(index=index_name, size=10, query={"match": {"text": text[:100]}})
+        logger.info(f"Warmed up {index_name} with {len(hits)} sample chunks in {time.perf_counter() - started:.1f}s")
+
+    async def _swap_alias(self, index_name: str) -> List[str]:
+        """Points the alias at ``index_name`` in one atomic request.
+
+        A plain index still occupying the alias name (from before versioned
+        indices) is deleted in the same request. Returns the indices the
+        alias pointed to before.
+        """
+        alias = self.index_name
+        actions: List[dict[str, Any]] = []
+        previous: List[str] = []
+        if await self.es.indices.exists_alias(name=alias):
+            previous = list(await self.es.indices.get_alias(name=alias))
+            actions += [{"remove": {"index": index, "alias": alias}} for index in previous]
+        elif await self.es.indices.exists(index=alias):
+            actions.append({"remove_index": {"index": alias}})
+        actions.append({"add": {"index": index_name, "alias": alias}})
+        await self.es.indices.update_aliases(actions=actions)
+        logger.info(f"Alias {alias} now points to {index_name} (was: {', '.join(previous) or 'none'})")
+        return previous
+
+    async def _collect_generations(self, index_name: str) -> None:
+        """Deletes versioned indices older than ``index_name`` beyond INDEX_KEEP_GENERATIONS.
+
+        Newer indices may belong to a rebuild that is still running and are
+        left alone.
+        """
+        response = await self.es.indices.get_alias(index=f"{self.index_name}-*")
+        older = sorted(
+            (name for name, info in response.items()
+             if self._is_versioned_index(name) and name < index_name and self.index_name not in info.get("aliases", {})),
+            reverse=True
+        )
+        for name in older[max(0, settings.INDEX_KEEP_GENERATIONS - 1):]:
+            await self.es.options(ignore_status=404).indices.delete(index=name)
+            logger.info(f"Deleted old index generation {name}")
+
+    async def _promote(self, run: SyncRun, seen: set[str], failed_titles: set[str]) -> None:
+        """Makes a rebuilt index live, or discards it if too many pages failed.
+
+        The index is force-merged and warmed up before the alias swap, so
+        searches never see it half-built. The page state held back during
+        the run is written only after the swap; pages that did not make it
+        into the new index lose their state and are retried by the next run.
+        """
+        stats = run.stats
+        missing = (seen - run.synced_titles) | failed_titles
+        failed = len(missing)
+        if stats.pages_listed == 0 or failed > settings.REBUILD_MAX_FAILED_RATIO * stats.pages_listed:
+            await self.es.options(ignore_status=404).indices.delete(index=run.index_name)
+            raise RebuildAbortedError(
+                f"{failed} of {stats.pages_listed} pages failed; discarded {run.index_name} and kept the live index"
+            )
+
+        es = self.es.options(request_timeout=settings.INDEX_MAINTENANCE_TIMEOUT)
+        if settings.INDEX_FORCE_MERGE_SEGMENTS:
+            started = time.perf_counter()
+            await es.indices.forcemerge(index=run.index_name, max_num_segments=settings.INDEX_FORCE_MERGE_SEGMENTS)
+            logger.info(f"Force-merged {run.index_name} in {time.perf_counter() - started:.1f}s")
+        # Replicas were restored by _end_ingest; at least the primaries must be allocated
+        await es.cluster.health(
+            index=run.index_name, wait_for_status="yellow", timeout=f"{int(settings.INDEX_MAINTENANCE_TIMEOUT)}s"
+        )
+        await self._warm_up(run.index_name)
+        await self._swap_alias(run.index_name)
+        await self._publish_generation(run.index_name)
+
+        for title in missing:
+            run.pending_state[title] = self.state_store.delete_action(title)
+        state_bulk = self._new_bulk()
+        await state_bulk.start()
+        try:
+            for action in run.pending_state.values():
+                await state_bulk.add(action)
+        finally:
+            await state_bulk.close()
+
+        try:
+            await self._collect_generations(run.index_name)
+        except Exception as e:
+            logger.warning(f"Could not delete old index generations: {e}")
+
+    async def _index_size(self) -> Optional[int]:
+        """Primary store size of the index in bytes, or None if it cannot be read."""
+        try:
+            response = await self.es.indices.stats(index=self.index_name, metric="store")
+            # Keyed by the concrete index the alias resolves to
+            return sum(int(index["primaries"]["store"]["size_in_bytes"]) for index in response["indices"].values())
+        except Exception as e:
+            logger.warning(f"Could not read the size of {self.index_name}: {e}")
+            return None
+
+    async def _begin_ingest(self, index_name: str) -> None:
+        """Disables refresh and replicas for the duration of a bulk load."""
+        await self.es.indices.put_settings(
+            index=index_name,
+            settings={"index.refresh_interval": "-1", "index.number_of_replicas": 0}
+        )
+
+    async def _end_ingest(self, index_name: str) -> None:
+        """Restores the configured refresh interval and replicas, then refreshes.
+
+        The values come from settings rather than from the index: after a
+        killed run the index still has the bulk-load values, and reading
+        them back would keep refresh off for good.
+        """
+        # A None value resets the setting to the cluster default
+        await self.es.indices.put_settings(index=index_name, settings={
+            "index.refresh_interval": settings.INDEX_REFRESH_INTERVAL,
+            "index.number_of_replicas": settings.INDEX_NUMBER_OF_REPLICAS
+        })
+        await self.es.indices.refresh(index=index_name)
+
+    def _start_stage(
+        self,
+        name: str,
+        handler: Callable[[PageWork], Awaitable[Optional[PageWork]]],
+        inbox: asyncio.Queue[PageWork],
+        outbox: Optional[asyncio.Queue[PageWork]],
+        concurrency: int,
+        stats: SyncStats
+    ) -> List[asyncio.Task[None]]:
+        """Starts ``concurrency`` workers that move pages from ``inbox`` to ``outbox``.
+
+        ``outbox`` is bounded, so a slow downstream stage blocks the workers
+        here instead of letting work pile up in memory. A page that fails in
+        any stage is logged and dropped; handlers return None to stop a page
+        that needs no further work.
+        """
+        async def worker() -> None:
+            while True:
+                work = await inbox.get()
+                try:
+                    with STAGE_SECONDS.labels(stage=name).time():
+                        result = await handler(work)
+                    if result is not None and outbox is not None:
+                        await outbox.put(result)
+                except Exception as e:
+                    stats.pages_failed += 1
+                    ERRORS.labels(stage=name).inc()
+                    logger.error(f"Failed to sync page {work.title} ({name}): {str(e)}")
+                finally:
+                    inbox.task_done()
+
+        return [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+
+    async def sync_pages(
+        self,
+        pages: Union[AsyncIterable[dict[str, Any]], Iterable[dict[str, Any]]],
+        cosense_client: CosenseClient,
+        full: bool = False,
+        rebuild: bool = False,
+        resume: bool = False,
+        shard: Optional[Shard] = None
+    ) -> SyncStats:
+        """Synchronizes a stream of pages into Elasticsearch.
+
+        ``pages`` may be an async iterator such as
+        ``CosenseClient.get_all_pages()``; pages enter the pipeline as they
+        are listed, so listing and processing overlap.
+
+        Pages flow through fetch -> clean/split -> encode -> index stages
+        connected by bounded queues, so network waits in different stages
+        overlap. Each stage's concurrency is configured in settings. Chunks
+        are written with bulk requests while refresh and replicas are
+        disabled on the index; both are reset to INDEX_REFRESH_INTERVAL and
+        INDEX_NUMBER_OF_REPLICAS when the run ends, and the index generation
+        is bumped if any page changed.
+
+        Fetches that still fail after the client's own retries are deferred
+        and retried once the stream has been drained.
+
+        Unless ``full`` is set, pages whose ``updated`` timestamp or content
+        hash match the stored sync state are skipped. Chunks use the
+        deterministic id ``project:title:chunk_id`` so re-synced pages replace
+        their old chunks, and pages missing from ``pages`` are deleted once
+        Cosense confirms they are gone.
+
+        With ``rebuild`` every page is written into a new versioned index
+        while searches keep using the live one; see ``_promote`` for how it
+        replaces the live index. A failed rebuild leaves the live index as
+        it was.
+
+        With CHECKPOINT_PATH set, progress is journaled. ``resume``
+        continues the journaled run if it was interrupted, in its original
+        mode: completed pages are skipped and encoded pages are indexed
+        without being fetched or encoded again.
+
+        With ``shard`` only the titles that shard owns are synced and
+        deleted, so N processes with shards 0/N .. N-1/N together cover the
+        project. Each keeps its own journal. Shards write into the live
+        index and expect it and the state index to exist already; the
+        ingest settings are left to ``prepare_shards``/``finish_shards``.
+        Rebuilds cannot be sharded.
+        """
+        if shard is not None and rebuild:
+            raise ValueError("A rebuild cannot be sharded")
+        await self._open_embedding_cache()
+        journal = None
+        if settings.CHECKPOINT_PATH:
+            journal = CheckpointJournal(shard.path(settings.CHECKPOINT_PATH) if shard else settings.CHECKPOINT_PATH)
+        try:
+            return await self._sync(pages, cosense_client, full, rebuild, resume, journal, shard)
+        finally:
+            if journal is not None:
+                journal.close()
+
+    async def _sync(
+        self,
+        pages: Union[AsyncIterable[dict[str, Any]], Iterable[dict[str, Any]]],
+        cosense_client: CosenseClient,
+        full: bool,
+        rebuild: bool,
+        resume: bool,
+        journal: Optional[CheckpointJournal],
+        shard: Optional[Shard] = None
+    ) -> SyncStats:
+        meta = await self._resumable_run(journal, shard) if journal is not None and resume else None
+        if meta is not None:
+            full, rebuild = meta["mode"] == "full", meta["mode"] == "rebuild"
+            resumed = await journal.pages()  # type: ignore[union-attr]
+            logger.info(
+                f"Resuming {meta['mode']} run from {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(meta['started_at']))}: "
+                f"{sum(p.status == DONE for p in resumed.values())} pages done, "
+                f"{sum(p.status == ENCODED for p in resumed.values())} encoded"
+            )
+        else:
+            resumed = {}
+
+        if meta is not None and rebuild:
+            index_name = meta["index_name"]
+        elif rebuild:
+            index_name = await self._create_rebuild_index()
+        elif shard is not None:
+            await self._check_shared_indices()
+            index_name = self.index_name
+        else:
+            await self.create_index_if_not_exists()
+            index_name = self.index_name
+        if journal is not None and meta is None:
+            mode = "rebuild" if rebuild else "full" if full else "incremental"
+            await journal.start({
+                "mode": mode,
+                "project": settings.COSENSE_PROJECT_NAME,
+                "index_name": index_name,
+                "shard": str(shard) if shard else None
+            })
+
+        previous = await self._prepare_state(rebuild)
+        if shard is not None:
+            previous = {title: state for title, state in previous.items() if shard.owns(title)}
+        run = SyncRun(
+            bulk=self._new_bulk(),
+            stats=SyncStats(),
+            previous=previous,
+            full=full or rebuild,
+            index_name=index_name,
+            rebuild=rebuild,
+            journal=journal,
+            resumed=resumed,
+            shard=shard
+        )
+        run.bulk.on_success = lambda ids: self._confirm(run, ids)
+        stats = run.stats
+        seen: set[str] = set()
+        try:
+            await self._run_pipeline(pages, cosense_client, run, seen)
+        except BaseException:
+            if rebuild and journal is None:
+                await self.es.options(ignore_status=404).indices.delete(index=index_name)
+            elif rebuild:
+                logger.warning(f"Keeping the partial index {index_name} for --resume")
+            raise
+
+        # Pages with rejected chunks must not look synced to the next run
+        failed_chunks = run.bulk.stats.failed_ids & run.chunk_titles.keys()
+        failed_titles = {run.chunk_titles[chunk_id] for chunk_id in failed_chunks}
+        if rebuild:
+            try:
+                await self._promote(run, seen, failed_titles)
+            except RebuildAbortedError:
+                if journal is not None:
+                    await journal.finish()
+                raise
+        elif failed_titles:
+            await self.state_store.forget(failed_titles)
+        if journal is not None:
+            await journal.finish()
+        stats.chunks_indexed -= len(failed_chunks)
+        stats.chunks_failed = len(failed_chunks)
+        stats.vectors = run.pruner.stats
+        stats.index_size_bytes = await self._index_size()
+        if self.embedding_cache is not None:
+            stats.embedding_cache = await self.embedding_cache.report()
+        logger.info(
+            f"Listed {stats.pages_listed} pages. Synced {stats.pages_synced} pages ({stats.chunks_indexed} chunks indexed, "
+            f"{stats.chunks_failed} chunks failed in {run.bulk.stats.flushes} bulk requests), "
+            f"{stats.pages_unchanged} unchanged, {stats.pages_deleted} deleted, "
+            f"{stats.pages_retried} retried, {stats.pages_resumed} resumed, {stats.pages_failed} pages failed."
+        )
+        size = f"{stats.index_size_bytes / 1024 / 1024:.1f} MiB" if stats.index_size_bytes is not None else "unknown"
+        logger.info(f"Document vectors: {stats.vectors.summary()}. Index size: {size}.")
+        if stats.embedding_cache is not None:
+            logger.info(f"Embedding cache: {stats.embedding_cache.summary()}.")
+        return stats
+
+    async def _resume_page(self, checkpoint: PageCheckpoint, run: SyncRun, index_q: asyncio.Queue[PageWork]) -> None:
+        """Carries a page over from the interrupted run instead of processing it again."""
+        if checkpoint.status == ENCODED:
+            await index_q.put(PageWork(
+                title=checkpoint.title,
+                updated=checkpoint.updated,
+                content_hash=checkpoint.content_hash,
+                chunks=checkpoint.chunks,
+                vectors=checkpoint.vectors
+            ))
+            return
+        run.synced_titles.add(checkpoint.title)
+        if run.rebuild:
+            # The held-back state of the interrupted run was lost with it
+            run.pending_state[checkpoint.title] = self.state_store.save_action(PageState(
+                title=checkpoint.title,
+                updated=checkpoint.updated,
+                content_hash=checkpoint.content_hash,
+                chunk_count=checkpoint.chunk_count
+            ))
+
+    async def _resumable_run(self, journal: CheckpointJournal, shard: Optional[Shard] = None) -> Optional[dict[str, Any]]:
+        """Returns the journal metadata of an interrupted run of this project, if it can be continued."""
+        meta = await journal.meta()
+        if (
+            meta.get("status") != "running"
+            or meta.get("project") != settings.COSENSE_PROJECT_NAME
+            or meta.get("shard") != (str(shard) if shard else None)
+        ):
+            logger.info("No interrupted run to resume; starting a new one.")
+            return None
+        if meta["mode"] == "rebuild" and not await self.es.indices.exists(index=meta["index_name"]):
+            logger.warning(f"Index {meta['index_name']} of the interrupted rebuild is gone; starting a new one.")
+            return None
+        return meta
+
+    def _new_bulk(self) -> BulkIndexer:
+        return BulkIndexer(
+            self.es,
+            chunk_size=settings.BULK_CHUNK_SIZE,
+            max_bytes=settings.BULK_MAX_BYTES,
+            flush_interval=settings.BULK_FLUSH_INTERVAL,
+            max_retries=settings.BULK_MAX_RETRIES
+        )
+
+    async def _run_pipeline(
+        self,
+        pages: Union[AsyncIterable[dict[str, Any]], Iterable[dict[str, Any]]],
+        cosense_client: CosenseClient,
+        run: SyncRun,
+        seen: set[str]
+    ) -> None:
+        """Streams ``pages`` through the stages into ``run.index_name``, collecting listed titles in ``seen``."""
+        stats = run.stats
+        previous = run.previous
+        full = run.full
+        # Shards share the index; prepare_shards toggles its settings once for all of them
+        if run.shard is None:
+            await self._begin_ingest(run.index_name)
+        await run.bulk.start()
+
+        queues: List[asyncio.Queue[PageWork]] = [
+            asyncio.Queue(maxsize=settings.PIPELINE_QUEUE_SIZE) for _ in range(4)
+        ]
+        fetch_q, split_q, encode_q, index_q = queues
+        stages = [
+            self._start_stage("fetch", lambda w: self._fetch(w, cosense_client, run), fetch_q, split_q, settings.FETCH_CONCURRENCY, stats),
+            self._start_stage("split", lambda w: self._split(w, run), split_q, encode_q, settings.SPLIT_CONCURRENCY, stats),
+            self._start_stage("encode", lambda w: self._encode(w, run), encode_q, index_q, settings.ENCODE_CONCURRENCY, stats),
+            self._start_stage("index", lambda w: self._index(w, run), index_q, None, settings.INDEX_CONCURRENCY, stats),
+        ]
+
+        try:
+            async for page in _aiter(pages):
+                title = page["title"]
+                # Pages created while the listing is paged shift the rest and can be listed twice
+                if title in seen or (run.shard is not None and not run.shard.owns(title)):
+                    continue
+                seen.add(title)
+                stats.pages_listed += 1
+                state = previous.get(title)
+                updated = page.get("updated")
+                checkpoint = run.resumed.get(title)
+                if checkpoint is not None and checkpoint.updated == updated and checkpoint.status in (DONE, ENCODED):
+                    stats.pages_resumed += 1
+                    await self._resume_page(checkpoint, run, index_q)
+                    continue
+                if not full and state is not None and updated is not None and state.updated == updated:
+                    stats.pages_unchanged += 1
+                    continue
+                if run.journal is not None:
+                    await run.journal.mark_in_flight(title, updated)
+                await fetch_q.put(PageWork(title=title, updated=updated))
+            # Drain the stages in order: once a queue is joined, nothing
+            # upstream can enqueue into the next one any more.
+            for queue in queues:
+                await queue.join()
+            await self._retry_deferred(run, queues)
+            for work in run.deferred:
+                stats.pages_failed += 1
+                logger.error(f"Failed to sync page {work.title} (fetch): retries exhausted")
+            await self._delete_removed_pages(run, seen, cosense_client)
+        finally:
+            for workers in stages:
+                for task in workers:
+                    task.cancel()
+            await asyncio.gather(*(task for workers in stages for task in workers), return_exceptions=True)
             try:
-                content = await cosense_client.get_page_content(title)
-                cleaned_content = self._clean_text(content)
-                chunks = self.text_splitter.split_text(cleaned_content)
-                
-                for i, chunk in enumerate(chunks):
-                    sparse_vector = await self.get_sparse_embeddings(chunk)
-                    doc = {
-                        "text": chunk,
-                        "sparse_vector": sparse_vector,
-                        "metadata": {
-                            "title": title,
-                            "chunk_id": i,
-                            "project": settings.COSENSE_PROJECT_NAME
-                        }
-                    }
-                    await self.es.index(index="cosense_pages", document=doc)
-                print(f"Synced page: {title}")
-            except Exception as e:
-                print(f"Failed to sync page {title}: {str(e)}")
+                await run.bulk.close()
+            finally:
+                if run.shard is None:
+                    await self._end_ingest(run.index_name)
+                else:
+                    await self.es.indices.refresh(index=run.index_name)
+                # Also after a failed run: whatever was written is searchable now.
+                # A rebuilt index is published by _promote once it is live.
+                if not run.rebuild and (stats.pages_synced or stats.pages_deleted):
+                    await self._publish_generation()
+
+    async def _check_shared_indices(self) -> None:
+        # Creating them here would race with the other shards
+        for index in (self.index_name, self.state_store.index_name):
+            if not await self.es.indices.exists(index=index):
+                raise ShardNotReadyError(f"Index {index} does not exist; create it with an unsharded sync or --workers first")
+
+    async def prepare_shards(self) -> None:
+        """Creates the indices shard workers share and disables refresh and replicas for their bulk load."""
+        await self.create_index_if_not_exists()
+        await self._prepare_state()
+        await self._begin_ingest(self.index_name)
+
+    async def finish_shards(self) -> Optional[int]:
+        """Restores the index settings after all shard workers ended; returns the index size."""
+        await self._end_ingest(self.index_name)
+        return await self._index_size()
 
     async def close(self) -> None:
-        """Closes the Elasticsearch connection."""
+        """Closes the Elasticsearch connection and the embedding cache."""
+        if self.embedding_cache is not None:
+            self.embedding_cache.close()
         await self.es.close()
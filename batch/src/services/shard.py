@@ -0,0 +1,146 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import tempfile
+import zlib
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Any, List, Optional
+from src.core.config import settings
+from src.services.checkpoint import DONE, ENCODED, CheckpointJournal
+from src.services.embedding_cache import EmbeddingCacheStats
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class Shard:
+    """One hash partition ``index``/``count`` of the project's page titles.
+
+    A title belongs to shard ``crc32(title) % count``, so every process
+    agrees on the partition without coordinating.
+    """
+    index: int
+    count: int
+
+    @classmethod
+    def parse(cls, text: str) -> "Shard":
+        """Parses ``i/N`` with 0 <= i < N."""
+        match = re.fullmatch(r"(\d+)/(\d+)", text.strip())
+        if match is None:
+            raise ValueError(f"Invalid shard {text!r}; expected i/N, e.g. 0/4")
+        shard = cls(int(match.group(1)), int(match.group(2)))
+        if shard.count < 1 or not 0 <= shard.index < shard.count:
+            raise ValueError(f"Invalid shard {text!r}; i must be in [0, N)")
+        return shard
+
+    def owns(self, title: str) -> bool:
+        return zlib.crc32(title.encode("utf-8")) % self.count == self.index
+
+    def path(self, path: str) -> str:
+        """Per-shard variant of a file path, e.g. for the checkpoint journal."""
+        return f"{path}.shard-{self.index}-of-{self.count}"
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+def merge_stats(parts: List[dict[str, Any]]) -> Any:
+    """Adds up the ``SyncStats`` of several shards, given as ``asdict`` dicts."""
+    # Imported here: the indexer module imports this one
+    from src.services.indexer import SyncStats
+    merged = SyncStats()
+    for part in parts:
+        for field in fields(SyncStats):
+            value = part.get(field.name)
+            if value is None:
+                continue
+            if field.name == "vectors":
+                for key, number in value.items():
+                    setattr(merged.vectors, key, getattr(merged.vectors, key) + number)
+            elif field.name == "embedding_cache":
+                cache = merged.embedding_cache or EmbeddingCacheStats()
+                for key in ("hits", "misses", "writes", "evictions"):
+                    setattr(cache, key, getattr(cache, key) + value[key])
+                # Shards share one cache file, so its size is not additive
+                cache.entries, cache.size_bytes = value["entries"], value["size_bytes"]
+                merged.embedding_cache = cache
+            elif field.name == "index_size_bytes":
+                merged.index_size_bytes = max(merged.index_size_bytes or 0, value)
+            else:
+                setattr(merged, field.name, getattr(merged, field.name) + value)
+    return merged
+
+def write_stats(path: str, stats: Any) -> None:
+    """Writes a shard's ``SyncStats`` for the coordinator to merge."""
+    Path(path).write_text(json.dumps(asdict(stats)), encoding="utf-8")
+
+async def checkpoint_summary(count: int) -> List[str]:
+    """One line per shard describing its checkpoint journal, if checkpointing is on."""
+    if not settings.CHECKPOINT_PATH:
+        return []
+    lines = []
+    for index in range(count):
+        shard = Shard(index, count)
+        path = shard.path(settings.CHECKPOINT_PATH)
+        if not Path(path).exists():
+            lines.append(f"shard {shard}: no journal")
+            continue
+        journal = CheckpointJournal(path)
+        try:
+            meta = await journal.meta()
+            pages = await journal.pages()
+        finally:
+            journal.close()
+        if meta.get("status") == "finished":
+            lines.append(f"shard {shard}: finished")
+        else:
+            lines.append(
+                f"shard {shard}: interrupted with {sum(p.status == DONE for p in pages.values())} pages done, "
+                f"{sum(p.status == ENCODED for p in pages.values())} encoded"
+            )
+    return lines
+
+class ShardCoordinator:
+    """Runs ``workers`` shard processes of the batch job on this machine and merges their results.
+
+    ``command`` starts one worker; ``--shard i/N`` and ``--stats-file`` are
+    appended to it. The Cosense rate limit is split evenly between the
+    workers so that together they stay within it.
+    """
+
+    def __init__(self, workers: int, command: List[str]) -> None:
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.workers = workers
+        self.command = command
+
+    def _environment(self) -> dict[str, str]:
+        env = dict(os.environ)
+        if settings.COSENSE_RATE_LIMIT > 0:
+            env["COSENSE_RATE_LIMIT"] = str(settings.COSENSE_RATE_LIMIT / self.workers)
+        return env
+
+    async def run(self, flags: Optional[List[str]] = None) -> tuple[Any, List[int]]:
+        """Starts every shard, waits for all of them and returns the merged stats and exit codes.
+
+        ``flags`` (e.g. ``--full``) are passed to every worker.
+        """
+        with tempfile.TemporaryDirectory(prefix="batch-shards-") as directory:
+            stats_files = [os.path.join(directory, f"shard-{index}.json") for index in range(self.workers)]
+            processes = [
+                await asyncio.create_subprocess_exec(
+                    *self.command, *(flags or []),
+                    "--shard", str(Shard(index, self.workers)), "--stats-file", stats_files[index],
+                    env=self._environment()
+                )
+                for index in range(self.workers)
+            ]
+            codes = list(await asyncio.gather(*(process.wait() for process in processes)))
+            parts = []
+            for index, (path, code) in enumerate(zip(stats_files, codes)):
+                if code != 0 or not os.path.exists(path):
+                    logger.error(f"Shard {index}/{self.workers} failed with exit code {code}")
+                    continue
+                parts.append(json.loads(Path(path).read_text(encoding="utf-8")))
+        return merge_stats(parts), codes
@@ -0,0 +1,93 @@
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+def prune_vector(
+    sparse_vector: dict[str, float],
+    max_terms: Optional[int] = None,
+    min_weight: float = 0.0
+) -> dict[str, float]:
+    """Keeps the heaviest terms of a sparse vector, ordered by weight.
+
+    Terms lighter than ``min_weight`` or outside the ``max_terms`` heaviest
+    are dropped, as are empty tokens. The heaviest term always survives so
+    a non-empty vector never prunes to nothing.
+    """
+    terms = sorted(
+        ((token, weight) for token, weight in sparse_vector.items() if token and weight > 0),
+        key=lambda item: item[1],
+        reverse=True
+    )
+    kept: dict[str, float] = {}
+    for token, weight in terms:
+        if kept and (weight < min_weight or (max_terms is not None and len(kept) >= max_terms)):
+            break
+        kept[token] = weight
+    return kept
+
+def quantize_vector(sparse_vector: dict[str, float], levels: int, max_weight: float) -> dict[str, float]:
+    """Rounds weights to ``levels`` evenly spaced values in (0, ``max_weight``].
+
+    Weights are rounded up to the next level so no term drops to zero
+    (``rank_features`` only accepts positive values); heavier weights are
+    clamped to ``max_weight``.
+    """
+    step = max_weight / levels
+    return {token: min(levels, max(1, math.ceil(weight / step - 1e-9))) * step for token, weight in sparse_vector.items()}
+
+@dataclass
+class PruneStats:
+    """Size and fidelity of the document vectors written during a run."""
+    vectors: int = 0
+    terms_in: int = 0
+    terms_kept: int = 0
+    mass_in: float = 0.0
+    mass_kept: float = 0.0
+    # Sum over vectors of dot(full, stored) / dot(full, full)
+    self_score_retained: float = 0.0
+
+    def summary(self) -> str:
+        if not self.vectors:
+            return "no vectors written"
+        return (
+            f"kept {self.terms_kept}/{self.terms_in} terms ({self.terms_kept / max(1, self.terms_in):.1%}), "
+            f"{self.mass_kept / self.mass_in if self.mass_in else 1.0:.1%} of the weight, "
+            f"self-match score retention {self.self_score_retained / self.vectors:.3f}"
+        )
+
+class DocumentVectorPruner:
+    """Applies the index-time top-N, weight floor and quantization to chunk vectors.
+
+    With no limits configured vectors pass through unchanged (apart from
+    empty and non-positive terms) and only the statistics are collected.
+    """
+
+    def __init__(
+        self,
+        max_terms: Optional[int] = None,
+        min_weight: float = 0.0,
+        quantize_levels: Optional[int] = None,
+        quantize_max_weight: float = 5.0
+    ) -> None:
+        self.max_terms = max_terms
+        self.min_weight = min_weight
+        self.quantize_levels = quantize_levels
+        self.quantize_max_weight = quantize_max_weight
+        self.stats = PruneStats()
+
+    def apply(self, sparse_vector: dict[str, float]) -> dict[str, float]:
+        stored = prune_vector(sparse_vector, max_terms=self.max_terms, min_weight=self.min_weight)
+        mass_kept = sum(stored.values())
+        if self.quantize_levels:
+            stored = quantize_vector(stored, self.quantize_levels, self.quantize_max_weight)
+
+        full_norm = sum(w * w for w in sparse_vector.values())
+        self.stats.vectors += 1
+        self.stats.terms_in += len(sparse_vector)
+        self.stats.terms_kept += len(stored)
+        self.stats.mass_in += sum(sparse_vector.values())
+        self.stats.mass_kept += mass_kept
+        self.stats.self_score_retained += (
+            sum(sparse_vector[token] * weight for token, weight in stored.items()) / full_norm if full_norm else 1.0
+        )
+        return stored
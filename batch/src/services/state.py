@@ -0,0 +1,101 @@
+import hashlib
+import logging
+from dataclasses import asdict, dataclass
+from typing import Any, Iterable, Optional
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_scan
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Elasticsearch rejects document ids longer than 512 bytes
+MAX_ID_BYTES = 512
+
+def doc_id(*parts: Any) -> str:
+    """Builds a deterministic document id such as ``project:title:chunk_id``.
+
+    Ids that would exceed Elasticsearch's limit (long titles) are replaced by
+    a sha256 of the same string, which is just as deterministic.
+    """
+    raw = ":".join(str(part) for part in parts)
+    if len(raw.encode("utf-8")) <= MAX_ID_BYTES:
+        return raw
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+@dataclass
+class PageState:
+    """What the last successful sync stored for a page."""
+    title: str
+    updated: Optional[int]
+    content_hash: str
+    chunk_count: int
+
+class SyncStateStore:
+    """Per-page sync state kept in a small Elasticsearch index.
+
+    The state lives next to the data it describes, so it survives the batch
+    container (which runs with ``--rm``) without needing a volume.
+    """
+
+    def __init__(self, es: AsyncElasticsearch, index_name: Optional[str] = None, project: Optional[str] = None) -> None:
+        self.es = es
+        self.index_name = index_name or settings.SYNC_STATE_INDEX
+        self.project = project or settings.COSENSE_PROJECT_NAME
+
+    async def ensure_index(self) -> bool:
+        """Creates the state index if needed. Returns True when it was created."""
+        if await self.es.indices.exists(index=self.index_name):
+            return False
+        await self.es.indices.create(
+            index=self.index_name,
+            body={
+                "mappings": {
+                    "properties": {
+                        "project": {"type": "keyword"},
+                        "title": {"type": "keyword"},
+                        "updated": {"type": "long"},
+                        "content_hash": {"type": "keyword"},
+                        "chunk_count": {"type": "integer"}
+                    }
+                }
+            }
+        )
+        return True
+
+    async def load(self) -> dict[str, PageState]:
+        """Returns the stored state of every page of the project, keyed by title."""
+        states: dict[str, PageState] = {}
+        async for hit in async_scan(
+            self.es,
+            index=self.index_name,
+            query={"query": {"term": {"project": self.project}}}
+        ):
+            source = hit["_source"]
+            states[source["title"]] = PageState(
+                title=source["title"],
+                updated=source.get("updated"),
+                content_hash=source["content_hash"],
+                chunk_count=source["chunk_count"]
+            )
+        return states
+
+    def save_action(self, state: PageState) -> dict[str, Any]:
+        """Bulk action that records ``state`` for its page."""
+        return {
+            "_op_type": "index",
+            "_index": self.index_name,
+            "_id": doc_id(self.project, state.title),
+            "_source": {"project": self.project, **asdict(state)}
+        }
+
+    def delete_action(self, title: str) -> dict[str, Any]:
+        """Bulk action that forgets the state of ``title``."""
+        return {"_op_type": "delete", "_index": self.index_name, "_id": doc_id(self.project, title)}
+
+    async def forget(self, titles: Iterable[str]) -> None:
+        """Deletes the state of ``titles`` so the next run processes them again."""
+        for title in titles:
+            await self.es.options(ignore_status=404).delete(index=self.index_name, id=doc_id(self.project, title))
@@ -0,0 +1,6 @@
+import pytest
+
+@pytest.fixture
+def anyio_backend():
+    # The services are built on asyncio primitives (queues, tasks)
+    return "asyncio"
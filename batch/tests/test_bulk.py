@@ -0,0 +1,107 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from src.services.bulk import BulkIndexer
+
+def _fake_streaming_bulk(requests, fail_ids=()):
+    async def fake(es, actions, **kwargs):
+        requests.append(list(actions))
+        for action in actions:
+            if action["_id"] in fail_ids:
+                yield False, {"index": {"_id": action["_id"], "status": 400, "error": {"type": "mapper_parsing_exception"}}}
+            else:
+                yield True, {"index": {"_id": action["_id"], "status": 201}}
+    return fake
+
+@pytest.mark.anyio
+async def test_should_flush_when_chunk_size_is_reached():
+    """Test count-based flushing.
+
+    Arrange: Create a BulkIndexer with chunk_size=2 and no timer.
+    Act: Add three actions and close.
+    Assert: Check two bulk requests of 2 and 1 actions were sent.
+    """
+    requests = []
+    with patch("src.services.bulk.async_streaming_bulk", _fake_streaming_bulk(requests)):
+        bulk = BulkIndexer(MagicMock(), chunk_size=2, flush_interval=0)
+        for i in range(3):
+            await bulk.add({"_id": str(i), "_source": {}})
+        await bulk.close()
+
+    assert [len(r) for r in requests] == [2, 1]
+    assert bulk.stats.succeeded == 3
+    assert bulk.stats.flushes == 2
+
+@pytest.mark.anyio
+async def test_should_flush_when_byte_size_is_reached():
+    """Test byte-based flushing.
+
+    Arrange: Create a BulkIndexer whose byte limit is smaller than one action.
+    Act: Add two actions.
+    Assert: Check each action was sent in its own request before close.
+    """
+    requests = []
+    with patch("src.services.bulk.async_streaming_bulk", _fake_streaming_bulk(requests)):
+        bulk = BulkIndexer(MagicMock(), chunk_size=100, max_bytes=10, flush_interval=0)
+        await bulk.add({"_id": "a", "_source": {"text": "long enough"}})
+        await bulk.add({"_id": "b", "_source": {"text": "long enough"}})
+
+    assert [len(r) for r in requests] == [1, 1]
+
+@pytest.mark.anyio
+async def test_should_flush_on_time_window():
+    """Test time-based flushing of a partially filled buffer.
+
+    Arrange: Create a BulkIndexer with a short flush interval.
+    Act: Add one action and wait past the interval.
+    Assert: Check the action was sent without an explicit flush.
+    """
+    import asyncio
+    requests = []
+    with patch("src.services.bulk.async_streaming_bulk", _fake_streaming_bulk(requests)):
+        bulk = BulkIndexer(MagicMock(), chunk_size=100, flush_interval=0.01)
+        await bulk.start()
+        await bulk.add({"_id": "a", "_source": {}})
+        await asyncio.sleep(0.05)
+        assert len(requests) == 1
+        await bulk.close()
+
+@pytest.mark.anyio
+async def test_should_report_per_document_failures():
+    """Test that failed documents are counted and recorded.
+
+    Arrange: Make the bulk helper reject one document.
+    Act: Add two actions and close.
+    Assert: Check the failure is reported with its id and error.
+    """
+    with patch("src.services.bulk.async_streaming_bulk", _fake_streaming_bulk([], fail_ids={"bad"})):
+        bulk = BulkIndexer(MagicMock(), flush_interval=0)
+        await bulk.add({"_id": "good", "_source": {}})
+        await bulk.add({"_id": "bad", "_source": {}})
+        await bulk.close()
+
+    assert bulk.stats.succeeded == 1
+    assert bulk.stats.failed == 1
+    assert bulk.stats.failures[0]["id"] == "bad"
+    assert bulk.stats.failures[0]["error"]["type"] == "mapper_parsing_exception"
+
+@pytest.mark.anyio
+async def test_should_report_written_ids_to_the_success_hook():
+    """Test the on_success callback.
+
+    Arrange: Create a BulkIndexer whose backend rejects one of three actions.
+    Act: Add the actions and close.
+    Assert: Check the hook received only the ids that were written.
+    """
+    requests = []
+    reported = []
+
+    async def on_success(ids):
+        reported.extend(ids)
+
+    with patch("src.services.bulk.async_streaming_bulk", _fake_streaming_bulk(requests, fail_ids={"b"})):
+        bulk = BulkIndexer(MagicMock(), flush_interval=0, on_success=on_success)
+        for action_id in ("a", "b", "c"):
+            await bulk.add({"_id": action_id, "_source": {}})
+        await bulk.close()
+
+    assert reported == ["a", "c"]
@@ -0,0 +1,52 @@
+import pytest
+from src.services.checkpoint import DONE, ENCODED, IN_FLIGHT, CheckpointJournal
+
+@pytest.mark.anyio
+async def test_should_persist_page_progress_across_connections(tmp_path):
+    """Test that journaled progress can be read back after a restart.
+
+    Arrange: Start a journal and record pages in each state.
+    Act: Close it and open the same file again.
+    Assert: Check the metadata, statuses and stored chunks are returned.
+    """
+    path = str(tmp_path / "journal" / "checkpoint.sqlite")
+    journal = CheckpointJournal(path)
+    await journal.start({"mode": "full", "project": "p", "index_name": "cosense_pages"})
+    await journal.mark_in_flight("A", 1)
+    await journal.mark_in_flight("B", 2)
+    await journal.save_encoded("B", 2, "hash-b", ["chunk"], [{"t": 0.5}])
+    await journal.save_encoded("C", 3, "hash-c", ["one", "two"], [{"t": 1.0}, {"u": 2.0}])
+    await journal.mark_done(["C"])
+    journal.close()
+
+    reopened = CheckpointJournal(path)
+    meta = await reopened.meta()
+    pages = await reopened.pages()
+    reopened.close()
+
+    assert (meta["mode"], meta["project"], meta["status"]) == ("full", "p", "running")
+    assert {title: page.status for title, page in pages.items()} == {"A": IN_FLIGHT, "B": ENCODED, "C": DONE}
+    assert (pages["B"].chunks, pages["B"].vectors, pages["B"].content_hash) == (["chunk"], [{"t": 0.5}], "hash-b")
+    assert (pages["C"].chunks, pages["C"].chunk_count) == ([], 2)
+
+@pytest.mark.anyio
+async def test_should_forget_progress_when_a_run_finishes_or_restarts(tmp_path):
+    """Test journal resets.
+
+    Arrange: Record a page in a started journal.
+    Act: Finish the run, then start another one.
+    Assert: Check finish marks the run finished and drops pages, and start resets the metadata.
+    """
+    journal = CheckpointJournal(str(tmp_path / "checkpoint.sqlite"))
+    await journal.start({"mode": "incremental", "project": "p", "index_name": "cosense_pages"})
+    await journal.mark_in_flight("A", 1)
+
+    await journal.finish()
+    finished_meta, finished_pages = await journal.meta(), await journal.pages()
+    await journal.start({"mode": "rebuild", "project": "p", "index_name": "cosense_pages-1"})
+    restarted_meta = await journal.meta()
+    journal.close()
+
+    assert finished_meta["status"] == "finished"
+    assert finished_pages == {}
+    assert (restarted_meta["status"], restarted_meta["mode"]) == ("running", "rebuild")
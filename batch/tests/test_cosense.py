@@ -1,6 +1,8 @@
+import httpx
 import pytest
-from unittest.mock import patch, MagicMock
-from src.services.cosense import CosenseClient
+from unittest.mock import AsyncMock, patch, MagicMock
+from src.services.cosense import CosenseClient, CosenseUnavailableError
+from src.services.ratelimit import TokenBucket
 
 @pytest.mark.anyio
 async def test_should_fetch_all_pages_successfully():
@@ -20,7 +22,7 @@ async def test_should_fetch_all_pages_successfully():
         mock_get.return_value = mock_response
         
         client = CosenseClient()
-        pages = await client.get_all_pages()
+        pages = [page async for page in client.get_all_pages()]
         
         assert len(pages) == 2
         assert pages[0]["title"] == "Page 1"
@@ -47,3 +49,117 @@ async def test_should_fetch_page_content_successfully():
         content = await client.get_page_content("Test Page")
         
         assert content == expected_text
+
+@pytest.mark.anyio
+async def test_should_page_through_listing_until_count_is_exhausted():
+    """Test that get_all_pages follows skip/limit across several requests.
+
+    Arrange: Mock a project of 5 pages served 2 at a time.
+    Act: Stream get_all_pages with page_size=2.
+    Assert: Check every page is yielded once and the skip offsets advance.
+    """
+    all_pages = [{"title": f"Page {i}"} for i in range(5)]
+
+    def listing(url, headers=None, params=None):
+        response = MagicMock()
+        response.raise_for_status = MagicMock()
+        skip, limit = params["skip"], params["limit"]
+        response.json.return_value = {"count": 5, "skip": skip, "limit": limit, "pages": all_pages[skip:skip + limit]}
+        return response
+
+    with patch("httpx.AsyncClient.get", side_effect=listing) as mock_get:
+        client = CosenseClient()
+        pages = [page async for page in client.get_all_pages(page_size=2)]
+
+    assert pages == all_pages
+    assert [c.kwargs["params"]["skip"] for c in mock_get.call_args_list] == [0, 2, 4]
+    assert {c.kwargs["params"]["sort"] for c in mock_get.call_args_list} == {"created"}
+
+def _response(status_code, text="", headers=None):
+    return httpx.Response(status_code, text=text, headers=headers, request=httpx.Request("GET", "https://scrapbox.io/api"))
+
+@pytest.mark.anyio
+async def test_should_retry_rate_limited_requests_honoring_retry_after():
+    """Test that 429 and 5xx responses are retried with backoff.
+
+    Arrange: Mock a 429 with Retry-After: 2, then a 503, then a success.
+    Act: Call get_page_content.
+    Assert: Check the text is returned, the first delay honors Retry-After
+        and only the 429 pauses the shared rate limiter.
+    """
+    responses = [_response(429, headers={"Retry-After": "2"}), _response(503), _response(200, text="ok")]
+
+    with patch("httpx.AsyncClient.get", side_effect=responses) as mock_get, \
+         patch("src.services.cosense.asyncio.sleep") as mock_sleep:
+        client = CosenseClient(max_retries=3)
+        client.limiter = MagicMock(acquire=AsyncMock())
+        content = await client.get_page_content("Test Page")
+
+    assert content == "ok"
+    assert mock_get.call_count == 3
+    delays = [c.args[0] for c in mock_sleep.call_args_list]
+    assert len(delays) == 2
+    assert delays[0] >= 2
+    client.limiter.pause.assert_called_once_with(delays[0])
+
+@pytest.mark.anyio
+async def test_should_give_up_after_max_retries_and_not_retry_client_errors():
+    """Test the failure modes of the retrying client.
+
+    Arrange: Mock a server that always answers 502, then one that answers 404.
+    Act: Call get_page_content against each.
+    Assert: Check 502 raises CosenseUnavailableError after every retry and
+        404 is raised immediately.
+    """
+    with patch("httpx.AsyncClient.get", side_effect=lambda *a, **k: _response(502)) as mock_get, \
+         patch("src.services.cosense.asyncio.sleep"):
+        with pytest.raises(CosenseUnavailableError):
+            await CosenseClient(rate_limit=0, max_retries=2).get_page_content("Test Page")
+    assert mock_get.call_count == 3
+
+    with patch("httpx.AsyncClient.get", side_effect=lambda *a, **k: _response(404)) as mock_get:
+        with pytest.raises(httpx.HTTPStatusError):
+            await CosenseClient(rate_limit=0, max_retries=2).get_page_content("Missing")
+    assert mock_get.call_count == 1
+
+@pytest.mark.anyio
+async def test_should_space_requests_with_the_token_bucket():
+    """Test the token-bucket rate limit.
+
+    Arrange: Create a bucket of 10 requests per second with a burst of 2.
+    Act: Acquire 4 tokens.
+    Assert: Check the burst is free and the rest wait for refills.
+    """
+    with patch("src.services.ratelimit.asyncio.sleep") as mock_sleep, \
+         patch("src.services.ratelimit.time.monotonic", return_value=0.0):
+        bucket = TokenBucket(rate=10, burst=2)
+        async def refill(seconds):
+            bucket._updated -= seconds
+        mock_sleep.side_effect = refill
+        for _ in range(4):
+            await bucket.acquire()
+
+    assert mock_sleep.call_count == 2
+    assert all(c.args[0] == pytest.approx(0.1) for c in mock_sleep.call_args_list)
+
+@pytest.mark.anyio
+async def test_should_tell_whether_a_page_still_exists():
+    """Test page_exists against the single-page endpoint.
+
+    Arrange: Mock a persistent page, an unknown title answered with an
+        empty page, and a 404.
+    Act: Call page_exists for each.
+    Assert: Check only the persistent page exists.
+    """
+    responses = [
+        httpx.Response(200, json={"title": "A", "persistent": True}, request=httpx.Request("GET", "https://scrapbox.io/api")),
+        httpx.Response(200, json={"title": "B", "persistent": False}, request=httpx.Request("GET", "https://scrapbox.io/api")),
+        _response(404),
+    ]
+
+    with patch("httpx.AsyncClient.get", side_effect=responses) as mock_get:
+        client = CosenseClient(rate_limit=0)
+        results = [await client.page_exists(title) for title in ("A", "B", "C/D")]
+
+    assert results == [True, False, False]
+    assert mock_get.call_args_list[2].args[0].endswith("/C%2FD")
@@ -0,0 +1,94 @@
+import pytest
+from src.services.embedding_cache import EmbeddingCache
+
+@pytest.mark.anyio
+async def test_should_return_cached_vectors_per_model(tmp_path):
+    """Test round trips through the on-disk cache.
+
+    Arrange: Store two vectors under one model id.
+    Act: Look them up again from a new connection, and under another model id.
+    Assert: Check hits return the same terms and weights, other models miss
+        and the stats count both.
+    """
+    path = str(tmp_path / "cache" / "embeddings.sqlite")
+    cache = EmbeddingCache(path, model_id="model-a")
+    await cache.put_many(["first", "second"], [{"a": 0.5, "b": 1.25}, {"c": 2.0}])
+    cache.close()
+
+    reopened = EmbeddingCache(path, model_id="model-a")
+    other_model = EmbeddingCache(path, model_id="model-b")
+    results = await reopened.get_many(["second", "missing", "first"])
+    other = await other_model.get_many(["first"])
+    stats = await reopened.report()
+    reopened.close()
+    other_model.close()
+
+    assert results == [{"c": 2.0}, None, {"a": 0.5, "b": 1.25}]
+    assert other == [None]
+    assert (stats.hits, stats.misses, stats.entries) == (2, 1, 2)
+    assert "2/3 hits" in stats.summary()
+
+@pytest.mark.anyio
+async def test_should_evict_least_recently_used_entries(tmp_path):
+    """Test the size bound.
+
+    Arrange: Create a cache limited to 2 entries and store two vectors.
+    Act: Read the first one, store a third and run the end-of-run report.
+    Assert: Check the untouched second entry was evicted.
+    """
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"), model_id="m", max_entries=2)
+    await cache.put_many(["one", "two"], [{"x": 1.0}, {"y": 1.0}])
+    await cache.get_many(["one"])
+    await cache.put_many(["three"], [{"z": 1.0}])
+    stats = await cache.report()
+    results = await cache.get_many(["one", "two", "three"])
+    cache.close()
+
+    assert results == [{"x": 1.0}, None, {"z": 1.0}]
+    assert (stats.evictions, stats.entries) == (1, 2)
+
+@pytest.mark.anyio
+async def test_should_share_the_cache_file_between_processes(tmp_path):
+    """Test two caches on one file, as used by shard workers.
+
+    Arrange: Open two caches on the same file and load both term tables.
+    Act: Let each store vectors with terms new to the other, then read the
+        other's vectors.
+    Assert: Check every write is kept and both read each other's vectors.
+    """
+    path = str(tmp_path / "embeddings.sqlite")
+    first = EmbeddingCache(path, model_id="m")
+    second = EmbeddingCache(path, model_id="m")
+    await first.get_many(["warm up"])
+    await second.get_many(["warm up"])
+
+    await first.put_many(["a"], [{"x": 1.0, "shared": 0.5}])
+    await second.put_many(["b"], [{"y": 2.0, "shared": 0.25}])
+    from_first = await second.get_many(["a"])
+    from_second = await first.get_many(["b"])
+    first.close()
+    second.close()
+
+    assert (first.stats.writes, second.stats.writes) == (1, 1)
+    assert from_first == [{"x": 1.0, "shared": 0.5}]
+    assert from_second == [{"y": 2.0, "shared": 0.25}]
+
+@pytest.mark.anyio
+async def test_should_treat_undecodable_entries_as_misses(tmp_path):
+    """Test that a corrupt entry does not fail the lookup.
+
+    Arrange: Store a vector, then truncate its stored weights.
+    Act: Look up the corrupt entry and an intact one.
+    Assert: Check the corrupt one misses and the intact one hits.
+    """
+    path = str(tmp_path / "embeddings.sqlite")
+    cache = EmbeddingCache(path, model_id="m")
+    await cache.put_many(["bad", "good"], [{"a": 1.0}, {"b": 2.0}])
+    cache._connect().execute(
+        "UPDATE embeddings SET weights = x'00' WHERE text_hash = ?", (EmbeddingCache._hash("bad"),)
+    ).connection.commit()
+
+    results = await cache.get_many(["bad", "good"])
+    cache.close()
+
+    assert results == [None, {"b": 2.0}]
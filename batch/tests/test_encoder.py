@@ -0,0 +1,124 @@
+import struct
+import msgpack
+import pytest
+from unittest.mock import MagicMock, patch
+from src.services.encoder import EncoderClient, MSGPACK_MEDIA_TYPE, COMPACT_JSON_MEDIA_TYPE
+
+def _response(content_type: str, json_data=None, content: bytes = b"", version: str = "v1") -> MagicMock:
+    response = MagicMock()
+    response.status_code = 200
+    response.headers = {"content-type": content_type, "X-Vocab-Version": version}
+    response.json.return_value = json_data
+    response.content = content
+    response.raise_for_status = MagicMock()
+    return response
+
+@pytest.mark.anyio
+async def test_should_decode_compact_json_response_with_cached_vocab():
+    """Test decoding id/weight arrays through the encoder's vocab table.
+
+    Arrange: Mock the encoder returning compact JSON and the /vocab table.
+    Act: Call encode twice.
+    Assert: Check feature names are resolved and the vocab is fetched only once.
+    """
+    vocab = _response("application/json", {"version": "v1", "features": ["a", "b", "c"]})
+    encoded = _response(COMPACT_JSON_MEDIA_TYPE, {"ids": [2, 0], "weights": [1.5, 0.25]})
+
+    with patch("httpx.AsyncClient.post", return_value=encoded) as mock_post, \
+         patch("httpx.AsyncClient.get", return_value=vocab) as mock_get:
+        client = EncoderClient(base_url="http://encoder", wire_format="compact")
+        first = await client.encode("text")
+        second = await client.encode("text")
+
+    assert first == second == {"c": 1.5, "a": 0.25}
+    assert mock_post.call_args.kwargs["headers"] == {"Accept": COMPACT_JSON_MEDIA_TYPE}
+    mock_get.assert_called_once()
+
+@pytest.mark.anyio
+async def test_should_decode_msgpack_batch_response():
+    """Test decoding a msgpack /encode_batch body with raw id/weight buffers.
+
+    Arrange: Mock the encoder returning a msgpack body and the /vocab table.
+    Act: Call encode_batch.
+    Assert: Check each result is decoded in order.
+    """
+    entry = {"ids": struct.pack("<2I", 1, 0), "weights": struct.pack("<2e", 0.5, 2.0)}
+    body = msgpack.packb({"results": [entry, {"ids": b"", "weights": b""}]})
+    vocab = _response("application/json", {"version": "v1", "features": ["a", "b"]})
+    encoded = _response(MSGPACK_MEDIA_TYPE, content=body)
+
+    with patch("httpx.AsyncClient.post", return_value=encoded), \
+         patch("httpx.AsyncClient.get", return_value=vocab):
+        client = EncoderClient(base_url="http://encoder", wire_format="msgpack")
+        results = await client.encode_batch(["x", "y"])
+
+    assert results == [{"b": 0.5, "a": 2.0}, {}]
+
+@pytest.mark.anyio
+async def test_should_refetch_vocab_when_version_changes():
+    """Test that a new vocab version from the encoder invalidates the cached table.
+
+    Arrange: Mock two encoder responses reporting different vocab versions.
+    Act: Call encode twice.
+    Assert: Check /vocab is fetched again and the new table is used.
+    """
+    vocabs = [
+        _response("application/json", {"version": "v1", "features": ["old"]}),
+        _response("application/json", {"version": "v2", "features": ["new"]}),
+    ]
+    encoded = [
+        _response(COMPACT_JSON_MEDIA_TYPE, {"ids": [0], "weights": [1.0]}, version="v1"),
+        _response(COMPACT_JSON_MEDIA_TYPE, {"ids": [0], "weights": [1.0]}, version="v2"),
+    ]
+
+    with patch("httpx.AsyncClient.post", side_effect=encoded), \
+         patch("httpx.AsyncClient.get", side_effect=vocabs) as mock_get:
+        client = EncoderClient(base_url="http://encoder", wire_format="compact")
+        first = await client.encode("text")
+        second = await client.encode("text")
+
+    assert first == {"old": 1.0}
+    assert second == {"new": 1.0}
+    assert mock_get.call_count == 2
+
+@pytest.mark.anyio
+async def test_should_decode_with_the_vocab_of_the_replica_that_answered(monkeypatch):
+    """Test balancing over replicas that serve different vocab versions.
+
+    Arrange: Two replicas mid-reload, one on vocab v1 and one on v2.
+    Act: Call encode once per replica.
+    Assert: Check each response is decoded with its own replica's vocab.
+    """
+    from src.core.config import settings
+    monkeypatch.setattr(settings, "ENCODER_SERVICE_URLS", "http://old,http://new")
+    versions = {"http://old": ("v1", ["old"]), "http://new": ("v2", ["new"])}
+
+    def post(url, **kwargs):
+        version = versions[url.rsplit("/", 1)[0]][0]
+        return _response(COMPACT_JSON_MEDIA_TYPE, {"ids": [0], "weights": [1.0]}, version=version)
+
+    def get(url, **kwargs):
+        version, features = versions[url.rsplit("/", 1)[0]]
+        return _response("application/json", {"version": version, "features": features})
+
+    with patch("httpx.AsyncClient.post", side_effect=post), patch("httpx.AsyncClient.get", side_effect=get):
+        client = EncoderClient(wire_format="compact")
+        results = [await client.encode("text") for _ in range(2)]
+
+    assert sorted(results, key=str) == [{"new": 1.0}, {"old": 1.0}]
+
+@pytest.mark.anyio
+async def test_should_key_caches_on_the_model_and_pruning_the_encoder_reports():
+    """Test EncoderClient.model_key.
+
+    Arrange: Mock the encoder's /info response.
+    Act: Call model_key.
+    Assert: Check the key includes the model, vocab version and pruning settings.
+    """
+    info = _response("application/json", {"model_id": "m", "vocab_version": "v2", "top_k": 64, "min_weight": 0.05})
+
+    with patch("httpx.AsyncClient.get", return_value=info) as mock_get:
+        key = await EncoderClient(base_url="http://encoder").model_key()
+
+    assert key == "m@v2:top_k=64:min_weight=0.05"
+    assert mock_get.call_args.args == ("http://encoder/info",)
@@ -0,0 +1,39 @@
+import pytest
+from src.core import http
+from src.core.config import settings
+
+@pytest.mark.anyio
+async def test_should_reuse_one_client_per_upstream():
+    """Test that services share a long-lived client per upstream.
+
+    Arrange: Start with no shared clients.
+    Act: Request the cosense and encoder clients twice each.
+    Assert: Check each upstream gets a single instance with its own timeout.
+    """
+    await http.close_http_clients()
+
+    cosense = http.get_http_client("cosense")
+    encoder = http.get_http_client("encoder")
+
+    assert http.get_http_client("cosense") is cosense
+    assert http.get_http_client("encoder") is encoder
+    assert cosense is not encoder
+    assert cosense.timeout.read == settings.COSENSE_TIMEOUT
+    assert encoder.timeout.read == settings.ENCODER_TIMEOUT
+    await http.close_http_clients()
+
+@pytest.mark.anyio
+async def test_should_close_clients_and_recreate_on_next_use():
+    """Test shutdown of the shared clients.
+
+    Arrange: Create a shared client.
+    Act: Close all clients and request it again.
+    Assert: Check the old client is closed and a fresh one is returned.
+    """
+    client = http.get_http_client("encoder")
+
+    await http.close_http_clients()
+
+    assert client.is_closed
+    assert http.get_http_client("encoder") is not client
+    await http.close_http_clients()
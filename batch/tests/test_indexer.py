@@ -1,12 +1,42 @@
+import asyncio
 import pytest
+import httpx
 from unittest.mock import AsyncMock, patch, MagicMock
 from src.services.indexer import IndexerService
 from src.services.cosense import CosenseClient
+from src.core.config import settings
+
+def _fake_streaming_bulk(sent):
+    """Builds a stand-in for async_streaming_bulk that records the actions it receives."""
+    async def fake(es, actions, **kwargs):
+        for action in actions:
+            sent.append(action)
+            yield True, {"index": {"_id": action.get("_id"), "status": 201}}
+    return fake
+
+def _mock_ingest_settings(mock_es):
+    mock_es.indices.put_settings = AsyncMock()
+    mock_es.indices.refresh = AsyncMock()
+    mock_es.update = AsyncMock()
+
+@pytest.fixture(autouse=True)
+def stored_states(monkeypatch):
+    """Page states returned by the sync state index; empty unless a test adds some."""
+    states = []
+
+    async def fake_scan(es, index, query):
+        for state in states:
+            yield {"_source": state}
+
+    monkeypatch.setattr("src.services.state.async_scan", fake_scan)
+    return states
 
 @pytest.fixture
 def mock_cosense_client():
     client = MagicMock(spec=CosenseClient)
     client.get_page_content = AsyncMock()
+    # Pages missing from the listing are gone unless a test says otherwise
+    client.page_exists = AsyncMock(return_value=False)
     return client
 
 @pytest.mark.anyio
@@ -15,7 +45,7 @@ async def test_should_create_index_if_not_exists_successfully():
     
     Arrange: Mock AsyncElasticsearch to return index not exists.
     Act: Call create_index_if_not_exists.
-    Assert: Check indices.create is called with the expected body.
+    Assert: Check a versioned index is created behind the cosense_pages alias.
     """
     with patch("src.services.indexer.AsyncElasticsearch") as mock_es_class:
         mock_es = mock_es_class.return_value
@@ -28,8 +58,9 @@ async def test_should_create_index_if_not_exists_successfully():
         mock_es.indices.exists.assert_called_once_with(index="cosense_pages")
         mock_es.indices.create.assert_called_once()
         args, kwargs = mock_es.indices.create.call_args
-        assert kwargs["index"] == "cosense_pages"
+        assert service._is_versioned_index(kwargs["index"])
         assert "mappings" in kwargs["body"]
+        assert kwargs["body"]["aliases"] == {"cosense_pages": {}}
 
 @pytest.mark.anyio
 async def test_should_get_sparse_embeddings_via_encoder_service_successfully():
@@ -65,24 +96,27 @@ async def test_should_sync_pages_into_elasticsearch_successfully(mock_cosense_cl
     """
     mock_pages = [{"title": "Page 1"}]
     mock_cosense_client.get_page_content.return_value = "Sample content for testing the synchronization."
+    sent = []
     
     with patch("src.services.indexer.AsyncElasticsearch") as mock_es_class, \
-         patch("src.services.indexer.IndexerService.get_sparse_embeddings") as mock_get_sparse:
+         patch("src.services.indexer.IndexerService.get_sparse_embeddings_batch") as mock_get_sparse, \
+         patch("src.services.bulk.async_streaming_bulk", _fake_streaming_bulk(sent)):
         
         mock_es = mock_es_class.return_value
         mock_es.indices.exists = AsyncMock(return_value=True)
-        mock_get_sparse.return_value = {"123": 0.5}
-        mock_es.index = AsyncMock()
+        _mock_ingest_settings(mock_es)
+        mock_get_sparse.return_value = [{"123": 0.5}]
         
         service = IndexerService()
-        await service.sync_pages(mock_pages, mock_cosense_client)
+        stats = await service.sync_pages(mock_pages, mock_cosense_client)
         
         mock_cosense_client.get_page_content.assert_called_once_with("Page 1")
         mock_get_sparse.assert_called()
-        mock_es.index.assert_called()
-        args, kwargs = mock_es.index.call_args
-        assert kwargs["index"] == "cosense_pages"
-        assert kwargs["document"]["metadata"]["title"] == "Page 1"
+        chunks = [a for a in sent if a["_index"] == "cosense_pages"]
+        assert len(chunks) == 1
+        assert chunks[0]["_id"] == f"{settings.COSENSE_PROJECT_NAME}:Page 1:0"
+        assert chunks[0]["_source"]["metadata"]["title"] == "Page 1"
+        assert stats.chunks_indexed == 1
 
 @pytest.mark.anyio
 async def test_should_handle_sync_failure_gracefully(mock_cosense_client):
@@ -98,6 +132,7 @@ async def test_should_handle_sync_failure_gracefully(mock_cosense_client):
     with patch("src.services.indexer.AsyncElasticsearch") as mock_es_class:
         mock_es = mock_es_class.return_value
         mock_es.indices.exists = AsyncMock(return_value=True)
+        _mock_ingest_settings(mock_es)
         
         service = IndexerService()
         # Should not raise exception
@@ -121,3 +156,558 @@ async def test_should_close_elasticsearch_connection_successfully():
         await service.close()
         
         mock_es.close.assert_called_once()
+
+@pytest.mark.anyio
+async def test_should_overlap_page_fetches_across_pipeline_workers(mock_cosense_client, monkeypatch):
+    """Test that the fetch stage processes several pages concurrently.
+
+    Arrange: Mock a slow Cosense fetch and allow 4 fetch workers.
+    Act: Call sync_pages with 4 pages.
+    Assert: Check all pages are indexed and fetches overlapped in time.
+    """
+    from src.core.config import settings
+    monkeypatch.setattr(settings, "FETCH_CONCURRENCY", 4)
+    in_flight = 0
+    peak = 0
+
+    async def slow_fetch(title):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        return f"content of {title}"
+
+    mock_cosense_client.get_page_content.side_effect = slow_fetch
+    mock_pages = [{"title": f"Page {i}"} for i in range(4)]
+    sent = []
+
+    with patch("src.services.indexer.AsyncElasticsearch") as mock_es_class, \
+         patch("src.services.indexer.IndexerService.get_sparse_embeddings_batch") as mock_get_sparse, \
+         patch("src.services.bulk.async_streaming_bulk", _fake_streaming_bulk(sent)):
+        mock_es = mock_es_class.return_value
+        mock_es.indices.exists = AsyncMock(return_value=True)
+        _mock_ingest_settings(mock_es)
+        mock_get_sparse.side_effect = lambda texts: [{"1": 0.5} for _ in texts]
+
+        service = IndexerService()
+        stats = await service.sync_pages(mock_pages, mock_cosense_client)
+
+    assert peak == 4
+    assert stats.pages_synced == 4
+    assert stats.pages_failed == 0
+    indexed_titles = {a["_source"]["metadata"]["title"] for a in sent if a["_index"] == "cosense_pages"}
+    assert indexed_titles == {f"Page {i}" for i in range(4)}
+
+@pytest.mark.anyio
+async def test_should_disable_refresh_during_ingest_and_restore_it_afterwards(mock_cosense_client, monkeypatch):
+    """Test that ingest-time index settings are applied and then restored.
+
+    Arrange: Configure a 1s refresh interval and 1 replica; the index still
+        has refresh off and no replicas from a killed run.
+    Act: Call sync_pages.
+    Assert: Check refresh/replicas are turned off, reset to the configured
+        values rather than the index's, and the index refreshed.
+    """
+    monkeypatch.setattr(settings, "INDEX_REFRESH_INTERVAL", "1s")
+    monkeypatch.setattr(settings, "INDEX_NUMBER_OF_REPLICAS", 1)
+    mock_cosense_client.get_page_content.return_value = "content"
+
+    with patch("src.services.indexer.AsyncElasticsearch") as mock_es_class, \
+         patch("src.services.indexer.IndexerService.get_sparse_embeddings_batch", return_value=[{"1": 1.0}]), \
+         patch("src.services.bulk.async_streaming_bulk", _fake_streaming_bulk([])):
+        mock_es = mock_es_class.return_value
+        mock_es.indices.exists = AsyncMock(return_value=True)
+        _mock_ingest_settings(mock_es)
+        mock_es.indices.get_settings = AsyncMock(return_value={
+            "cosense_pages-1": {"settings": {"index.refresh_interval": "-1", "index.number_of_replicas": "0"}}
+        })
+
+        service = IndexerService()
+        await service.sync_pages([{"title": "Page"}], mock_cosense_client)
+
+    first, last = mock_es.indices.put_settings.call_args_list
+    assert first.kwargs["settings"] == {"index.refresh_interval": "-1", "index.number_of_replicas": 0}
+    assert last.kwargs["settings"] == {"index.refresh_interval": "1s", "index.number_of_replicas": 1}
+    mock_es.indices.refresh.assert_called_once_with(index="cosense_pages")
+
+@pytest.mark.anyio
+async def test_should_skip_unchanged_pages_and_delete_removed_ones(mock_cosense_client, stored_states):
+    """Test incremental sync decisions against stored page state.
+
+    Arrange: Store state for an unchanged page, a touched-but-identical page,
+        a changed page that shrank, and a page removed upstream.
+    Act: Call sync_pages in incremental mode.
+    Assert: Check only the changed page is re-indexed with deterministic ids,
+        stale chunks and removed pages are deleted.
+    """
+    from src.core.config import settings
+    from src.services.state import content_hash
+    project = settings.COSENSE_PROJECT_NAME
+    stored_states.extend([
+        {"title": "Same", "updated": 100, "content_hash": "h", "chunk_count": 1},
+        {"title": "Touched", "updated": 100, "content_hash": content_hash("touched"), "chunk_count": 1},
+        {"title": "Changed", "updated": 100, "content_hash": "old", "chunk_count": 3},
+        {"title": "Gone", "updated": 100, "content_hash": "h", "chunk_count": 2},
+    ])
+    mock_pages = [
+        {"title": "Same", "updated": 100},
+        {"title": "Touched", "updated": 200},
+        {"title": "Changed", "updated": 200},
+    ]
+    mock_cosense_client.get_page_content.side_effect = lambda title: title.lower()
+    sent = []
+
+    with patch("src.services.indexer.AsyncElasticsearch") as mock_es_class, \
+         patch("src.services.indexer.IndexerService.get_sparse_embeddings_batch") as mock_get_sparse, \
+         patch("src.services.bulk.async_streaming_bulk", _fake_streaming_bulk(sent)):
+        mock_es = mock_es_class.return_value
+        mock_es.indices.exists = AsyncMock(return_value=True)
+        _mock_ingest_settings(mock_es)
+        mock_get_sparse.side_effect = lambda texts: [{"1": 0.5} for _ in texts]
+
+        service = IndexerService()
+        stats = await service.sync_pages(mock_pages, mock_cosense_client)
+
+    fetched = {c.args[0] for c in mock_cosense_client.get_page_content.call_args_list}
+    assert fetched == {"Touched", "Changed"}
+    mock_get_sparse.assert_called_once_with(["changed"])
+
+    chunk_ops = {(a["_op_type"], a["_id"]) for a in sent if a["_index"] == "cosense_pages"}
+    assert chunk_ops == {
+        ("index", f"{project}:Changed:0"),
+        ("delete", f"{project}:Changed:1"),
+        ("delete", f"{project}:Changed:2"),
+        ("delete", f"{project}:Gone:0"),
+        ("delete", f"{project}:Gone:1"),
+    }
+    state_ops = {(a["_op_type"], a["_id"]) for a in sent if a["_index"] == "cosense_sync_state"}
+    assert state_ops == {
+        ("index", f"{project}:Touched"),
+        ("index", f"{project}:Changed"),
+        ("delete", f"{project}:Gone"),
+    }
+    assert (stats.pages_synced, stats.pages_unchanged, stats.pages_deleted) == (1, 2, 1)
+    mock_es.update.assert_awaited_once()
+    assert mock_es.update.call_args.kwargs["index"] == settings.INDEX_META_INDEX
+    assert mock_es.update.call_args.kwargs["upsert"]["generation"] == 1
+
+@pytest.mark.anyio
+async def test_should_reprocess_every_page_in_full_mode(mock_cosense_client, stored_states):
+    """Test that full mode ignores stored timestamps and hashes.
+
+    Arrange: Store state matching the page exactly.
+    Act: Call sync_pages with full=True.
+    Assert: Check the page is fetched and re-indexed anyway.
+    """
+    from src.services.state import content_hash
+    stored_states.append({"title": "Same", "updated": 100, "content_hash": content_hash("same"), "chunk_count": 1})
+    mock_cosense_client.get_page_content.return_value = "same"
+
+    with patch("src.services.indexer.AsyncElasticsearch") as mock_es_class, \
+         patch("src.services.indexer.IndexerService.get_sparse_embeddings_batch", return_value=[{"1": 1.0}]), \
+         patch("src.services.bulk.async_streaming_bulk", _fake_streaming_bulk([])):
+        mock_es = mock_es_class.return_value
+        mock_es.indices.exists = AsyncMock(return_value=True)
+        _mock_ingest_settings(mock_es)
+
+        service = IndexerService()
+        stats = await service.sync_pages([{"title": "Same", "updated": 100}], mock_cosense_client, full=True)
+
+    assert stats.pages_synced == 1
+    assert stats.pages_unchanged == 0
+
+@pytest.mark.anyio
+async def test_should_forget_state_of_pages_with_rejected_chunks(mock_cosense_client):
+    """Test that a page whose chunk was rejected by ES is retried next run.
+
+    Arrange: Make the bulk helper reject the page's chunk.
+    Act: Call sync_pages.
+    Assert: Check the page's state document is deleted and the failure counted.
+    """
+    chunk_id = f"{settings.COSENSE_PROJECT_NAME}:Page:0"
+
+    async def failing_bulk(es, actions, **kwargs):
+        for action in actions:
+            ok = action.get("_id") != chunk_id
+            yield ok, {action["_op_type"]: {"_id": action.get("_id"), "status": 201 if ok else 400}}
+
+    mock_cosense_client.get_page_content.return_value = "content"
+    with patch("src.services.indexer.AsyncElasticsearch") as mock_es_class, \
+         patch("src.services.indexer.IndexerService.get_sparse_embeddings_batch", return_value=[{"1": 1.0}]), \
+         patch("src.services.bulk.async_streaming_bulk", failing_bulk):
+        mock_es = mock_es_class.return_value
+        mock_es.indices.exists = AsyncMock(return_value=True)
+        _mock_ingest_settings(mock_es)
+        mock_delete = AsyncMock()
+        mock_es.options.return_value.delete = mock_delete
+
+        service = IndexerService()
+        stats = await service.sync_pages([{"title": "Page"}], mock_cosense_client)
+
+    mock_delete.assert_called_once_with(index="cosense_sync_state", id=f"{settings.COSENSE_PROJECT_NAME}:Page")
+    assert stats.chunks_failed == 1
+    assert stats.chunks_indexed == 0
+
+@pytest.mark.anyio
+async def test_should_retry_deferred_page_fetches_after_the_stream_is_drained(mock_cosense_client):
+    """Test that pages whose fetch exhausted its retries are fetched again at the end.
+
+    Arrange: Make the first fetch of one page fail with CosenseUnavailableError.
+    Act: Call sync_pages.
+    Assert: Check the page is fetched again after the others and ends up synced.
+    """
+    from src.services.cosense import CosenseUnavailableError
+    calls = []
+
+    async def flaky_fetch(title):
+        calls.append(title)
+        if title == "Flaky" and calls.count("Flaky") == 1:
+            raise CosenseUnavailableError("429")
+        return "content"
+
+    mock_cosense_client.get_page_content.side_effect = flaky_fetch
+    mock_pages = [{"title": "Flaky"}, {"title": "Stable"}]
+
+    with patch("src.services.indexer.AsyncElasticsearch") as mock_es_class, \
+         patch("src.services.indexer.IndexerService.get_sparse_embeddings_batch") as mock_get_sparse, \
+         patch("src.services.bulk.async_streaming_bulk", _fake_streaming_bulk([])):
+        mock_es = mock_es_class.return_value
+        mock_es.indices.exists = AsyncMock(return_value=True)
+        _mock_ingest_settings(mock_es)
+        mock_get_sparse.side_effect = lambda texts: [{"1": 0.5} for _ in texts]
+
+        service = IndexerService()
+        stats = await service.sync_pages(mock_pages, mock_cosense_client)
+
+    assert calls[-1] == "Flaky"
+    assert calls.count("Flaky") == 2
+    assert (stats.pages_synced, stats.pages_retried, stats.pages_failed) == (2, 1, 0)
+
+@pytest.mark.anyio
+async def test_should_prune_chunk_vectors_at_index_time(mock_cosense_client, monkeypatch):
+    """Test that DOC_* settings shrink the stored vectors.
+
+    Arrange: Keep at most 2 terms per chunk and mock a 3-term encoder output.
+    Act: Call sync_pages for one page.
+    Assert: Check the indexed vector holds the 2 heaviest terms and the
+        run statistics count the dropped term.
+    """
+    monkeypatch.setattr(settings, "DOC_MAX_TERMS", 2)
+    mock_cosense_client.get_page_content.return_value = "content"
+    sent = []
+
+    with patch("src.services.indexer.AsyncElasticsearch") as mock_es_class, \
+         patch("src.services.indexer.IndexerService.get_sparse_embeddings_batch") as mock_get_sparse, \
+         patch("src.services.bulk.async_streaming_bulk", _fake_streaming_bulk(sent)):
+        mock_es = mock_es_class.return_value
+        mock_es.indices.exists = AsyncMock(return_value=True)
+        _mock_ingest_settings(mock_es)
+        mock_es.indices.stats = AsyncMock(return_value={
+            "indices": {"cosense_pages": {"primaries": {"store": {"size_in_bytes": 2048}}}}
+        })
+        mock_get_sparse.side_effect = lambda texts: [{"a": 2.0, "b": 1.0, "c": 0.1} for _ in texts]
+
+        service = IndexerService()
+        stats = await service.sync_pages([{"title": "Page"}], mock_cosense_client)
+
+    chunk = next(a for a in sent if a["_index"] == "cosense_pages")
+    assert chunk["_source"]["sparse_vector"] == {"a": 2.0, "b": 1.0}
+    assert (stats.vectors.terms_in, stats.vectors.terms_kept) == (3, 2)
+    assert stats.index_size_bytes == 2048
+
+def _mock_rebuild(mock_es, aliased=False, generations=None):
+    """Mocks the index maintenance calls of a rebuild."""
+    _mock_ingest_settings(mock_es)
+    mock_es.options.return_value = mock_es
+    mock_es.indices.exists = AsyncMock(return_value=True)
+    mock_es.indices.exists_alias = AsyncMock(return_value=aliased)
+    mock_es.indices.create = AsyncMock()
+    mock_es.indices.delete = AsyncMock()
+    mock_es.indices.forcemerge = AsyncMock()
+    mock_es.indices.update_aliases = AsyncMock()
+    mock_es.indices.get_alias = AsyncMock(return_value=generations or {})
+    mock_es.indices.stats = AsyncMock(return_value={"indices": {}})
+    mock_es.cluster.health = AsyncMock()
+    mock_es.search = AsyncMock(return_value={"hits": {"hits": [
+        {"_source": {"text": "content", "sparse_vector": {"a": 1.0}}}
+    ]}})
+
+@pytest.mark.anyio
+async def test_should_rebuild_into_a_new_index_and_swap_the_alias(mock_cosense_client, stored_states):
+    """Test the full-rebuild mode end to end.
+
+    Arrange: Store state for a page removed upstream, keep a plain legacy
+        index under the alias name and two older versioned indices.
+    Act: Call sync_pages with rebuild.
+    Assert: Check chunks go to the new index, which is force-merged, warmed
+        up and swapped in atomically; page state is written only after the
+        swap and only the oldest generation is deleted.
+    """
+    stored_states.append({"title": "Gone", "updated": 100, "content_hash": "h", "chunk_count": 2})
+    mock_cosense_client.get_page_content.return_value = "content"
+    sent = []
+    swapped_at = []
+
+    with patch("src.services.indexer.AsyncElasticsearch") as mock_es_class, \
+         patch("src.services.indexer.IndexerService.get_sparse_embeddings_batch", return_value=[{"a": 1.0}]), \
+         patch("src.services.bulk.async_streaming_bulk", _fake_streaming_bulk(sent)):
+        mock_es = mock_es_class.return_value
+        _mock_rebuild(mock_es, generations={
+            "cosense_pages-20240101000000000": {"aliases": {}},
+            "cosense_pages-20250101000000000": {"aliases": {}},
+        })
+        mock_es.indices.update_aliases.side_effect = lambda actions: swapped_at.append(len(sent))
+
+        service = IndexerService()
+        stats = await service.sync_pages([{"title": "Page", "updated": 200}], mock_cosense_client, rebuild=True)
+
+    new_index = mock_es.indices.create.call_args.kwargs["index"]
+    assert service._is_versioned_index(new_index)
+    assert "aliases" not in mock_es.indices.create.call_args.kwargs["body"]
+    assert {(a["_op_type"], a["_index"]) for a in sent[:swapped_at[0]]} == {("index", new_index)}
+    assert {(a["_op_type"], a["_id"]) for a in sent[swapped_at[0]:]} == {
+        ("index", f"{settings.COSENSE_PROJECT_NAME}:Page"),
+        ("delete", f"{settings.COSENSE_PROJECT_NAME}:Gone"),
+    }
+    mock_es.indices.forcemerge.assert_awaited_once_with(index=new_index, max_num_segments=1)
+    assert mock_es.search.await_count == 3
+    mock_es.indices.update_aliases.assert_awaited_once_with(actions=[
+        {"remove_index": {"index": "cosense_pages"}},
+        {"add": {"index": new_index, "alias": "cosense_pages"}},
+    ])
+    assert mock_es.update.call_args.kwargs["upsert"]["index"] == new_index
+    mock_es.indices.delete.assert_awaited_once_with(index="cosense_pages-20240101000000000")
+    assert (stats.pages_synced, stats.pages_deleted) == (1, 1)
+
+@pytest.mark.anyio
+async def test_should_discard_the_rebuilt_index_when_too_many_pages_fail(mock_cosense_client):
+    """Test that a failed rebuild keeps the live index.
+
+    Arrange: Make the fetch of one of two pages fail.
+    Act: Call sync_pages with rebuild.
+    Assert: Check RebuildAbortedError is raised, the new index is deleted and
+        neither the alias nor the page state is touched.
+    """
+    from src.services.indexer import RebuildAbortedError
+    mock_cosense_client.get_page_content.side_effect = lambda title: "content" if title == "Ok" else 1 / 0
+    sent = []
+
+    with patch("src.services.indexer.AsyncElasticsearch") as mock_es_class, \
+         patch("src.services.indexer.IndexerService.get_sparse_embeddings_batch", return_value=[{"a": 1.0}]), \
+         patch("src.services.bulk.async_streaming_bulk", _fake_streaming_bulk(sent)):
+        mock_es = mock_es_class.return_value
+        _mock_rebuild(mock_es, aliased=True)
+
+        service = IndexerService()
+        with pytest.raises(RebuildAbortedError):
+            await service.sync_pages([{"title": "Ok"}, {"title": "Broken"}], mock_cosense_client, rebuild=True)
+
+    new_index = mock_es.indices.create.call_args.kwargs["index"]
+    mock_es.indices.delete.assert_awaited_once_with(index=new_index)
+    mock_es.indices.update_aliases.assert_not_called()
+    mock_es.update.assert_not_called()
+    assert all(a["_index"] == new_index for a in sent)
+
+@pytest.mark.anyio
+async def test_should_resume_an_interrupted_run_from_the_checkpoint_journal(mock_cosense_client, monkeypatch, tmp_path):
+    """Test checkpointing and --resume.
+
+    Arrange: Journal to a temporary file; let the first run encode only page
+        A, then crash, and journal page C as encoded but not indexed.
+    Act: Call sync_pages again with resume.
+    Assert: Check A is journaled as done and skipped, C is indexed from the
+        journal without fetch or encode, and B is processed normally.
+    """
+    from src.services.checkpoint import CheckpointJournal, DONE, IN_FLIGHT
+    path = str(tmp_path / "checkpoint.sqlite")
+    monkeypatch.setattr(settings, "CHECKPOINT_PATH", path)
+    pages = [{"title": "A", "updated": 1}, {"title": "B", "updated": 1}, {"title": "C", "updated": 1}]
+    mock_cosense_client.get_page_content.side_effect = lambda title: title.lower()
+
+    def encode(texts):
+        if texts == ["b"]:
+            raise RuntimeError("encoder down")
+        return [{"t": 1.0} for _ in texts]
+
+    sent = []
+    with patch("src.services.indexer.AsyncElasticsearch") as mock_es_class, \
+         patch("src.services.indexer.IndexerService.get_sparse_embeddings_batch", side_effect=encode) as mock_encode, \
+         patch("src.services.bulk.async_streaming_bulk", _fake_streaming_bulk(sent)):
+        mock_es = mock_es_class.return_value
+        mock_es.indices.exists = AsyncMock(return_value=True)
+        _mock_ingest_settings(mock_es)
+
+        service = IndexerService()
+        with patch.object(service, "_delete_removed_pages", side_effect=RuntimeError("killed")):
+            with pytest.raises(RuntimeError):
+                await service.sync_pages(pages[:2], mock_cosense_client)
+
+        journal = CheckpointJournal(path)
+        interrupted = await journal.pages()
+        await journal.save_encoded("C", 1, "hash-c", ["stored chunk"], [{"s": 2.0}])
+        journal.close()
+
+        mock_cosense_client.get_page_content.reset_mock()
+        mock_encode.reset_mock(side_effect=True)
+        mock_encode.side_effect = lambda texts: [{"t": 1.0} for _ in texts]
+        sent.clear()
+        stats = await service.sync_pages(pages, mock_cosense_client, resume=True)
+
+    assert {title: page.status for title, page in interrupted.items()} == {"A": DONE, "B": IN_FLIGHT}
+    assert [c.args[0] for c in mock_cosense_client.get_page_content.call_args_list] == ["B"]
+    mock_encode.assert_called_once_with(["b"])
+    chunk_texts = {a["_source"]["text"] for a in sent if a["_index"] == "cosense_pages"}
+    assert chunk_texts == {"b", "stored chunk"}
+    assert (stats.pages_resumed, stats.pages_synced) == (2, 2)
+
+    journal = CheckpointJournal(path)
+    assert (await journal.meta())["status"] == "finished"
+    journal.close()
+
+@pytest.mark.anyio
+async def test_should_only_encode_chunks_missing_from_the_embedding_cache(monkeypatch, tmp_path):
+    """Test that cached chunk vectors skip the encoder.
+
+    Arrange: Enable the embedding cache and mock the encoder client.
+    Act: Embed two texts, then the same texts plus a new one.
+    Assert: Check the second call only sends the new text and returns
+        vectors in the original order.
+    """
+    monkeypatch.setattr(settings, "EMBEDDING_CACHE_PATH", str(tmp_path / "embeddings.sqlite"))
+    with patch("src.services.indexer.AsyncElasticsearch"):
+        service = IndexerService()
+    service.encoder.model_key = AsyncMock(return_value="m@v1")
+    service.encoder.encode_batch = AsyncMock(side_effect=lambda texts: [{t: 1.0} for t in texts])
+    await service._open_embedding_cache()
+
+    await service.get_sparse_embeddings_batch(["a", "b"])
+    vectors = await service.get_sparse_embeddings_batch(["b", "c", "a"])
+    service.embedding_cache.close()
+
+    assert service.encoder.encode_batch.call_args_list[-1].args == (["c"],)
+    assert vectors == [{"b": 1.0}, {"c": 1.0}, {"a": 1.0}]
+    assert (service.embedding_cache.stats.hits, service.embedding_cache.stats.misses) == (2, 3)
+
+@pytest.mark.anyio
+async def test_should_not_reuse_cached_vectors_after_the_encoder_model_changes(monkeypatch, tmp_path):
+    """Test that the embedding cache is keyed on what the encoder reports.
+
+    Arrange: Cache a vector while the encoder reports one model key.
+    Act: Open the cache again while it reports another key, then while it is unreachable.
+    Assert: Check the text is encoded again under the new key and the
+        unreachable encoder leaves the cache disabled.
+    """
+    monkeypatch.setattr(settings, "EMBEDDING_CACHE_PATH", str(tmp_path / "embeddings.sqlite"))
+    services = []
+    for key in ("m@v1:top_k=None:min_weight=0.01", "m@v1:top_k=64:min_weight=0.01"):
+        with patch("src.services.indexer.AsyncElasticsearch"):
+            service = IndexerService()
+        service.encoder.model_key = AsyncMock(return_value=key)
+        service.encoder.encode_batch = AsyncMock(side_effect=lambda texts: [{t: 1.0} for t in texts])
+        await service._open_embedding_cache()
+        await service.get_sparse_embeddings_batch(["a"])
+        service.embedding_cache.close()
+        services.append(service)
+    with patch("src.services.indexer.AsyncElasticsearch"):
+        offline = IndexerService()
+    offline.encoder.model_key = AsyncMock(side_effect=httpx.ConnectError("refused"))
+    await offline._open_embedding_cache()
+
+    assert [s.encoder.encode_batch.await_count for s in services] == [1, 1]
+    assert offline.embedding_cache is None
+
+@pytest.mark.anyio
+async def test_should_only_sync_and_delete_pages_of_its_own_shard(mock_cosense_client, stored_states):
+    """Test sync_pages with a shard.
+
+    Arrange: Store state for removed pages of both shards and list pages of
+        both shards.
+    Act: Call sync_pages as shard 0/2.
+    Assert: Check only the shard's pages are fetched and deleted, and the
+        index settings are left alone.
+    """
+    from src.services.shard import Shard
+    shard = Shard(0, 2)
+    titles = [f"page {i}" for i in range(20)]
+    own = {title for title in titles if shard.owns(title)}
+    stored_states.extend(
+        {"title": f"gone {i}", "updated": 1, "content_hash": "h", "chunk_count": 1} for i in range(10)
+    )
+    own_gone = {f"gone {i}" for i in range(10) if shard.owns(f"gone {i}")}
+    mock_cosense_client.get_page_content.side_effect = lambda title: title
+    sent = []
+
+    with patch("src.services.indexer.AsyncElasticsearch") as mock_es_class, \
+         patch("src.services.indexer.IndexerService.get_sparse_embeddings_batch") as mock_get_sparse, \
+         patch("src.services.bulk.async_streaming_bulk", _fake_streaming_bulk(sent)):
+        mock_es = mock_es_class.return_value
+        mock_es.indices.exists = AsyncMock(return_value=True)
+        _mock_ingest_settings(mock_es)
+        mock_get_sparse.side_effect = lambda texts: [{"1": 0.5} for _ in texts]
+
+        service = IndexerService()
+        stats = await service.sync_pages([{"title": t, "updated": 1} for t in titles], mock_cosense_client, shard=shard)
+
+    assert 0 < len(own) < len(titles)
+    assert {c.args[0] for c in mock_cosense_client.get_page_content.call_args_list} == own
+    deleted = {a["_id"].split(":", 1)[1] for a in sent if a["_op_type"] == "delete" and a["_index"] == "cosense_sync_state"}
+    assert deleted == own_gone
+    assert (stats.pages_listed, stats.pages_synced, stats.pages_deleted) == (len(own), len(own), len(own_gone))
+    mock_es.indices.put_settings.assert_not_called()
+    mock_es.indices.refresh.assert_awaited_once()
+
+@pytest.mark.anyio
+async def test_should_refuse_to_run_a_shard_before_the_index_exists(mock_cosense_client):
+    """Test that shard workers do not create the shared indices.
+
+    Arrange: Mock Elasticsearch without any index.
+    Act: Call sync_pages with a shard.
+    Assert: Check ShardNotReadyError is raised and nothing is created.
+    """
+    from src.services.indexer import ShardNotReadyError
+    from src.services.shard import Shard
+    with patch("src.services.indexer.AsyncElasticsearch") as mock_es_class:
+        mock_es = mock_es_class.return_value
+        mock_es.indices.exists = AsyncMock(return_value=False)
+        mock_es.indices.create = AsyncMock()
+
+        service = IndexerService()
+        with pytest.raises(ShardNotReadyError):
+            await service.sync_pages([], mock_cosense_client, shard=Shard(1, 4))
+
+    mock_es.indices.create.assert_not_called()
+
+@pytest.mark.anyio
+async def test_should_keep_pages_that_exist_but_were_not_listed(mock_cosense_client, stored_states):
+    """Test that deletions are confirmed with Cosense first.
+
+    Arrange: Store state for two unlisted pages, of which only one is really
+        gone; the listing also repeats a page.
+    Act: Call sync_pages.
+    Assert: Check only the confirmed page is deleted and the repeated page
+        is processed once.
+    """
+    project = settings.COSENSE_PROJECT_NAME
+    stored_states.extend([
+        {"title": "Edited", "updated": 1, "content_hash": "h", "chunk_count": 1},
+        {"title": "Gone", "updated": 1, "content_hash": "h", "chunk_count": 1},
+    ])
+    mock_cosense_client.page_exists.side_effect = lambda title: title == "Edited"
+    mock_cosense_client.get_page_content.side_effect = lambda title: title
+    sent = []
+
+    with patch("src.services.indexer.AsyncElasticsearch") as mock_es_class, \
+         patch("src.services.indexer.IndexerService.get_sparse_embeddings_batch") as mock_get_sparse, \
+         patch("src.services.bulk.async_streaming_bulk", _fake_streaming_bulk(sent)):
+        mock_es = mock_es_class.return_value
+        mock_es.indices.exists = AsyncMock(return_value=True)
+        _mock_ingest_settings(mock_es)
+        mock_get_sparse.side_effect = lambda texts: [{"1": 0.5} for _ in texts]
+
+        service = IndexerService()
+        stats = await service.sync_pages([{"title": "New", "updated": 1}] * 2, mock_cosense_client)
+
+    deletes = {a["_id"] for a in sent if a["_op_type"] == "delete"}
+    assert deletes == {f"{project}:Gone:0", f"{project}:Gone"}
+    assert (stats.pages_listed, stats.pages_synced, stats.pages_deleted) == (1, 1, 1)
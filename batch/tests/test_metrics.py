@@ -0,0 +1,25 @@
+from prometheus_client import CollectorRegistry, Counter, Histogram
+from src.core.metrics import summarize
+
+def test_should_summarize_recorded_histograms_and_counters():
+    """Test the end-of-run metrics summary.
+
+    Arrange: Record samples in a histogram and a counter of a fresh registry,
+        and leave another counter untouched.
+    Act: Summarize the registry.
+    Assert: Check one line per recorded series with count, mean and quantiles.
+    """
+    registry = CollectorRegistry()
+    latency = Histogram("batch_test_seconds", "Test latency.", ["stage"], buckets=(0.1, 1.0), registry=registry)
+    errors = Counter("batch_test_errors_total", "Test errors.", ["stage"], registry=registry)
+    Counter("batch_idle_total", "Never incremented.", registry=registry)
+    for value in (0.05, 0.05, 0.5, 0.5):
+        latency.labels(stage="fetch").observe(value)
+    errors.labels(stage="fetch").inc(3)
+
+    lines = summarize(registry)
+
+    assert lines == [
+        "batch_test_seconds{stage=fetch}: n=4 mean=0.275s p50<=0.1s p95<=1.0s",
+        "batch_test_errors_total{stage=fetch}: 3",
+    ]
@@ -0,0 +1,74 @@
+import sys
+import pytest
+from dataclasses import asdict
+from src.services.indexer import SyncStats
+from src.services.shard import Shard, ShardCoordinator, merge_stats
+
+def test_should_parse_shard_specification():
+    """Test Shard.parse.
+
+    Arrange: Valid and invalid i/N strings.
+    Act: Parse them.
+    Assert: Check valid ones give the shard and invalid ones raise ValueError.
+    """
+    assert Shard.parse("2/4") == Shard(2, 4)
+    assert str(Shard.parse(" 0/1 ")) == "0/1"
+    for text in ("4/4", "1/0", "-1/2", "1", "a/b"):
+        with pytest.raises(ValueError):
+            Shard.parse(text)
+
+def test_should_assign_every_title_to_exactly_one_shard():
+    """Test the title partition.
+
+    Arrange: A set of titles, including non-ASCII ones.
+    Act: Ask each of 3 shards whether it owns them.
+    Assert: Check each title has exactly one owner and every shard gets some.
+    """
+    titles = [f"ページ{i}" for i in range(300)]
+    shards = [Shard(i, 3) for i in range(3)]
+
+    owners = [[shard for shard in shards if shard.owns(title)] for title in titles]
+
+    assert all(len(owner) == 1 for owner in owners)
+    assert {owner[0] for owner in owners} == set(shards)
+    assert Shard(1, 3).path("/data/checkpoint.sqlite") == "/data/checkpoint.sqlite.shard-1-of-3"
+
+def test_should_merge_shard_stats():
+    """Test merge_stats.
+
+    Arrange: SyncStats of two shards.
+    Act: Merge their dict forms.
+    Assert: Check counters are summed and the index size is not.
+    """
+    first = SyncStats(pages_listed=3, pages_synced=2, chunks_indexed=5, index_size_bytes=100)
+    first.vectors.terms_in = 10
+    second = SyncStats(pages_listed=4, pages_failed=1, chunks_indexed=1, index_size_bytes=100)
+    second.vectors.terms_in = 5
+
+    merged = merge_stats([asdict(first), asdict(second)])
+
+    assert (merged.pages_listed, merged.pages_synced, merged.pages_failed, merged.chunks_indexed) == (7, 2, 1, 6)
+    assert merged.vectors.terms_in == 15
+    assert merged.index_size_bytes == 100
+
+@pytest.mark.anyio
+async def test_should_run_every_shard_and_merge_their_stats():
+    """Test ShardCoordinator with fake worker processes.
+
+    Arrange: A worker command that writes pages_listed = shard index + 1,
+        and fails for shard 2.
+    Act: Run 3 workers.
+    Assert: Check each shard ran with its flags and only the successful
+        shards' stats are merged.
+    """
+    worker = (
+        "import json, sys; args = sys.argv[1:]; assert args[0] == '--full'; "
+        "index = int(args[args.index('--shard') + 1].split('/')[0]); "
+        "sys.exit(3) if index == 2 else None; "
+        "open(args[args.index('--stats-file') + 1], 'w').write(json.dumps({'pages_listed': index + 1}))"
+    )
+
+    stats, codes = await ShardCoordinator(3, [sys.executable, "-c", worker]).run(["--full"])
+
+    assert codes == [0, 0, 3]
+    assert stats.pages_listed == 3
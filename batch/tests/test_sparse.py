@@ -0,0 +1,43 @@
+import pytest
+from src.services.sparse import DocumentVectorPruner, prune_vector, quantize_vector
+
+def test_should_keep_top_terms_above_the_weight_floor():
+    """Test index-time top-N and weight floor pruning.
+
+    Arrange: Use a vector with an empty token and a light tail.
+    Act: Prune by term count and by minimum weight.
+    Assert: Check the heaviest terms are kept in weight order.
+    """
+    vector = {"a": 3.0, "b": 2.0, "c": 0.5, "": 4.0}
+
+    assert list(prune_vector(vector, max_terms=2)) == ["a", "b"]
+    assert list(prune_vector(vector, min_weight=1.0)) == ["a", "b"]
+    assert prune_vector(vector, min_weight=10.0) == {"a": 3.0}
+
+def test_should_quantize_weights_to_positive_levels():
+    """Test quantization to a fixed number of levels.
+
+    Arrange: Use 4 levels up to weight 2.0 (a step of 0.5).
+    Act: Quantize tiny, in-between, exact and oversized weights.
+    Assert: Check each is rounded up to a level and clamped to the maximum.
+    """
+    quantized = quantize_vector({"tiny": 0.01, "mid": 0.7, "exact": 1.0, "huge": 9.0}, levels=4, max_weight=2.0)
+
+    assert quantized == {"tiny": 0.5, "mid": 1.0, "exact": 1.0, "huge": 2.0}
+
+def test_should_report_size_and_score_retention():
+    """Test the statistics collected by DocumentVectorPruner.
+
+    Arrange: Create a pruner keeping one term per vector.
+    Act: Apply it to a 2-term vector.
+    Assert: Check term counts, kept weight and self-match retention.
+    """
+    pruner = DocumentVectorPruner(max_terms=1)
+
+    stored = pruner.apply({"a": 3.0, "b": 1.0})
+
+    assert stored == {"a": 3.0}
+    assert (pruner.stats.terms_in, pruner.stats.terms_kept) == (2, 1)
+    assert pruner.stats.mass_kept / pruner.stats.mass_in == pytest.approx(0.75)
+    assert pruner.stats.self_score_retained == pytest.approx(9 / 10)
+    assert "1/2 terms" in pruner.stats.summary()
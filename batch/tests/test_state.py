@@ -0,0 +1,43 @@
+from src.services.state import MAX_ID_BYTES, PageState, SyncStateStore, doc_id
+from unittest.mock import MagicMock
+
+def test_should_build_readable_deterministic_ids():
+    """Test that short ids keep the project:title:chunk_id form.
+
+    Arrange: Pick a project, a title and a chunk id.
+    Act: Call doc_id twice.
+    Assert: Check both calls give the same readable id.
+    """
+    assert doc_id("proj", "Title", 3) == "proj:Title:3"
+    assert doc_id("proj", "Title", 3) == doc_id("proj", "Title", 3)
+
+def test_should_hash_ids_that_exceed_the_elasticsearch_limit():
+    """Test that overly long titles fall back to a hashed id.
+
+    Arrange: Build a title longer than the id limit.
+    Act: Call doc_id.
+    Assert: Check the id is a fixed-length hash and stays deterministic.
+    """
+    title = "長" * MAX_ID_BYTES
+    assert len(doc_id("proj", title, 0)) == 64
+    assert doc_id("proj", title, 0) == doc_id("proj", title, 0)
+    assert doc_id("proj", title, 0) != doc_id("proj", title, 1)
+
+def test_should_build_state_actions_for_the_project():
+    """Test the bulk actions that record and forget page state.
+
+    Arrange: Create a store for a fixed project and index.
+    Act: Build save and delete actions.
+    Assert: Check ids and sources.
+    """
+    store = SyncStateStore(MagicMock(), index_name="state", project="proj")
+    state = PageState(title="Page", updated=10, content_hash="abc", chunk_count=2)
+
+    save = store.save_action(state)
+    delete = store.delete_action("Page")
+
+    assert save["_id"] == delete["_id"] == "proj:Page"
+    assert save["_source"] == {
+        "project": "proj", "title": "Page", "updated": 10, "content_hash": "abc", "chunk_count": 2
+    }
+    assert delete["_op_type"] == "delete"
@@ -0,0 +1,111 @@
+"""Latency percentiles of ``ChatService.process_query`` against local stubs.
+
+Elasticsearch, the encoder and Ollama are stdlib HTTP servers on
+localhost. "cold" queries are all distinct, so every stage runs; "warm"
+queries repeat a small set, so the query-vector and retrieval caches
+answer encoding and search. Ollama's cost is modelled with a first-token
+delay plus a fixed generation speed.
+
+Run from the backend directory:
+    uv run python ../benchmarks/bench_chat.py --queries 200 --output ../benchmarks/results/chat.json
+"""
+import argparse
+import asyncio
+import logging
+import random
+import sys
+import time
+from typing import Any, List
+
+from common import percentiles, use_service, write_results
+import corpus
+import stubs
+
+use_service("backend")
+
+def search_hits(n_hits: int, seed: int) -> List[dict]:
+    rng = random.Random(seed)
+    hits = []
+    for i in range(n_hits):
+        title = f"{rng.choice(corpus.NOUNS)}{rng.choice(corpus.KATAKANA)} {i // 2}"
+        hits.append({
+            "_index": "cosense_pages",
+            "_id": f"bench:{title}:{i % 2}",
+            "_score": round(10.0 - i * 0.5, 3),
+            "_source": {"text": corpus.text(rng, 900), "metadata": {"title": title, "chunk_id": i % 2}}
+        })
+    return hits
+
+async def measure(service: Any, queries: List[str]) -> dict[str, Any]:
+    samples = []
+    stages: dict[str, List[float]] = {}
+    for query in queries:
+        timings: dict[str, float] = {}
+        start = time.perf_counter()
+        await service.process_query(query, [], timings)
+        samples.append(time.perf_counter() - start)
+        for stage, ms in timings.items():
+            stages.setdefault(stage, []).append(ms / 1000)
+    return {
+        "queries": len(queries),
+        "latency": percentiles(samples),
+        "stages": {stage: percentiles(values, (50, 95)) for stage, values in sorted(stages.items())}
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--distinct-warm", type=int, default=10, help="distinct queries in the warm set")
+    parser.add_argument("--hits", type=int, default=5)
+    parser.add_argument("--mode", choices=["splade", "hybrid"], default="splade")
+    parser.add_argument("--es-latency", type=float, default=0.005, help="seconds per request")
+    parser.add_argument("--encoder-latency", type=float, default=0.01, help="seconds per request")
+    parser.add_argument("--first-token-delay", type=float, default=0.05, help="seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    from src.core.config import settings
+    from src.core.http import close_http_clients
+    from src.services.chat import ChatService
+
+    answer = corpus.text(random.Random(args.seed), 200)
+    cold_queries = corpus.queries(args.queries, seed=args.seed + 1)
+    warm_set = corpus.queries(args.distinct_warm, seed=args.seed + 2)
+    warm_queries = [warm_set[i % len(warm_set)] for i in range(args.queries)]
+
+    with stubs.elasticsearch_stub(search_hits(args.hits, args.seed), latency=args.es_latency) as es, \
+            stubs.encoder_stub(latency=args.encoder_latency) as encoder, \
+            stubs.ollama_stub(answer, args.tokens_per_second, args.first_token_delay, settings.EMBEDDING_MODEL) as ollama:
+        settings.ELASTICSEARCH_URL = es.url
+        settings.ENCODER_SERVICE_URL = encoder.url
+        settings.OLLAMA_BASE_URL = ollama.url
+        settings.OLLAMA_WARMUP = False
+        settings.RETRIEVAL_MODE = args.mode
+
+        async def run() -> List[dict[str, Any]]:
+            service = ChatService()
+            try:
+                cold = await measure(service, cold_queries)
+                # Fill the caches once so that the warm pass measures hits only
+                for query in warm_set:
+                    await service.process_query(query, [], {})
+                warm = await measure(service, warm_queries)
+            finally:
+                await service.close()
+                await close_http_clients()
+            return [{"phase": "cold", **cold}, {"phase": "warm", **warm}]
+
+        results = asyncio.run(run())
+        for result in results:
+            latency = result["latency"]
+            print(f"{result['phase']}: p50={latency['p50_ms']} ms p95={latency['p95_ms']} ms p99={latency['p99_ms']} ms",
+                  file=sys.stderr)
+        config = {**vars(args), "requests": {"elasticsearch": es.requests, "encoder": encoder.requests, "ollama": ollama.requests}}
+
+    write_results("chat", config, results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Throughput of ``SpladeModel.encode_batch_ids`` per batch size and sequence length.
+
+A BERT masked-LM with random weights and a character-level vocabulary is
+built in a temporary directory, so no model download is needed. Its shape
+(hidden size, layers, vocabulary size) follows the chosen preset; absolute
+numbers differ from the real model, but relative changes between commits
+are comparable.
+
+Run from the encoder directory:
+    uv run python ../benchmarks/bench_encoder.py --preset small --output ../benchmarks/results/encoder.json
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, List
+
+from common import percentiles, use_service, write_results
+import corpus
+
+use_service("encoder")
+
+import torch  # noqa: E402
+from transformers import BertConfig, BertForMaskedLM, BertTokenizerFast  # noqa: E402
+from src.models.splade import SpladeModel  # noqa: E402
+
+PRESETS = {
+    "small": {"hidden_size": 256, "num_hidden_layers": 4, "num_attention_heads": 4, "intermediate_size": 1024},
+    "base": {"hidden_size": 768, "num_hidden_layers": 12, "num_attention_heads": 12, "intermediate_size": 3072},
+}
+SPECIAL_TOKENS = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+
+def build_model(directory: Path, preset: str, vocab_size: int, max_length: int, seed: int) -> None:
+    """Saves a random-weight model and a matching tokenizer to ``directory``."""
+    chars = corpus.characters()
+    vocab = SPECIAL_TOKENS + chars + [f"##{char}" for char in chars]
+    vocab += [f"[unused{i}]" for i in range(max(0, vocab_size - len(vocab)))]
+    (directory / "vocab.txt").write_text("\n".join(vocab) + "\n", encoding="utf-8")
+    tokenizer = BertTokenizerFast(
+        vocab_file=str(directory / "vocab.txt"), do_lower_case=False, tokenize_chinese_chars=True,
+        model_max_length=max_length
+    )
+    tokenizer.save_pretrained(directory)
+
+    torch.manual_seed(seed)
+    config = BertConfig(vocab_size=len(vocab), max_position_embeddings=max(512, max_length), **PRESETS[preset])
+    BertForMaskedLM(config).save_pretrained(directory)
+
+def measure(model: SpladeModel, texts: List[str], batch_size: int, repeats: int) -> dict[str, Any]:
+    model.encode_batch_ids(texts[:batch_size])  # warm-up
+    samples = []
+    tokens = 0
+    for i in range(repeats):
+        batch = texts[i * batch_size:(i + 1) * batch_size]
+        tokens += sum(model.tokenizer(batch, truncation=True, return_length=True)["length"])
+        start = time.perf_counter()
+        model.encode_batch_ids(batch)
+        samples.append(time.perf_counter() - start)
+    elapsed = sum(samples)
+    return {
+        "texts_per_second": round(batch_size * repeats / elapsed, 2),
+        "tokens_per_second": round(tokens / elapsed, 1),
+        "batch": percentiles(samples)
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    parser.add_argument("--vocab-size", type=int, default=32768)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--seq-lengths", type=int, nargs="+", default=[32, 128, 512],
+                        help="Text lengths in characters, which is about one token each.")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    max_length = max(args.seq_lengths) + 2
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        build_model(Path(directory), args.preset, args.vocab_size, max_length, args.seed)
+        rng = random.Random(args.seed)
+        for batch_size in args.batch_sizes:
+            model = SpladeModel(model_id=directory, max_batch_size=batch_size)
+            for seq_length in args.seq_lengths:
+                texts = [corpus.text(rng, seq_length) for _ in range(batch_size * args.repeats)]
+                result = measure(model, texts, batch_size, args.repeats)
+                results.append({"batch_size": batch_size, "seq_length": seq_length, **result})
+                print(
+                    f"batch={batch_size:<3} seq={seq_length:<4} {result['texts_per_second']:>9} texts/s "
+                    f"{result['tokens_per_second']:>10} tokens/s p50={result['batch']['p50_ms']} ms",
+                    file=sys.stderr
+                )
+
+    config = {**vars(args), "model": PRESETS[args.preset], "torch": torch.__version__, "threads": torch.get_num_threads()}
+    write_results("encoder", config, results, args.output)
+
+if __name__ == "__main__":
+    main()
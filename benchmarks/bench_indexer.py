@@ -0,0 +1,102 @@
+"""Throughput of a full ``IndexerService.sync_pages`` run against local stubs.
+
+Cosense, Elasticsearch and the encoder are stdlib HTTP servers on
+localhost, each with an optional fixed latency per request, so the
+pipeline's own overhead (queues, splitting, bulk batching, HTTP clients)
+is what gets measured.
+
+Run from the batch directory:
+    uv run python ../benchmarks/bench_indexer.py --pages 500 --output ../benchmarks/results/indexer.json
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import Any
+
+from common import use_service, write_results
+import corpus
+import stubs
+
+use_service("batch")
+
+def run_once(args: argparse.Namespace, pages: list[dict]) -> dict[str, Any]:
+    from src.core.config import settings
+    from src.core.http import close_http_clients
+    from src.services.cosense import CosenseClient
+    from src.services.indexer import IndexerService
+
+    with stubs.cosense_stub(pages, latency=args.cosense_latency) as cosense, \
+            stubs.elasticsearch_stub(latency=args.es_latency) as es, \
+            stubs.encoder_stub(latency=args.encoder_latency) as encoder:
+        settings.ELASTICSEARCH_URL = es.url
+        settings.ENCODER_SERVICE_URL = encoder.url
+
+        async def sync() -> Any:
+            client = CosenseClient(rate_limit=0)
+            client.base_url = f"{cosense.url}/api"
+            indexer = IndexerService()
+            try:
+                return await indexer.sync_pages(client.get_all_pages(), client, full=True)
+            finally:
+                await indexer.close()
+                await close_http_clients()
+
+        start = time.perf_counter()
+        stats = asyncio.run(sync())
+        elapsed = time.perf_counter() - start
+        return {
+            "seconds": round(elapsed, 3),
+            "pages_per_second": round(stats.pages_synced / elapsed, 2),
+            "chunks_per_second": round(stats.chunks_indexed / elapsed, 2),
+            "pages_synced": stats.pages_synced,
+            "pages_failed": stats.pages_failed,
+            "chunks_indexed": stats.chunks_indexed,
+            "bulk_actions": es.counts["bulk_actions"],
+            "requests": {"cosense": cosense.requests, "elasticsearch": es.requests, "encoder": encoder.requests}
+        }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--min-chars", type=int, default=300)
+    parser.add_argument("--max-chars", type=int, default=4000)
+    parser.add_argument("--cosense-latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--es-latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--encoder-latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    os.environ.setdefault("COSENSE_PROJECT_NAME", "bench")
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    pages = corpus.pages(args.pages, seed=args.seed, min_chars=args.min_chars, max_chars=args.max_chars)
+
+    results = []
+    for repeat in range(args.repeats):
+        result = run_once(args, pages)
+        results.append({"repeat": repeat, **result})
+        print(
+            f"run {repeat}: {result['pages_per_second']} pages/s, {result['chunks_per_second']} chunks/s "
+            f"({result['seconds']} s)",
+            file=sys.stderr
+        )
+
+    from src.core.config import settings
+    config = {
+        **vars(args),
+        "corpus_chars": sum(len(page["text"]) for page in pages),
+        "pipeline": {
+            name: getattr(settings, name) for name in (
+                "FETCH_CONCURRENCY", "SPLIT_CONCURRENCY", "ENCODE_CONCURRENCY", "INDEX_CONCURRENCY",
+                "PIPELINE_QUEUE_SIZE", "BULK_CHUNK_SIZE", "BULK_MAX_BYTES"
+            )
+        }
+    }
+    write_results("indexer", config, results, args.output)
+
+if __name__ == "__main__":
+    main()
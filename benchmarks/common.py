@@ -0,0 +1,63 @@
+"""Helpers shared by the benchmark scripts: service imports, statistics and JSON output."""
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def use_service(name: str) -> None:
+    """Makes ``src`` resolve to the given service (backend, batch or encoder).
+
+    Each service has its own top-level ``src`` package, so every benchmark
+    script works with exactly one service per process.
+    """
+    sys.path.insert(0, str(ROOT / name))
+
+def percentiles(samples: Sequence[float], points: Sequence[int] = (50, 90, 95, 99)) -> dict[str, float]:
+    """Nearest-rank percentiles of ``samples`` in milliseconds."""
+    ordered = sorted(samples)
+    result: dict[str, float] = {}
+    for point in points:
+        index = max(0, math.ceil(point / 100 * len(ordered)) - 1)
+        result[f"p{point}_ms"] = round(ordered[index] * 1000, 3)
+    result["mean_ms"] = round(statistics.fmean(ordered) * 1000, 3)
+    return result
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_results(benchmark: str, config: dict[str, Any], results: list[dict[str, Any]], output: Optional[str]) -> None:
+    """Writes results with enough context to compare runs across commits.
+
+    The document goes to ``output`` when given and to stdout otherwise.
+    """
+    document = {
+        "benchmark": benchmark,
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "config": config,
+        "results": results
+    }
+    text = json.dumps(document, ensure_ascii=False, indent=2)
+    if output:
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        Path(output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
@@ -0,0 +1,62 @@
+"""Deterministic synthetic Japanese text for benchmarks.
+
+Sentences are assembled from kanji compounds, katakana loanwords,
+hiragana particles and a few ASCII identifiers, which roughly matches the
+character mix of Cosense pages without needing any real data.
+"""
+import random
+from typing import List
+
+NOUNS = [
+    "検索", "索引", "文書", "要約", "設定", "環境", "性能", "計測", "遅延", "並列",
+    "処理", "同期", "更新", "差分", "履歴", "構成", "設計", "運用", "障害", "対応",
+    "会議", "議事録", "手順", "確認", "開発", "試験", "品質", "改善", "課題", "目標",
+]
+KATAKANA = [
+    "サーバー", "クライアント", "データベース", "キャッシュ", "エンコーダー", "モデル",
+    "パイプライン", "ベンチマーク", "クエリ", "レスポンス", "プロジェクト", "ページ",
+]
+VERBS = ["する", "した", "している", "できる", "された", "しない", "すべき", "したい"]
+PARTICLES = ["は", "が", "を", "に", "で", "と", "の", "から", "まで", "より"]
+ASCII_TERMS = ["Elasticsearch", "SPLADE", "FastAPI", "Ollama", "Docker", "API", "HTTP", "CPU"]
+
+def sentence(rng: random.Random) -> str:
+    words: List[str] = []
+    for _ in range(rng.randint(2, 5)):
+        pool = rng.choices([NOUNS, KATAKANA, ASCII_TERMS], weights=[6, 3, 1])[0]
+        words.append(rng.choice(pool) + rng.choice(PARTICLES))
+    return "".join(words) + rng.choice(NOUNS) + rng.choice(VERBS) + "。"
+
+def text(rng: random.Random, n_chars: int) -> str:
+    """Returns text of exactly ``n_chars`` characters."""
+    parts: List[str] = []
+    length = 0
+    while length < n_chars:
+        part = sentence(rng)
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)[:n_chars]
+
+def pages(n_pages: int, seed: int = 0, min_chars: int = 300, max_chars: int = 4000) -> List[dict]:
+    """Synthetic Cosense pages: unique titles, ``updated`` timestamps and line-broken bodies."""
+    rng = random.Random(seed)
+    result = []
+    for i in range(n_pages):
+        body = text(rng, rng.randint(min_chars, max_chars))
+        lines = [body[j:j + 80] for j in range(0, len(body), 80)]
+        title = f"{rng.choice(NOUNS)}{rng.choice(KATAKANA)} {i}"
+        result.append({"title": title, "updated": 1_700_000_000 + i, "text": title + "\n" + "\n".join(lines)})
+    return result
+
+def queries(n_queries: int, seed: int = 1) -> List[str]:
+    """Short question-like queries."""
+    rng = random.Random(seed)
+    return [
+        f"{rng.choice(NOUNS)}{rng.choice(PARTICLES)}{rng.choice(KATAKANA)}の{rng.choice(NOUNS)}について教えて"
+        for _ in range(n_queries)
+    ]
+
+def characters() -> List[str]:
+    """Every character the generator can emit, for building a matching vocabulary."""
+    chars = set("".join(NOUNS + KATAKANA + VERBS + PARTICLES + ASCII_TERMS) + "。、について教えて\n 0123456789")
+    return sorted(chars)
@@ -0,0 +1,238 @@
+"""In-process HTTP stand-ins for Cosense, Elasticsearch, the encoder and Ollama.
+
+They run on localhost in a background thread, so the real HTTP clients of
+the services are exercised without network access. Each stub can add a
+fixed ``latency`` (seconds) per request to model the upstream's cost.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, List, Optional, Tuple
+
+Response = Tuple[int, Any]
+Handler = Callable[[re.Match, dict, bytes], Response]
+
+class StubServer:
+    """A tiny routing HTTP server; routes map (method, path regex) to a handler.
+
+    Handlers receive the path match, the parsed query string and the raw
+    body, and return ``(status, payload)``. Dict and list payloads are sent
+    as JSON, strings as text and bytes as NDJSON.
+    """
+
+    def __init__(self, routes: List[Tuple[str, str, Handler]], latency: float = 0.0, headers: Optional[dict] = None) -> None:
+        self.routes = [(method, re.compile(pattern), handler) for method, pattern, handler in routes]
+        self.latency = latency
+        self.extra_headers = headers or {}
+        self.requests = 0
+        stub = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes; with Nagle on, keep-alive
+            # requests stall on delayed ACKs for tens of milliseconds
+            disable_nagle_algorithm = True
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def _dispatch(self) -> None:
+                stub.requests += 1
+                parsed = urllib.parse.urlsplit(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                query = dict(urllib.parse.parse_qsl(parsed.query))
+                for method, pattern, handler in stub.routes:
+                    match = pattern.fullmatch(urllib.parse.unquote(parsed.path))
+                    if method == self.command and match:
+                        if stub.latency:
+                            time.sleep(stub.latency)
+                        status, payload = handler(match, query, body)
+                        break
+                else:
+                    status, payload = 404, {"error": f"no stub route for {self.command} {parsed.path}"}
+                self._send(status, payload)
+
+            def _send(self, status: int, payload: Any) -> None:
+                if isinstance(payload, bytes):
+                    data, content_type = payload, "application/x-ndjson"
+                elif isinstance(payload, str):
+                    data, content_type = payload.encode("utf-8"), "text/plain; charset=utf-8"
+                else:
+                    data, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json"
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(0 if self.command == "HEAD" else len(data)))
+                for key, value in stub.extra_headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _dispatch
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), RequestHandler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+def sparse_vector(text: str, terms: int = 64) -> dict[str, float]:
+    """Deterministic SPLADE-like vector: up to ``terms`` hashed character bigrams."""
+    vector: dict[str, float] = {}
+    for i in range(max(1, len(text) - 1)):
+        digest = hashlib.blake2b(text[i:i + 2].encode("utf-8"), digest_size=4).digest()
+        token = f"t{int.from_bytes(digest[:2], 'little') % 30000}"
+        vector[token] = max(vector.get(token, 0.0), 0.1 + digest[2] / 128)
+        if len(vector) >= terms:
+            break
+    return vector
+
+def encoder_stub(latency: float = 0.0, terms: int = 64) -> StubServer:
+    """The encoder's JSON wire format for /encode and /encode_batch."""
+    def encode(match: re.Match, query: dict, body: bytes) -> Response:
+        return 200, {"sparse_values": sparse_vector(json.loads(body)["text"], terms)}
+
+    def encode_batch(match: re.Match, query: dict, body: bytes) -> Response:
+        texts = json.loads(body)["texts"]
+        return 200, {"results": [{"sparse_values": sparse_vector(text, terms)} for text in texts]}
+
+    return StubServer([
+        ("POST", r"/encode", encode),
+        ("POST", r"/encode_batch", encode_batch),
+        ("GET", r"/health", lambda m, q, b: (200, {"status": "healthy"})),
+    ], latency=latency)
+
+def cosense_stub(pages: List[dict], latency: float = 0.0) -> StubServer:
+    """Listing and page text endpoints of the Cosense API, under /api."""
+    by_title = {page["title"]: page for page in pages}
+
+    def listing(match: re.Match, query: dict, body: bytes) -> Response:
+        skip, limit = int(query.get("skip", 0)), int(query.get("limit", 100))
+        window = pages[skip:skip + limit]
+        return 200, {
+            "skip": skip,
+            "limit": limit,
+            "count": len(pages),
+            "pages": [{"title": page["title"], "updated": page["updated"]} for page in window]
+        }
+
+    def page_text(match: re.Match, query: dict, body: bytes) -> Response:
+        page = by_title.get(match.group("title"))
+        return (200, page["text"]) if page else (404, {"message": "Page not found"})
+
+    return StubServer([
+        ("GET", r"/api/pages/(?P<project>[^/]+)", listing),
+        ("GET", r"/api/pages/(?P<project>[^/]+)/(?P<title>.+)/text", page_text),
+    ], latency=latency)
+
+def elasticsearch_stub(search_hits: Optional[List[dict]] = None, latency: float = 0.0) -> StubServer:
+    """Just enough of the Elasticsearch REST API for the batch and backend code paths.
+
+    Bulk requests are parsed and acknowledged (documents are counted, not
+    stored); searches return ``search_hits``.
+    """
+    indices: set[str] = set()
+    counts = {"bulk_actions": 0}
+    hits = search_hits or []
+    ok = {"acknowledged": True}
+    shards = {"total": 1, "successful": 1, "skipped": 0, "failed": 0}
+
+    def exists(match: re.Match, query: dict, body: bytes) -> Response:
+        return (200, {}) if match.group("index") in indices else (404, {})
+
+    def create(match: re.Match, query: dict, body: bytes) -> Response:
+        indices.add(match.group("index"))
+        return 200, {**ok, "index": match.group("index")}
+
+    def get_settings(match: re.Match, query: dict, body: bytes) -> Response:
+        return 200, {match.group("index"): {"settings": {"index.refresh_interval": "1s", "index.number_of_replicas": "0"}}}
+
+    def bulk(match: re.Match, query: dict, body: bytes) -> Response:
+        lines = [json.loads(line) for line in body.decode("utf-8").splitlines() if line.strip()]
+        items = []
+        i = 0
+        while i < len(lines):
+            op, meta = next(iter(lines[i].items()))
+            i += 1 if op == "delete" else 2
+            items.append({op: {"_index": meta.get("_index"), "_id": meta.get("_id"), "status": 200 if op == "delete" else 201}})
+        counts["bulk_actions"] += len(items)
+        return 200, {"took": 1, "errors": False, "items": items}
+
+    def search(match: re.Match, query: dict, body: bytes) -> Response:
+        request = json.loads(body) if body else {}
+        size = request.get("size", 10)
+        return 200, {
+            "_scroll_id": "stub-scroll" if "scroll" in query else None,
+            "took": 1,
+            "timed_out": False,
+            "_shards": shards,
+            # Sync state scans start empty, which makes every run a full sync
+            "hits": {"total": {"value": 0, "relation": "eq"}, "hits": [] if "scroll" in query else hits[:size]}
+        }
+
+    def empty_scroll(match: re.Match, query: dict, body: bytes) -> Response:
+        return 200, {"_scroll_id": "stub-scroll", "_shards": shards, "hits": {"hits": []}}
+
+    def index_stats(match: re.Match, query: dict, body: bytes) -> Response:
+        index = match.group("index")
+        return 200, {"indices": {index: {"primaries": {"store": {"size_in_bytes": counts["bulk_actions"] * 1024}}}}}
+
+    server = StubServer([
+        ("GET", r"/", lambda m, q, b: (200, {"version": {"number": "8.12.0"}, "tagline": "You Know, for Search"})),
+        ("HEAD", r"/", lambda m, q, b: (200, {})),
+        ("POST", r"/_bulk", bulk),
+        ("PUT", r"/_bulk", bulk),
+        ("POST", r"/_search/scroll", empty_scroll),
+        ("DELETE", r"/_search/scroll", lambda m, q, b: (200, {"succeeded": True})),
+        ("HEAD", r"/(?P<index>[^/_][^/]*)", exists),
+        ("PUT", r"/(?P<index>[^/_][^/]*)", create),
+        ("GET", r"/(?P<index>[^/]+)/_settings", get_settings),
+        ("PUT", r"/(?P<index>[^/]+)/_settings", lambda m, q, b: (200, ok)),
+        ("POST", r"/(?P<index>[^/]+)/_refresh", lambda m, q, b: (200, {"_shards": shards})),
+        ("POST", r"/(?P<index>[^/]+)/_search", search),
+        ("GET", r"/(?P<index>[^/]+)/_search", search),
+        ("POST", r"/(?P<index>[^/]+)/_delete_by_query", lambda m, q, b: (200, {"deleted": 0})),
+        ("POST", r"/(?P<index>[^/]+)/_update/(?P<id>.+)", lambda m, q, b: (200, {"result": "updated"})),
+        ("GET", r"/(?P<index>[^/]+)/_doc/(?P<id>.+)", lambda m, q, b: (404, {"found": False})),
+        ("DELETE", r"/(?P<index>[^/]+)/_doc/(?P<id>.+)", lambda m, q, b: (404, {"result": "not_found"})),
+        ("GET", r"/(?P<index>[^/]+)/_stats/store", index_stats),
+    ], latency=latency, headers={"X-Elastic-Product": "Elasticsearch"})
+    server.counts = counts  # type: ignore[attr-defined]
+    return server
+
+def ollama_stub(answer: str, tokens_per_second: float = 50.0, first_token_delay: float = 0.0, model: str = "gemma3") -> StubServer:
+    """/api/generate (blocking and NDJSON streaming) and /api/ps of Ollama."""
+    pieces = [answer[i:i + 2] for i in range(0, len(answer), 2)]
+
+    def generate(match: re.Match, query: dict, body: bytes) -> Response:
+        request = json.loads(body)
+        if "prompt" not in request:
+            return 200, {"model": request["model"], "response": "", "done": True}
+        time.sleep(first_token_delay + len(pieces) / tokens_per_second)
+        if request.get("stream", True):
+            lines = [json.dumps({"response": piece, "done": False}, ensure_ascii=False) for piece in pieces]
+            lines.append(json.dumps({"response": "", "done": True}))
+            return 200, ("\n".join(lines) + "\n").encode("utf-8")
+        return 200, {"model": request["model"], "response": answer, "done": True}
+
+    return StubServer([
+        ("POST", r"/api/generate", generate),
+        ("GET", r"/api/ps", lambda m, q, b: (200, {"models": [{"name": f"{model}:latest"}]})),
+        ("GET", r"/api/tags", lambda m, q, b: (200, {"models": [{"name": f"{model}:latest"}]})),
+    ])
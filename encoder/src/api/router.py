@@ -1,22 +1,64 @@
-from fastapi import APIRouter, Depends
-from typing import Annotated
-from src.schemas.encode import EncodeRequest, EncodeResponse
+from fastapi import APIRouter, Depends, Header, Request, Response
+from typing import Annotated, Optional
+from src.api.wire import render
+from src.core.config import settings
+from src.schemas.encode import EncodeRequest, EncodeResponse, EncodeBatchRequest, EncodeBatchResponse, InfoResponse, VocabResponse
 from src.models.splade import SpladeModel
+from src.services.batcher import MicroBatcher
 import functools
 
 router = APIRouter()
 
 @functools.lru_cache()
 def get_model() -> SpladeModel:
-    return SpladeModel()
+    return SpladeModel(
+        model_id=settings.MODEL_ID,
+        max_batch_size=settings.MAX_BATCH_SIZE,
+        top_k=settings.TOP_K,
+        min_weight=settings.MIN_WEIGHT
+    )
+
+def get_batcher(request: Request) -> MicroBatcher:
+    """The process-wide batcher, created with its executor in ``lifespan``."""
+    return request.app.state.batcher
 
 @router.post("/encode", response_model=EncodeResponse)
 async def encode(
     request: EncodeRequest, 
-    model: Annotated[SpladeModel, Depends(get_model)]
-) -> EncodeResponse:
-    sparse_values = model.encode(request.text)
-    return EncodeResponse(sparse_values=sparse_values)
+    batcher: Annotated[MicroBatcher, Depends(get_batcher)],
+    accept: Annotated[Optional[str], Header()] = None
+) -> Response:
+    vector = await batcher.encode(request.text)
+    return render([vector], batcher.model, accept, batch=False)
+
+@router.post("/encode_batch", response_model=EncodeBatchResponse)
+async def encode_batch(
+    request: EncodeBatchRequest,
+    batcher: Annotated[MicroBatcher, Depends(get_batcher)],
+    accept: Annotated[Optional[str], Header()] = None
+) -> Response:
+    vectors = await batcher.encode_many(request.texts)
+    return render(vectors, batcher.model, accept, batch=True)
+
+@router.get("/vocab", response_model=VocabResponse)
+async def vocab(
+    model: Annotated[SpladeModel, Depends(get_model)],
+    response: Response
+) -> VocabResponse:
+    """Feature-name table that the compact formats' ids index into."""
+    response.headers["ETag"] = f'"{model.vocab_version}"'
+    response.headers["Cache-Control"] = "public, max-age=86400"
+    return VocabResponse(model_id=model.model_id, version=model.vocab_version, features=model.feature_names)
+
+@router.get("/info", response_model=InfoResponse)
+async def info(model: Annotated[SpladeModel, Depends(get_model)]) -> InfoResponse:
+    """Model and pruning settings that determine the vectors this encoder returns."""
+    return InfoResponse(
+        model_id=model.model_id,
+        vocab_version=model.vocab_version,
+        top_k=model.top_k,
+        min_weight=model.min_weight
+    )
 
 @router.get("/health")
 async def health() -> dict[str, str]:
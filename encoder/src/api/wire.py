@@ -0,0 +1,60 @@
+from typing import Any, Optional
+import msgpack
+import numpy as np
+from fastapi.responses import JSONResponse, Response
+from src.models.splade import SparseVector, SpladeModel
+from src.schemas.encode import (
+    CompactEncodeBatchResponse,
+    CompactEncodeResponse,
+    EncodeBatchResponse,
+    EncodeResponse,
+)
+
+# Opt-in response formats, selected with the Accept header. Both return
+# feature ids into the table served by GET /vocab instead of feature names.
+COMPACT_JSON_MEDIA_TYPE = "application/vnd.splade.compact+json"
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+VOCAB_VERSION_HEADER = "X-Vocab-Version"
+
+def _quantize(weights: list[float]) -> np.ndarray:
+    return np.asarray(weights, dtype=np.float16)
+
+def _compact_json(vector: SparseVector) -> CompactEncodeResponse:
+    return CompactEncodeResponse(
+        ids=vector.ids,
+        weights=[round(w, 4) for w in _quantize(vector.weights).tolist()]
+    )
+
+def _msgpack_entry(vector: SparseVector) -> dict[str, bytes]:
+    # Little-endian uint32 ids and float16 weights as raw buffers
+    return {
+        "ids": np.asarray(vector.ids, dtype="<u4").tobytes(),
+        "weights": _quantize(vector.weights).astype("<f2").tobytes()
+    }
+
+def negotiate(accept: Optional[str]) -> str:
+    """Returns the response media type requested by an Accept header."""
+    accept = accept or ""
+    if MSGPACK_MEDIA_TYPE in accept:
+        return MSGPACK_MEDIA_TYPE
+    if COMPACT_JSON_MEDIA_TYPE in accept:
+        return COMPACT_JSON_MEDIA_TYPE
+    return "application/json"
+
+def render(vectors: list[SparseVector], model: SpladeModel, accept: Optional[str], batch: bool) -> Response:
+    """Serializes encoder output in the format requested by the client."""
+    media_type = negotiate(accept)
+    headers = {VOCAB_VERSION_HEADER: model.vocab_version}
+    content: Any
+    if media_type == MSGPACK_MEDIA_TYPE:
+        entries = [_msgpack_entry(v) for v in vectors]
+        content = {"results": entries} if batch else entries[0]
+        return Response(msgpack.packb(content), media_type=media_type, headers=headers)
+
+    if media_type == COMPACT_JSON_MEDIA_TYPE:
+        compact = [_compact_json(v) for v in vectors]
+        content = CompactEncodeBatchResponse(results=compact) if batch else compact[0]
+    else:
+        full = [EncodeResponse(sparse_values=model.to_feature_dict(v)) for v in vectors]
+        content = EncodeBatchResponse(results=full) if batch else full[0]
+    return JSONResponse(content.model_dump(), media_type=media_type, headers=headers)
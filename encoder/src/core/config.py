@@ -0,0 +1,46 @@
+from typing import Optional
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+class Settings(BaseSettings):
+    """Configuration settings for the encoder service.
+
+    Attributes:
+        MODEL_ID (str): Hugging Face id of the SPLADE model.
+        TOP_K (Optional[int]): Keep only the top-k weighted features per text.
+        MIN_WEIGHT (float): Features at or below this weight are dropped.
+        MAX_BATCH_SIZE (int): Maximum number of texts per forward pass.
+        BATCH_WAIT_MS (float): How long the micro-batcher waits for more
+            requests before running a partially filled batch.
+        INFERENCE_WORKERS (int): Number of forward passes run concurrently
+            in the inference thread pool.
+        TORCH_NUM_THREADS (Optional[int]): Intra-op thread count for torch,
+            set once for the process and used by every concurrent forward
+            pass, so INFERENCE_WORKERS * TORCH_NUM_THREADS should not exceed
+            the cores available. Unset means all cores with one worker and
+            cores // INFERENCE_WORKERS with several.
+        MAX_QUEUE_SIZE (int): Maximum number of texts waiting for inference
+            before new requests are rejected with 503.
+        RETRY_AFTER_SECONDS (int): Value of the Retry-After header sent with 503.
+    """
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_encoding="utf-8",
+        case_sensitive=True,
+        extra="ignore"
+    )
+
+    MODEL_ID: str = "aken12/splade-japanese-v3"
+    TOP_K: Optional[int] = None
+    MIN_WEIGHT: float = 0.01
+
+    # Micro-batching
+    MAX_BATCH_SIZE: int = 32
+    BATCH_WAIT_MS: float = 5.0
+
+    # Inference executor and admission control
+    INFERENCE_WORKERS: int = 1
+    TORCH_NUM_THREADS: Optional[int] = None
+    MAX_QUEUE_SIZE: int = 256
+    RETRY_AFTER_SECONDS: int = 1
+
+settings = Settings()
@@ -0,0 +1,19 @@
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# Sub-millisecond to multi-second: a single short text up to a full CPU batch
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_SECONDS = Histogram(
+    "encoder_request_seconds", "Time spent serving an encode request, including queueing.", ["path"], buckets=LATENCY_BUCKETS
+)
+TOKENIZE_SECONDS = Histogram("encoder_tokenize_seconds", "Tokenization time per forward batch.", buckets=LATENCY_BUCKETS)
+FORWARD_SECONDS = Histogram("encoder_forward_seconds", "Model forward-pass time per batch.", buckets=LATENCY_BUCKETS)
+BATCH_SIZE = Histogram(
+    "encoder_batch_size", "Texts per micro-batch handed to the model.", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+REJECTED_REQUESTS = Counter("encoder_rejected_requests_total", "Requests rejected because the inference queue was full.")
+ERRORS = Counter("encoder_errors_total", "Failures by stage.", ["stage"])
+
+def render_metrics() -> tuple[bytes, str]:
+    """Returns the Prometheus exposition of every metric and its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,13 +1,68 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+import time
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 import logging
-from src.api.router import router
+from src.api.router import get_model, router
+from src.core.config import settings
+from src.core.metrics import REQUEST_SECONDS, render_metrics
+from src.services.batcher import EncoderOverloadedError, MicroBatcher
+from src.services.executor import create_inference_executor
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Built once here rather than in a request dependency, which would run
+    # concurrently in the threadpool and could start several executors
+    model = app.dependency_overrides.get(get_model, get_model)()
+    app.state.executor = create_inference_executor(
+        workers=settings.INFERENCE_WORKERS,
+        torch_threads=settings.TORCH_NUM_THREADS
+    )
+    app.state.batcher = MicroBatcher(
+        model,
+        max_batch_size=settings.MAX_BATCH_SIZE,
+        max_wait_ms=settings.BATCH_WAIT_MS,
+        max_queue_size=settings.MAX_QUEUE_SIZE,
+        executor=app.state.executor,
+        num_workers=settings.INFERENCE_WORKERS
+    )
+    try:
+        yield
+    finally:
+        await app.state.batcher.close()
+        app.state.executor.shutdown(wait=False, cancel_futures=True)
+
+async def overloaded_handler(request: Request, exc: Exception) -> JSONResponse:
+    logger.warning(f"Rejecting {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(settings.RETRY_AFTER_SECONDS)}
+    )
+
+async def metrics() -> Response:
+    """Prometheus scrape endpoint."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 def create_app() -> FastAPI:
-    app = FastAPI(title="SPLADE Embedding Service")
+    app = FastAPI(title="SPLADE Embedding Service", lifespan=lifespan)
     app.include_router(router)
+    app.add_exception_handler(EncoderOverloadedError, overloaded_handler)
+    app.add_api_route("/metrics", metrics, methods=["GET"], include_in_schema=False)
+
+    @app.middleware("http")
+    async def time_requests(request: Request, call_next):
+        started = time.perf_counter()
+        response = await call_next(request)
+        if request.url.path in ("/encode", "/encode_batch"):
+            REQUEST_SECONDS.labels(path=request.url.path).observe(time.perf_counter() - started)
+        return response
+
     return app
 
 app = create_app()
@@ -1,51 +1,160 @@
 import torch
 import re
+import numpy as np
 from transformers import AutoModelForMaskedLM, AutoTokenizer
 import logging
-from typing import Any
+import hashlib
+import threading
+from typing import Any, NamedTuple, Optional
+from src.core.metrics import FORWARD_SECONDS, TOKENIZE_SECONDS
 
 logger = logging.getLogger(__name__)
 
+class SparseVector(NamedTuple):
+    """Pruned SPLADE output as parallel arrays of feature ids and weights."""
+    ids: list[int]
+    weights: list[float]
+
 class SpladeModel:
     tokenizer: Any
     model: Any
     device: torch.device
+    feature_names: list[str]
+    feature_index: torch.Tensor
+    vocab_version: str
 
-    def __init__(self, model_id: str = "aken12/splade-japanese-v3") -> None:
+    def __init__(
+        self,
+        model_id: str = "aken12/splade-japanese-v3",
+        max_batch_size: int = 32,
+        top_k: Optional[int] = None,
+        min_weight: float = 0.01
+    ) -> None:
         self.model_id = model_id
+        self.max_batch_size = max_batch_size
+        self.top_k = top_k
+        self.min_weight = min_weight
         logger.info(f"Loading model {model_id}...")
         self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        # Fast tokenizers are not thread-safe ("Already borrowed") when
+        # several inference workers pad or truncate at the same time
+        self._tokenize_lock = threading.Lock()
         self.model = AutoModelForMaskedLM.from_pretrained(model_id)
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model.to(self.device)
-        logger.info(f"Model loaded on {self.device}")
+        self._build_feature_table()
+        logger.info(f"Model loaded on {self.device} ({len(self.feature_names)} features)")
 
     def encode(self, text: str) -> dict[str, float]:
-        inputs = self.tokenizer(text, return_tensors="pt").to(self.device)
-        
-        with torch.no_grad():
+        return self.encode_batch([text])[0]
+
+    def encode_batch(self, texts: list[str]) -> list[dict[str, float]]:
+        return [self.to_feature_dict(vector) for vector in self.encode_batch_ids(texts)]
+
+    def encode_batch_ids(self, texts: list[str]) -> list[SparseVector]:
+        """Encodes several texts, running one padded forward pass per length bucket.
+
+        Texts are sorted by length and split into buckets of at most
+        ``max_batch_size`` so that each batch pads to a similar length.
+        Results are returned in the order of ``texts``, as ids into
+        ``feature_names`` ordered by descending weight.
+        """
+        results = [SparseVector([], []) for _ in texts]
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.max_batch_size):
+            bucket = order[start:start + self.max_batch_size]
+            vectors = self._forward([texts[i] for i in bucket])
+            for i, vector in zip(bucket, self._to_features_batch(vectors)):
+                results[i] = vector
+        return results
+
+    def to_feature_dict(self, vector: SparseVector) -> dict[str, float]:
+        """Resolves feature ids to their Elasticsearch-safe names."""
+        names = self._feature_names_array[vector.ids].tolist() if vector.ids else []
+        return dict(zip(names, vector.weights))
+
+    def _forward(self, texts: list[str]) -> torch.Tensor:
+        with self._tokenize_lock, TOKENIZE_SECONDS.time():
+            inputs = self.tokenizer(
+                texts, padding=True, truncation=True, return_tensors="pt"
+            ).to(self.device)
+
+        with FORWARD_SECONDS.time(), torch.no_grad():
             logits = self.model(**inputs).logits
-            
+
         # SPLADE representation: max(log1p(relu(logits))) over sequence dimension
-        sparse_vector = torch.max(torch.log1p(torch.relu(logits)), dim=1).values[0]
-        
-        # Extract non-zero elements
-        indices = torch.nonzero(sparse_vector).flatten()
-        values = sparse_vector[indices]
-        
-        result = {}
-        for idx, val in zip(indices.tolist(), values.tolist()):
-            token = self.tokenizer.decode([idx]).strip()
-            if not token or val <= 0.01:
+        weights = torch.log1p(torch.relu(logits))
+        attention_mask = inputs.get("attention_mask")
+        if attention_mask is not None:
+            # Padding positions must not contribute to the max pooling
+            weights = weights * attention_mask.unsqueeze(-1).to(weights.dtype)
+        return torch.max(weights, dim=1).values
+
+    def _to_features_batch(self, sparse_vectors: torch.Tensor) -> list[SparseVector]:
+        """Maps a (batch, vocab) weight tensor to pruned feature vectors.
+
+        Vocab weights are scattered onto their feature slots (max-merging ids
+        that share a name), thresholded and optionally top-k pruned as tensor
+        ops, so only the surviving entries are copied back to Python.
+        """
+        vocab = min(sparse_vectors.shape[1], self.feature_index.shape[0])
+        index = self.feature_index[:vocab].to(sparse_vectors.device)
+        # One extra slot collects ids whose token has no usable feature name
+        pooled = torch.zeros(
+            (sparse_vectors.shape[0], len(self.feature_names) + 1),
+            dtype=sparse_vectors.dtype,
+            device=sparse_vectors.device
+        )
+        pooled.scatter_reduce_(
+            1, index.expand(sparse_vectors.shape[0], -1), sparse_vectors[:, :vocab], reduce="amax"
+        )
+        pooled = pooled[:, :-1]
+        pooled = torch.where(pooled > self.min_weight, pooled, torch.zeros_like(pooled))
+
+        if self.top_k is not None and self.top_k < pooled.shape[1]:
+            values, ids = torch.topk(pooled, self.top_k, dim=1)
+        else:
+            values, ids = torch.sort(pooled, dim=1, descending=True)
+
+        results = []
+        for row_values, row_ids in zip(values.cpu(), ids.cpu()):
+            kept = row_values > 0
+            results.append(SparseVector(row_ids[kept].tolist(), row_values[kept].tolist()))
+        return results
+
+    def _build_feature_table(self) -> None:
+        """Precomputes Elasticsearch-safe feature names for the whole vocabulary.
+
+        ``feature_names`` holds each distinct name once and ``feature_index``
+        maps every vocab id to its slot in that list. Ids that decode to an
+        empty token point at the extra slot ``len(feature_names)``, which is
+        dropped during post-processing.
+        """
+        vocab_size = len(self.tokenizer)
+        tokens = self.tokenizer.batch_decode([[idx] for idx in range(vocab_size)]) if vocab_size else []
+        slots: dict[str, int] = {}
+        index = []
+        for token in tokens:
+            token = token.strip()
+            if not token:
+                index.append(-1)
                 continue
-            
+
             # Elasticsearch rank_features: Forbidden characters in field names
             # Reference: . , * ? < > | / \ [ ] { } ( ) = ! & ^ ~ : ; ' " ` and SPACE
             # Also must not start with _ or -
             safe_token = re.sub(r'[\s.,*?<>\/|\\\[\]{}()=!&^~:;\'"`]', '_', token)
             if safe_token.startswith(('_', '-')):
                 safe_token = f"u{safe_token}"
-                
-            result[safe_token] = float(val)
-                
-        return result
+
+            index.append(slots.setdefault(safe_token, len(slots)))
+
+        self.feature_names = list(slots)
+        self._feature_names_array = np.array(self.feature_names, dtype=object)
+        # Lets clients detect that a cached copy of the feature table is stale
+        self.vocab_version = hashlib.sha256(
+            "\n".join([self.model_id, *self.feature_names]).encode("utf-8")
+        ).hexdigest()[:16]
+        self.feature_index = torch.tensor(
+            [slot if slot >= 0 else len(self.feature_names) for slot in index], dtype=torch.long
+        )
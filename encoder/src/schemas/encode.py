@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel
 
 class EncodeRequest(BaseModel):
@@ -5,3 +6,27 @@ class EncodeRequest(BaseModel):
 
 class EncodeResponse(BaseModel):
     sparse_values: dict[str, float]
+
+class EncodeBatchRequest(BaseModel):
+    texts: list[str]
+
+class EncodeBatchResponse(BaseModel):
+    results: list[EncodeResponse]
+
+class CompactEncodeResponse(BaseModel):
+    ids: list[int]
+    weights: list[float]
+
+class CompactEncodeBatchResponse(BaseModel):
+    results: list[CompactEncodeResponse]
+
+class VocabResponse(BaseModel):
+    model_id: str
+    version: str
+    features: list[str]
+
+class InfoResponse(BaseModel):
+    model_id: str
+    vocab_version: str
+    top_k: Optional[int]
+    min_weight: float
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+from concurrent.futures import Executor
+from typing import Optional
+from src.core.metrics import BATCH_SIZE, ERRORS, REJECTED_REQUESTS
+from src.models.splade import SparseVector, SpladeModel
+
+logger = logging.getLogger(__name__)
+
+class EncoderOverloadedError(Exception):
+    """Raised when the admission queue is full and a request cannot be accepted."""
+
+class MicroBatcher:
+    """Groups concurrent encode requests into a single batched forward pass.
+
+    Requests are queued and background workers collect them for up to
+    ``max_wait_ms`` (or until ``max_batch_size`` texts are waiting) before
+    handing the whole group to ``SpladeModel.encode_batch_ids`` on ``executor``.
+    The queue holds at most ``max_queue_size`` texts; beyond that requests
+    are rejected with ``EncoderOverloadedError`` instead of piling up. A
+    request larger than the whole queue is still admitted when nothing is
+    waiting, since it could otherwise never succeed.
+    """
+
+    def __init__(
+        self,
+        model: SpladeModel,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        max_queue_size: int = 256,
+        executor: Optional[Executor] = None,
+        num_workers: int = 1
+    ) -> None:
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.executor = executor
+        self.num_workers = num_workers
+        self.max_queue_size = max_queue_size
+        # Bounded by _admit rather than maxsize, so that oversized requests fit
+        self._queue: asyncio.Queue[tuple[str, asyncio.Future[SparseVector]]] = asyncio.Queue()
+        self._workers: list[asyncio.Task[None]] = []
+
+    def _ensure_workers(self) -> None:
+        self._workers = [w for w in self._workers if not w.done()]
+        while len(self._workers) < self.num_workers:
+            self._workers.append(asyncio.create_task(self._run()))
+
+    def _admit(self, texts: list[str]) -> list[asyncio.Future[SparseVector]]:
+        waiting = self._queue.qsize()
+        if self.max_queue_size and waiting and waiting + len(texts) > self.max_queue_size:
+            REJECTED_REQUESTS.inc()
+            raise EncoderOverloadedError(
+                f"Inference queue is full ({waiting}/{self.max_queue_size} texts waiting)"
+            )
+        self._ensure_workers()
+        loop = asyncio.get_running_loop()
+        futures: list[asyncio.Future[SparseVector]] = []
+        for text in texts:
+            future: asyncio.Future[SparseVector] = loop.create_future()
+            self._queue.put_nowait((text, future))
+            futures.append(future)
+        return futures
+
+    async def encode(self, text: str) -> SparseVector:
+        """Encodes a single text as part of the next micro-batch."""
+        return await self._admit([text])[0]
+
+    async def encode_many(self, texts: list[str]) -> list[SparseVector]:
+        """Encodes several texts; they may share batches with concurrent requests.
+
+        The texts are admitted all-or-nothing so a large request never ends
+        up half queued.
+        """
+        return list(await asyncio.gather(*self._admit(texts)))
+
+    async def _collect(self) -> list[tuple[str, asyncio.Future[SparseVector]]]:
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Requests whose client went away do not need a forward pass
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if not batch:
+                continue
+            texts = [text for text, _ in batch]
+            BATCH_SIZE.observe(len(texts))
+            try:
+                results = await loop.run_in_executor(self.executor, self.model.encode_batch_ids, texts)
+            except Exception as e:
+                logger.error(f"Batch inference failed for {len(texts)} texts: {e}")
+                ERRORS.labels(stage="inference").inc()
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def close(self) -> None:
+        """Stops the background workers."""
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
@@ -0,0 +1,32 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import torch
+
+logger = logging.getLogger(__name__)
+
+def create_inference_executor(workers: int = 1, torch_threads: Optional[int] = None) -> ThreadPoolExecutor:
+    """Creates the thread pool that runs SPLADE forward passes off the event loop.
+
+    PyTorch releases the GIL inside its kernels, so threads give real
+    parallelism while sharing a single copy of the model weights.
+
+    The torch intra-op thread count is process-wide, and every worker
+    running a forward pass uses that many threads, so ``workers`` passes
+    compete for ``workers * torch_threads`` threads. When ``torch_threads``
+    is not given and there are several workers, the cores are split evenly
+    between them instead of letting each use all of them.
+
+    Args:
+        workers: Number of forward passes that may run at the same time.
+        torch_threads: Intra-op thread count for torch, per forward pass.
+            ``None`` keeps the torch default (all cores) for a single
+            worker and ``cpu_count // workers`` otherwise.
+    """
+    if torch_threads is None and workers > 1:
+        torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    if torch_threads:
+        torch.set_num_threads(torch_threads)
+    logger.info(f"Starting inference executor with {workers} workers (torch threads: {torch_threads or 'default'})")
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="splade-inference")
@@ -2,12 +2,19 @@ import pytest
 from fastapi.testclient import TestClient
 from src.main import create_app
 from src.api.router import get_model
+from src.models.splade import SparseVector
 from unittest.mock import MagicMock
 
 @pytest.fixture
 def mock_model():
     model = MagicMock()
-    model.encode.return_value = {"hello": 1.0, "world": 0.5}
+    model.model_id = "test-model"
+    model.vocab_version = "v1"
+    model.top_k = None
+    model.min_weight = 0.01
+    model.feature_names = ["hello", "world"]
+    model.encode_batch_ids.side_effect = lambda texts: [SparseVector([0, 1], [1.0, 0.5]) for _ in texts]
+    model.to_feature_dict.side_effect = lambda v: {model.feature_names[i]: w for i, w in zip(v.ids, v.weights)}
     return model
 
 @pytest.fixture
@@ -14,9 +14,116 @@ def test_encode_endpoint(client: TestClient, mock_model):
     assert "sparse_values" in data
     assert data["sparse_values"] == {"hello": 1.0, "world": 0.5}
     
-    mock_model.encode.assert_called_once_with(test_text)
+    mock_model.encode_batch_ids.assert_called_once_with([test_text])
+
+def test_encode_batch_endpoint(client: TestClient, mock_model):
+    response = client.post("/encode_batch", json={"texts": ["first", "second"]})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert len(results) == 2
+    assert all(r["sparse_values"] == {"hello": 1.0, "world": 0.5} for r in results)
+    # Both texts are gathered into a single micro-batch
+    mock_model.encode_batch_ids.assert_called_once_with(["first", "second"])
 
 def test_encode_endpoint_invalid_request(client: TestClient):
     # Missing 'text' field
     response = client.post("/encode", json={})
     assert response.status_code == 422
+
+def test_encode_endpoint_returns_503_when_queue_is_full(client: TestClient, monkeypatch):
+    from src.core.config import settings
+    from src.services.batcher import EncoderOverloadedError, MicroBatcher
+
+    async def overloaded(self, texts):
+        raise EncoderOverloadedError("Inference queue is full")
+
+    monkeypatch.setattr(MicroBatcher, "encode_many", overloaded)
+
+    response = client.post("/encode_batch", json={"texts": ["first", "second"]})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(settings.RETRY_AFTER_SECONDS)
+
+def test_encode_batch_endpoint_accepts_more_texts_than_the_queue_holds_when_idle(client: TestClient, monkeypatch):
+    from src.core.config import settings
+    monkeypatch.setattr(settings, "MAX_QUEUE_SIZE", 1)
+
+    response = client.post("/encode_batch", json={"texts": ["first", "second", "third"]})
+
+    assert response.status_code == 200
+    assert len(response.json()["results"]) == 3
+
+def test_encode_endpoint_compact_json_format(client: TestClient):
+    response = client.post(
+        "/encode",
+        json={"text": "test"},
+        headers={"Accept": "application/vnd.splade.compact+json"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/vnd.splade.compact+json")
+    assert response.headers["X-Vocab-Version"] == "v1"
+    assert response.json() == {"ids": [0, 1], "weights": [1.0, 0.5]}
+
+def test_encode_batch_endpoint_msgpack_format(client: TestClient):
+    import msgpack
+    import numpy as np
+
+    response = client.post(
+        "/encode_batch",
+        json={"texts": ["a", "b"]},
+        headers={"Accept": "application/x-msgpack"}
+    )
+
+    assert response.status_code == 200
+    results = msgpack.unpackb(response.content)["results"]
+    assert len(results) == 2
+    assert np.frombuffer(results[0]["ids"], dtype="<u4").tolist() == [0, 1]
+    assert np.frombuffer(results[0]["weights"], dtype="<f2").tolist() == [1.0, 0.5]
+
+def test_vocab_endpoint(client: TestClient):
+    response = client.get("/vocab")
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"v1"'
+    assert response.json() == {"model_id": "test-model", "version": "v1", "features": ["hello", "world"]}
+
+def test_info_endpoint(client: TestClient):
+    response = client.get("/info")
+
+    assert response.status_code == 200
+    assert response.json() == {"model_id": "test-model", "vocab_version": "v1", "top_k": None, "min_weight": 0.01}
+
+def test_metrics_endpoint_exposes_batch_and_request_metrics(client: TestClient):
+    client.post("/encode_batch", json={"texts": ["first", "second"]})
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "encoder_batch_size_bucket" in response.text
+    assert 'encoder_request_seconds_count{path="/encode_batch"}' in response.text
+
+def test_batcher_and_executor_are_created_once_for_concurrent_requests(mock_model, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from fastapi.testclient import TestClient
+    import src.main
+    from src.api.router import get_model
+
+    created = []
+    original = src.main.create_inference_executor
+
+    def counting(**kwargs):
+        created.append(kwargs)
+        return original(**kwargs)
+
+    monkeypatch.setattr(src.main, "create_inference_executor", counting)
+    app = src.main.create_app()
+    app.dependency_overrides[get_model] = lambda: mock_model
+
+    with TestClient(app) as client, ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(lambda i: client.post("/encode", json={"text": f"t{i}"}), range(8)))
+
+    assert all(response.status_code == 200 for response in responses)
+    assert len(created) == 1
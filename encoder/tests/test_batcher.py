@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+from src.models.splade import SparseVector
+from src.services.batcher import EncoderOverloadedError, MicroBatcher
+
+async def test_batcher_groups_concurrent_requests():
+    model = MagicMock()
+    model.encode_batch_ids.side_effect = lambda texts: [SparseVector([ord(t)], [1.0]) for t in texts]
+    batcher = MicroBatcher(model, max_batch_size=8, max_wait_ms=20)
+
+    results = await asyncio.gather(*(batcher.encode(t) for t in ["a", "b", "c"]))
+    await batcher.close()
+
+    assert [r.ids for r in results] == [[ord("a")], [ord("b")], [ord("c")]]
+    model.encode_batch_ids.assert_called_once_with(["a", "b", "c"])
+
+async def test_batcher_respects_max_batch_size():
+    model = MagicMock()
+    model.encode_batch_ids.side_effect = lambda texts: [SparseVector([ord(t)], [1.0]) for t in texts]
+    batcher = MicroBatcher(model, max_batch_size=2, max_wait_ms=20)
+
+    results = await batcher.encode_many(["a", "b", "c"])
+    await batcher.close()
+
+    assert [r.ids for r in results] == [[ord("a")], [ord("b")], [ord("c")]]
+    assert [c.args[0] for c in model.encode_batch_ids.call_args_list] == [["a", "b"], ["c"]]
+
+async def test_batcher_propagates_inference_errors():
+    model = MagicMock()
+    model.encode_batch_ids.side_effect = RuntimeError("boom")
+    batcher = MicroBatcher(model, max_batch_size=2, max_wait_ms=1)
+
+    try:
+        await batcher.encode("a")
+        raised = False
+    except RuntimeError:
+        raised = True
+    await batcher.close()
+
+    assert raised
+
+async def test_batcher_rejects_requests_when_queue_is_full():
+    release = threading.Event()
+    model = MagicMock()
+    model.encode_batch_ids.side_effect = lambda texts: release.wait(5) and [SparseVector([], []) for _ in texts]
+    batcher = MicroBatcher(model, max_batch_size=1, max_wait_ms=1, max_queue_size=2)
+
+    # "a" blocks the worker in inference while "b" waits in the queue
+    pending = asyncio.ensure_future(batcher.encode_many(["a", "b"]))
+    while model.encode_batch_ids.call_count == 0:
+        await asyncio.sleep(0.001)
+    try:
+        await batcher.encode_many(["c", "d"])
+        raised = False
+    except EncoderOverloadedError:
+        raised = True
+    release.set()
+    await pending
+    await batcher.close()
+
+    assert raised
+    assert [c.args[0] for c in model.encode_batch_ids.call_args_list] == [["a"], ["b"]]
+
+async def test_batcher_admits_an_oversized_request_into_an_empty_queue():
+    model = MagicMock()
+    model.encode_batch_ids.side_effect = lambda texts: [SparseVector([ord(t)], [1.0]) for t in texts]
+    batcher = MicroBatcher(model, max_batch_size=2, max_wait_ms=1, max_queue_size=2)
+
+    results = await batcher.encode_many(["a", "b", "c", "d", "e"])
+    await batcher.close()
+
+    assert [r.ids for r in results] == [[ord(t)] for t in "abcde"]
+
+async def test_batcher_keeps_event_loop_responsive_during_inference():
+    def slow_encode(texts):
+        time.sleep(0.2)
+        return [SparseVector([ord(t)], [1.0]) for t in texts]
+
+    model = MagicMock()
+    model.encode_batch_ids.side_effect = slow_encode
+    executor = ThreadPoolExecutor(max_workers=1)
+    batcher = MicroBatcher(model, max_wait_ms=1, executor=executor)
+
+    task = asyncio.create_task(batcher.encode("a"))
+    started = time.monotonic()
+    await asyncio.sleep(0.01)
+    ticked = time.monotonic() - started
+    result = await task
+    await batcher.close()
+    executor.shutdown()
+
+    assert ticked < 0.15
+    assert result == SparseVector([ord("a")], [1.0])
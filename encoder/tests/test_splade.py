@@ -31,7 +31,8 @@ def test_splade_model_encode(mock_model_cls, mock_tokenizer_cls):
     mock_inputs = MagicMock()
     mock_inputs.to.return_value = {"input_ids": torch.tensor([[1, 2, 3]])}
     mock_tokenizer.return_value = mock_inputs
-    mock_tokenizer.decode.side_effect = lambda x: f"token_{x[0]}"
+    mock_tokenizer.__len__.return_value = 5
+    mock_tokenizer.batch_decode.side_effect = lambda ids: [f"token_{x[0]}" for x in ids]
     
     # Mock model output (logits)
     # Shape: (batch_size, seq_len, vocab_size)
@@ -105,7 +106,8 @@ def test_splade_model_encode_special_tokens(mock_model_cls, mock_tokenizer_cls):
         }
         return mapping.get(token_ids[0], "unknown")
         
-    mock_tokenizer.decode.side_effect = mock_decode
+    mock_tokenizer.__len__.return_value = 10
+    mock_tokenizer.batch_decode.side_effect = lambda ids: [mock_decode(x) for x in ids]
     mock_tokenizer.return_value.to.return_value = {"input_ids": torch.tensor([[1]])}
     
     model = SpladeModel(model_id="test-model")
@@ -128,3 +130,129 @@ def test_splade_model_encode_special_tokens(mock_model_cls, mock_tokenizer_cls):
     assert result["u_CLS_"] == pytest.approx(torch.log1p(torch.tensor(4.0)).item())
     assert result["a_b_c"] == pytest.approx(torch.log1p(torch.tensor(5.0)).item())
     assert result["u-abc"] == pytest.approx(torch.log1p(torch.tensor(6.0)).item())
+
+@patch("src.models.splade.AutoTokenizer")
+@patch("src.models.splade.AutoModelForMaskedLM")
+def test_splade_model_encode_batch_preserves_order_and_masks_padding(mock_model_cls, mock_tokenizer_cls):
+    mock_tokenizer = MagicMock()
+    mock_model = MagicMock()
+    mock_tokenizer_cls.from_pretrained.return_value = mock_tokenizer
+    mock_model_cls.from_pretrained.return_value = mock_model
+    mock_tokenizer.__len__.return_value = 5
+    mock_tokenizer.batch_decode.side_effect = lambda ids: [f"token_{x[0]}" for x in ids]
+
+    # Texts are bucketed by length, so the long text comes second in the batch
+    mock_tokenizer.return_value.to.return_value = {
+        "input_ids": torch.tensor([[1, 0], [1, 2]]),
+        "attention_mask": torch.tensor([[1, 0], [1, 1]]),
+    }
+    mock_logits = torch.zeros((2, 2, 5))
+    mock_logits[0, 0, 1] = 1.0  # short text
+    mock_logits[0, 1, 3] = 5.0  # padding position, must be ignored
+    mock_logits[1, 1, 2] = 2.0  # long text
+    mock_model.return_value.logits = mock_logits
+
+    model = SpladeModel(model_id="test-model")
+    model.device = torch.device("cpu")
+
+    results = model.encode_batch(["long text", "short"])
+
+    mock_tokenizer.assert_called_once_with(
+        ["short", "long text"], padding=True, truncation=True, return_tensors="pt"
+    )
+    assert set(results[0]) == {"token_2"}
+    assert set(results[1]) == {"token_1"}
+
+def _mock_model_with_vocab(mock_model_cls, mock_tokenizer_cls, tokens, logits, **kwargs):
+    mock_tokenizer = MagicMock()
+    mock_model = MagicMock()
+    mock_tokenizer_cls.from_pretrained.return_value = mock_tokenizer
+    mock_model_cls.from_pretrained.return_value = mock_model
+    mock_tokenizer.__len__.return_value = len(tokens)
+    mock_tokenizer.batch_decode.side_effect = lambda ids: [tokens[x[0]] for x in ids]
+    mock_tokenizer.return_value.to.return_value = {"input_ids": torch.tensor([[1]])}
+    mock_model.return_value.logits = logits
+
+    model = SpladeModel(model_id="test-model", **kwargs)
+    model.device = torch.device("cpu")
+    return model, mock_tokenizer
+
+@patch("src.models.splade.AutoTokenizer")
+@patch("src.models.splade.AutoModelForMaskedLM")
+def test_splade_model_builds_feature_table_once(mock_model_cls, mock_tokenizer_cls):
+    tokens = ["", "a.b", "a,b", "c", " "]
+    logits = torch.zeros((1, 1, 5))
+    model, mock_tokenizer = _mock_model_with_vocab(mock_model_cls, mock_tokenizer_cls, tokens, logits)
+
+    model.encode("text")
+    model.encode("text")
+
+    assert model.feature_names == ["a_b", "c"]
+    assert model.feature_index.tolist() == [2, 0, 0, 1, 2]
+    mock_tokenizer.batch_decode.assert_called_once()
+    mock_tokenizer.decode.assert_not_called()
+
+@patch("src.models.splade.AutoTokenizer")
+@patch("src.models.splade.AutoModelForMaskedLM")
+def test_splade_model_merges_colliding_feature_names_by_max(mock_model_cls, mock_tokenizer_cls):
+    # "a.b" and "a,b" both sanitize to "a_b"; the larger weight must win
+    tokens = ["", "a.b", "a,b", "c"]
+    logits = torch.zeros((1, 1, 4))
+    logits[0, 0, 1] = 5.0
+    logits[0, 0, 2] = 1.0
+    logits[0, 0, 3] = 2.0
+    model, _ = _mock_model_with_vocab(mock_model_cls, mock_tokenizer_cls, tokens, logits)
+
+    result = model.encode("text")
+
+    assert result == {
+        "a_b": pytest.approx(torch.log1p(torch.tensor(5.0)).item()),
+        "c": pytest.approx(torch.log1p(torch.tensor(2.0)).item()),
+    }
+
+@patch("src.models.splade.AutoTokenizer")
+@patch("src.models.splade.AutoModelForMaskedLM")
+def test_splade_model_applies_min_weight_and_top_k(mock_model_cls, mock_tokenizer_cls):
+    tokens = ["a", "b", "c", "d"]
+    logits = torch.zeros((1, 1, 4))
+    logits[0, 0, 0] = 0.001  # below min_weight after log1p
+    logits[0, 0, 1] = 1.0
+    logits[0, 0, 2] = 3.0
+    logits[0, 0, 3] = 2.0
+    model, _ = _mock_model_with_vocab(mock_model_cls, mock_tokenizer_cls, tokens, logits, top_k=2)
+
+    result = model.encode("text")
+
+    assert list(result) == ["c", "d"]
+
+@patch("src.models.splade.AutoTokenizer")
+@patch("src.models.splade.AutoModelForMaskedLM")
+def test_splade_model_serializes_tokenization_across_threads(mock_model_cls, mock_tokenizer_cls):
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    tokens = ["", "a", "b"]
+    logits = torch.zeros((1, 1, 3))
+    model, mock_tokenizer = _mock_model_with_vocab(mock_model_cls, mock_tokenizer_cls, tokens, logits)
+    active = []
+    overlaps = []
+    guard = threading.Lock()
+
+    # Fast tokenizers raise "Already borrowed" when entered concurrently
+    def tokenize(*args, **kwargs):
+        with guard:
+            active.append(1)
+            overlaps.append(len(active) > 1)
+        time.sleep(0.01)
+        with guard:
+            active.pop()
+        return MagicMock(to=MagicMock(return_value={"input_ids": torch.tensor([[1]])}))
+
+    mock_tokenizer.side_effect = tokenize
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda _: model.encode_batch_ids(["text"]), range(8)))
+
+    assert mock_tokenizer.call_count == 8
+    assert not any(overlaps)